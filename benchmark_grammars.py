@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Created on 16. 10. 2026
+Micro-benchmark syntaktické analýzy (backtracking) nad gramatikami jazyků.
+
+Porovná průměrný čas jedné syntaktické analýzy (Grammar.grammarEllapsedTime / Grammar.grammarNumOfAnalyzes)
+při vkládání předpřipravených symbolů pravidel na zásobník (viz Grammar._makeRuleSymbols) a při vytváření symbolů
+při každém vložení pravidla (původní podoba Grammar.putRuleOnStack).
+
+Používá konfiguraci a data jazyků namegenu včetně morfologického analyzátoru.
+
+Příklad:
+    ./benchmark_grammars.py --lang cs sk en --repeat 5 names.tsv
+"""
+import argparse
+import logging
+import os
+import sys
+import types
+from collections import defaultdict
+
+from namegen import ConfigManager, langLoad, initMorphoAnalyzers
+from namegenPack import Errors
+from namegenPack.Grammar import Grammar, StackNode, Symbol, Terminal
+from namegenPack.Name import NameReader
+
+
+def putRuleOnStackRebuilding(self, rule, stack, morph):
+    """
+    Původní vkládání pravidla na zásobník, které pro každou část pravé strany znovu zjišťuje druh symbolu
+    a vytváří nový symbol. Slouží jako srovnání pro Grammar.putRuleOnStack.
+    """
+    for rulePart in reversed(rule.rightSide):
+        if rulePart != self.EMPTY_STR:
+            isTerminal = rulePart in self._terminals or rulePart == self.EMPTY_STR
+            shouldMorph = morph and (True if isTerminal else rulePart[0] != self.NON_GEN_MORPH_SIGN)
+            bit = 1 << self._terminalIndex.ids[rulePart] if isTerminal else 0
+            stack = StackNode(Symbol(rulePart, isTerminal, shouldMorph, bit), stack)
+    return stack
+
+
+def analyzeAll(pairs):
+    """
+    Provede syntaktickou analýzu všech jmen.
+
+    :param pairs: Dvojice (gramatika, tokeny).
+    """
+    for grammar, tokens in pairs:
+        try:
+            grammar.analyse(tokens)
+        except (Grammar.NotInLanguage, Grammar.TimeoutException):
+            pass
+
+
+def measure(pairs, grammars, rebuilding: bool):
+    """
+    Změří průměrný čas jedné syntaktické analýzy pro každý jazyk.
+
+    :param pairs: Dvojice (gramatika, tokeny).
+    :param grammars: Jazyk -> gramatiky jazyka.
+    :param rebuilding: True -> symboly se vytváří při každém vložení pravidla.
+    :return: Jazyk -> (součet časů analýz, počet analýz)
+    """
+    for langGrammars in grammars.values():
+        for g in langGrammars:
+            g.grammarEllapsedTime = 0
+            g.grammarNumOfAnalyzes = 0
+            if rebuilding:
+                g.putRuleOnStack = types.MethodType(putRuleOnStackRebuilding, g)
+            elif "putRuleOnStack" in g.__dict__:
+                del g.putRuleOnStack
+
+    analyzeAll(pairs)
+
+    return {lang: (sum(g.grammarEllapsedTime for g in langGrammars),
+                   sum(g.grammarNumOfAnalyzes for g in langGrammars))
+            for lang, langGrammars in grammars.items()}
+
+
+def main():
+    logging.basicConfig(stream=sys.stderr, format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark syntaktické analýzy nad gramatikami jazyků.")
+    parser.add_argument("input", help="Vstupní soubor se jmény ve formátu vstupu namegenu.")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                                         "namegen_config.ini"),
+                        help="Konfigurační soubor namegenu.")
+    parser.add_argument("--lang", nargs="+", default=["cs", "sk", "en"], help="Jazyky, jejichž gramatiky se měří.")
+    parser.add_argument("--def-lang", default="cs", help="Výchozí jazyk pro jména bez jazyka.")
+    parser.add_argument("--repeat", type=int, default=3, help="Počet opakování měření.")
+    args = parser.parse_args()
+
+    configAll = ConfigManager().read(args.config)
+    if configAll[ConfigManager.sectionGrammar]["PARSE_UNKNOWN_ANALYZE"]:
+        Terminal.UNKNOWN_ANALYZE_TERMINAL_MATCH = configAll[ConfigManager.sectionGrammar][
+            "PARSE_UNKNOWN_ANALYZE_TERMINAL_MATCH"]
+
+    logging.info("načtení jazyků")
+    languages = {code: lng for code, lng in langLoad(configAll).items() if code in args.lang}
+
+    logging.info("čtení jmen")
+    namesR = NameReader(languages=languages, langDef=args.def_lang, inputFile=args.input, shouldSort=False)
+    names = [n for n in namesR.names if n.language is not None and n.language.code in languages]
+
+    logging.info("analýza slov")
+    initMorphoAnalyzers(namesR.allWords(True, names), languages, configAll)
+
+    pairs = []
+    for name in names:
+        try:
+            pairs.append((name.grammar, name.language.lex.getTokens(name)))
+        except Errors.ExceptionMessageCode:
+            # jméno nelze rozdělit na tokeny nebo nemá gramatiku
+            pass
+
+    grammars = {code: [lng.gFemale, lng.gMale, lng.gLocations, lng.gEvents] for code, lng in languages.items()}
+    for langGrammars in grammars.values():
+        for g in langGrammars:
+            g.parser = Grammar.PARSER_BACKTRACKING
+
+    logging.info("zahřátí (cache shody tokenů s terminály)")
+    analyzeAll(pairs)
+
+    logging.info("měření")
+    total = {False: defaultdict(lambda: [0.0, 0]), True: defaultdict(lambda: [0.0, 0])}
+    for _ in range(args.repeat):
+        # střídáme varianty, aby na ně stejně působily vnější vlivy
+        for rebuilding in (True, False):
+            for lang, (t, cnt) in measure(pairs, grammars, rebuilding).items():
+                total[rebuilding][lang][0] += t
+                total[rebuilding][lang][1] += cnt
+
+    for lng in languages.values():
+        lng.closeMAnalyzer()
+
+    print("jazyk\tpočet analýz\tpředpřipravené symboly [ms]\tvytváření symbolů [ms]\tzrychlení")
+    for lang in sorted(grammars):
+        prebuiltTime, cnt = total[False][lang]
+        rebuiltTime, _ = total[True][lang]
+        if cnt == 0:
+            print(lang + "\t0\t-\t-\t-")
+            continue
+        prebuilt = prebuiltTime / cnt * 1000
+        rebuilt = rebuiltTime / cnt * 1000
+        print("{}\t{}\t{:.4f}\t{:.4f}\t{:.1%}".format(lang, cnt // args.repeat, prebuilt, rebuilt,
+                                                       1 - prebuilt / rebuilt if rebuilt > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
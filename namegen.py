@@ -11,13 +11,17 @@ namegen je program pro generování tvarů jmen osob a lokací.
 
 import configparser
 import csv
+import io
+import math
+import multiprocessing
 import os
 import time
 import traceback
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 from functools import reduce
-from typing import Any
+from typing import Any, Sequence
 
 import regex as re
 
@@ -28,6 +32,10 @@ from namegenPack import Grammar
 from namegenPack.Filters import NamesFilter, NamesGrammarFilter
 from namegenPack.Generators import GenerateAbbreFormOfPrep, GenerateNope, GenerateDerivatedForms, MultiGenerator
 from namegenPack.Language import Language
+from namegenPack.NameCache import NameCache
+from namegenPack.morpho.MACache import MACache
+from namegenPack.morpho.MorphoAnalyzer import MorphoAnalyze, EQRelationForPrepAndItsAbbre, MAProfile, \
+    MorphoAnalyzerLibma
 from namegenPack.Name import *
 
 outputFile = sys.stdout
@@ -51,6 +59,7 @@ class ConfigManager(object):
     sectionGenerators = "GENERATORS"
     sectionGrammar = "GRAMMAR"
     sectionDeriv = "DERIV"
+    sectionMA = "MA"
 
     def __init__(self):
         """
@@ -91,7 +100,8 @@ class ConfigManager(object):
                 self.sectionDataFiles: self.__transformDataFiles(),
                 self.sectionGenerators: self.__transformGenerators(),
                 self.sectionGrammar: self.__transformGrammar(),
-                self.sectionDeriv: self.__transformDeriv()}
+                self.sectionDeriv: self.__transformDeriv(),
+                self.sectionMA: self.__transformMA()}
 
     def __transformDefaults(self):
         """
@@ -192,8 +202,17 @@ class ConfigManager(object):
                                                  "PARSE_UNKNOWN_ANALYZE"].lower() == "true" else False,
             "PARSE_UNKNOWN_ANALYZE_TERMINAL_MATCH": set(),
             "TIMEOUT": None,
+            "MAX_DERIVATIONS": None,
+            "PARSER": self.configParser[self.sectionGrammar]["PARSER"].strip().lower(),
+            "MATCH_CACHE_SIZE": None,
         }
 
+        if result["PARSER"] not in namegenPack.Grammar.Grammar.PARSERS:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionGrammar + "/PARSER: " +
+                self.configParser[self.sectionGrammar]["PARSER"])
+
         if result["PARSE_UNKNOWN_ANALYZE"]:
 
             for t in self.configParser[self.sectionGrammar]["PARSE_UNKNOWN_ANALYZE_TERMINAL_MATCH"].split():
@@ -218,6 +237,28 @@ class ConfigManager(object):
                 Errors.ErrorMessenger.CODE_INVALID_CONFIG,
                 "Nevalidní konfigurační soubor. " + self.sectionGrammar + "/TIMEOUT: " +
                 self.configParser[self.sectionGrammar]["TIMEOUT"])
+
+        try:
+            if self.configParser[self.sectionGrammar]["MAX_DERIVATIONS"].upper() != "NONE":
+                result["MAX_DERIVATIONS"] = int(self.configParser[self.sectionGrammar]["MAX_DERIVATIONS"])
+                if result["MAX_DERIVATIONS"] <= 0:
+                    raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionGrammar + "/MAX_DERIVATIONS: " +
+                self.configParser[self.sectionGrammar]["MAX_DERIVATIONS"])
+
+        try:
+            if self.configParser[self.sectionGrammar]["MATCH_CACHE_SIZE"].upper() != "NONE":
+                result["MATCH_CACHE_SIZE"] = int(self.configParser[self.sectionGrammar]["MATCH_CACHE_SIZE"])
+                if result["MATCH_CACHE_SIZE"] <= 0:
+                    raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionGrammar + "/MATCH_CACHE_SIZE: " +
+                self.configParser[self.sectionGrammar]["MATCH_CACHE_SIZE"])
         return result
 
     def __transformDataFiles(self):
@@ -236,9 +277,28 @@ class ConfigManager(object):
             "TITLES": self.configParser[self.sectionDataFiles]["TITLES"],
             "EQ_GEN": self.configParser[self.sectionDataFiles]["EQ_GEN"],
             "MA": self.configParser[self.sectionDataFiles]["MA"],
-            "LANGUAGES_DIRECTORY": self.__makePath(self.configParser[self.sectionDataFiles]["LANGUAGES"])
+            "LANGUAGES_DIRECTORY": self.__makePath(self.configParser[self.sectionDataFiles]["LANGUAGES"]),
+            "MA_CACHE": None,
+            "MA_CACHE_MAX_ENTRIES": None,
+            "NAME_CACHE": None,
+            "NAME_CACHE_MAX_ENTRIES": None
         }
 
+        for cache in ("MA_CACHE", "NAME_CACHE"):
+            if self.configParser[self.sectionDataFiles][cache]:
+                result[cache] = self.__makePath(self.configParser[self.sectionDataFiles][cache])
+
+            try:
+                if self.configParser[self.sectionDataFiles][cache + "_MAX_ENTRIES"].upper() != "NONE":
+                    result[cache + "_MAX_ENTRIES"] = int(self.configParser[self.sectionDataFiles][cache + "_MAX_ENTRIES"])
+                    if result[cache + "_MAX_ENTRIES"] <= 0:
+                        raise ValueError
+            except ValueError:
+                raise ConfigManagerInvalidException(
+                    Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                    "Nevalidní konfigurační soubor. " + self.sectionDataFiles + "/" + cache + "_MAX_ENTRIES: " +
+                    self.configParser[self.sectionDataFiles][cache + "_MAX_ENTRIES"])
+
         return result
 
     def __transformDeriv(self):
@@ -253,6 +313,93 @@ class ConfigManager(object):
         }
         return result
 
+    def __transformMA(self):
+        """
+        Převede hodnoty pro MA a validuje je.
+
+        :returns: dict -- ve formátu jméno prametru jako klíč a k němu hodnota parametru
+        :raise ConfigManagerInvalidException: Pokud je konfigurační soubor nevalidní.
+        """
+
+        result = {
+            "PERSISTENT_PROCESS": self.configParser[self.sectionMA]["PERSISTENT_PROCESS"].lower() == "true",
+            "PERSISTENT_PROCESS_STALL_TIMEOUT": None,
+            "WORD_DATABASE": self.configParser[self.sectionMA]["WORD_DATABASE"].lower(),
+            "WORD_DATABASE_DIRECTORY": None,
+            "MORPHS_CACHE_SIZE": None,
+            "LAZY_ANALYSIS": self.configParser[self.sectionMA]["LAZY_ANALYSIS"].lower() == "true",
+            "LAZY_BATCH_SIZE": None,
+            "PARALLEL_LANGUAGES": self.configParser[self.sectionMA]["PARALLEL_LANGUAGES"].lower() == "true",
+            "SHARDS": None,
+            "MAX_BATCH_BYTES": None
+        }
+
+        try:
+            if self.configParser[self.sectionMA]["MAX_BATCH_BYTES"].upper() != "NONE":
+                result["MAX_BATCH_BYTES"] = int(self.configParser[self.sectionMA]["MAX_BATCH_BYTES"])
+                if result["MAX_BATCH_BYTES"] <= 0:
+                    raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/MAX_BATCH_BYTES: " +
+                self.configParser[self.sectionMA]["MAX_BATCH_BYTES"])
+
+        try:
+            result["SHARDS"] = int(self.configParser[self.sectionMA]["SHARDS"])
+            if result["SHARDS"] <= 0:
+                raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/SHARDS: " +
+                self.configParser[self.sectionMA]["SHARDS"])
+
+        try:
+            result["LAZY_BATCH_SIZE"] = int(self.configParser[self.sectionMA]["LAZY_BATCH_SIZE"])
+            if result["LAZY_BATCH_SIZE"] <= 0:
+                raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/LAZY_BATCH_SIZE: " +
+                self.configParser[self.sectionMA]["LAZY_BATCH_SIZE"])
+
+        try:
+            if self.configParser[self.sectionMA]["MORPHS_CACHE_SIZE"].upper() != "NONE":
+                result["MORPHS_CACHE_SIZE"] = int(self.configParser[self.sectionMA]["MORPHS_CACHE_SIZE"])
+                if result["MORPHS_CACHE_SIZE"] <= 0:
+                    raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/MORPHS_CACHE_SIZE: " +
+                self.configParser[self.sectionMA]["MORPHS_CACHE_SIZE"])
+
+        if result["WORD_DATABASE"] not in {"dict", "compact"}:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/WORD_DATABASE: " +
+                self.configParser[self.sectionMA]["WORD_DATABASE"])
+
+        if self.configParser[self.sectionMA]["WORD_DATABASE_DIRECTORY"]:
+            result["WORD_DATABASE_DIRECTORY"] = self.__makePath(
+                self.configParser[self.sectionMA]["WORD_DATABASE_DIRECTORY"])
+
+        try:
+            if self.configParser[self.sectionMA]["PERSISTENT_PROCESS_STALL_TIMEOUT"].upper() != "NONE":
+                result["PERSISTENT_PROCESS_STALL_TIMEOUT"] = float(
+                    self.configParser[self.sectionMA]["PERSISTENT_PROCESS_STALL_TIMEOUT"])
+                if result["PERSISTENT_PROCESS_STALL_TIMEOUT"] <= 0:
+                    raise ValueError
+        except ValueError:
+            raise ConfigManagerInvalidException(
+                Errors.ErrorMessenger.CODE_INVALID_CONFIG,
+                "Nevalidní konfigurační soubor. " + self.sectionMA + "/PERSISTENT_PROCESS_STALL_TIMEOUT: " +
+                self.configParser[self.sectionMA]["PERSISTENT_PROCESS_STALL_TIMEOUT"])
+
+        return result
+
     def __loadPathArguments(self, parConf, result):
         """
         Načtení argumentů obsahujícíh cesty.
@@ -353,6 +500,33 @@ class ArgumentsManager(object):
         morphs_subparser.add_argument("--def-lang",
                             help="Jazyk, který bude použit jako výchozí v případě neznámého jazyka (výchozí cs).",
                             type=str, required=False, default="cs")
+        morphs_subparser.add_argument("--stream",
+                            help="Zpracovává vstup postupně po dávkách (viz --stream-chunk-size) místo načtení celého "
+                                 "vstupu najednou. Pro každou dávku se provede analýza dosud neviděných slov, "
+                                 "vygenerují se tvary a vypíší se výsledky.",
+                            action='store_true')
+        morphs_subparser.add_argument("--stream-chunk-size",
+                            help="Počet řádků vstupu v jedné dávce při --stream (výchozí 10000).",
+                            type=int, required=False, default=10000)
+        morphs_subparser.add_argument("--ma-cache",
+                            help="Cesta k perzistentní cache výsledků morfologického analyzátoru. Přepisuje "
+                                 "DATA_FILES/MA_CACHE z konfiguračního souboru.",
+                            type=str, required=False, default=None)
+        morphs_subparser.add_argument("--name-cache",
+                            help="Cesta k perzistentní cache výsledků celých jmen. Přepisuje DATA_FILES/NAME_CACHE "
+                                 "z konfiguračního souboru.",
+                            type=str, required=False, default=None)
+        morphs_subparser.add_argument("--previous",
+                            help="Předchozí výstup (vytvořený s -o). Tvary jmen, která v něm jsou, budou převzaty a "
+                                 "tato jména nebudou znovu analyzována. Předchozí výstup jazyka se nepoužije, pokud "
+                                 "se od jeho vytvoření změnily gramatiky, tituly, eq_gen, ma, konfigurace či program "
+                                 "(otisky jsou ukládány vedle výstupu do souboru s příponou .fingerprints).",
+                            type=str, required=False, default=None)
+        morphs_subparser.add_argument("--workers",
+                            help="Počet procesů, mezi které se rozdělí generování tvarů jmen (výchozí 1). "
+                                 "Výstup je stejný jako při zpracování jedním procesem. Nelze použít se zapnutým "
+                                 "generováním nových jmen (GENERATORS/ABBRE_FORM_OF_PREPOSITIONS).",
+                            type=int, required=False, default=1)
 
         morphs_subparser.set_defaults(func=call_morphs)
 
@@ -379,11 +553,41 @@ class ArgumentsManager(object):
         deriv_subparser.add_argument("--def-lang",
                                       help="Jazyk, který bude použit jako výchozí v případě neznámého jazyka (výchozí cs).",
                                       type=str, required=False, default="cs")
+        deriv_subparser.add_argument("--stream",
+                                      help="Zpracovává vstup postupně po dávkách (viz --stream-chunk-size) místo "
+                                           "načtení celého vstupu najednou.",
+                                      action='store_true')
+        deriv_subparser.add_argument("--stream-chunk-size",
+                                      help="Počet řádků vstupu v jedné dávce při --stream (výchozí 10000).",
+                                      type=int, required=False, default=10000)
+        deriv_subparser.add_argument("--ma-cache",
+                                      help="Cesta k perzistentní cache výsledků morfologického analyzátoru. Přepisuje "
+                                           "DATA_FILES/MA_CACHE z konfiguračního souboru.",
+                                      type=str, required=False, default=None)
+        deriv_subparser.add_argument("--name-cache",
+                                      help="Cesta k perzistentní cache výsledků celých jmen. Přepisuje "
+                                           "DATA_FILES/NAME_CACHE z konfiguračního souboru.",
+                                      type=str, required=False, default=None)
+        deriv_subparser.add_argument("--workers",
+                                      help="Počet procesů, mezi které se rozdělí generování (výchozí 1). Nelze "
+                                           "použít se zapnutým generováním nových jmen "
+                                           "(GENERATORS/ABBRE_FORM_OF_PREPOSITIONS).",
+                                      type=int, required=False, default=1)
         deriv_subparser.set_defaults(func=call_deriv)
 
+        compile_grammars_subparser = subparsers.add_parser(
+            "compile-grammars",
+            help="Předkompiluje gramatiky všech jazyků. Předkompilovaná gramatika je uložena vedle souboru s "
+                 "gramatikou a je automaticky použita, pokud je novější než soubor s gramatikou.")
+        compile_grammars_subparser.add_argument("--lang",
+                                                help="Předkompiluje pouze gramatiky daných jazyků.",
+                                                nargs="+", type=str, required=False, default=None)
+        compile_grammars_subparser.set_defaults(func=call_compile_grammars)
+
         subparsers_for_help = {
             'morphs': morphs_subparser,
-            "deriv": deriv_subparser
+            "deriv": deriv_subparser,
+            "compile-grammars": compile_grammars_subparser
         }
 
         if len(sys.argv) < 2:
@@ -637,11 +841,14 @@ def writeDerivRep(writeTo: str, derivClasses: Dict[str, Dict[str, Dict[List[Gram
                         writer.writerow([lang, typeG, unknownFlag, len(sharedNames), repr(name)])
 
 
-def langLoad(configAll: Dict) -> Dict[str, Language]:
+def langLoad(configAll: Dict, maCache: Optional[MACache] = None,
+             maProfile: MAProfile = MAProfile.FULL) -> Dict[str, Language]:
     """
     Načtení jazyků.
 
     :param configAll: programová konfigurace
+    :param maCache: Perzistentní cache pro morfologické analyzátory.
+    :param maProfile: Profil analýzy pro morfologické analyzátory.
     :return: Načtené jazyky
         kód jazyka -> jazyk
     """
@@ -660,7 +867,22 @@ def langLoad(configAll: Dict) -> Dict[str, Language]:
                                titles=configAll[ConfigManager.sectionDataFiles]["TITLES"],
                                eqGen=configAll[ConfigManager.sectionDataFiles]["EQ_GEN"],
                                ma=configAll[ConfigManager.sectionDataFiles]["MA"],
-                               gTimeout=configAll[ConfigManager.sectionGrammar]["TIMEOUT"])
+                               gTimeout=configAll[ConfigManager.sectionGrammar]["TIMEOUT"],
+                               gParser=configAll[ConfigManager.sectionGrammar]["PARSER"],
+                               gMaxDerivations=configAll[ConfigManager.sectionGrammar]["MAX_DERIVATIONS"],
+                               maOptions={
+                                   "persistent": configAll[ConfigManager.sectionMA]["PERSISTENT_PROCESS"],
+                                   "stallTimeout": configAll[ConfigManager.sectionMA][
+                                       "PERSISTENT_PROCESS_STALL_TIMEOUT"],
+                                   "cache": maCache,
+                                   "compactDatabase": configAll[ConfigManager.sectionMA]["WORD_DATABASE"] == "compact",
+                                   "databaseDirectory": configAll[ConfigManager.sectionMA]["WORD_DATABASE_DIRECTORY"],
+                                   "lazy": configAll[ConfigManager.sectionMA]["LAZY_ANALYSIS"],
+                                   "lazyBatchSize": configAll[ConfigManager.sectionMA]["LAZY_BATCH_SIZE"],
+                                   "profile": maProfile,
+                                   "shards": configAll[ConfigManager.sectionMA]["SHARDS"],
+                                   "maxBatchBytes": configAll[ConfigManager.sectionMA]["MAX_BATCH_BYTES"]
+                               })
 
                 languages[lng.code] = lng
             except Errors.ExceptionMessageCode as e:
@@ -669,13 +891,15 @@ def langLoad(configAll: Dict) -> Dict[str, Language]:
     return languages
 
 
-def initMorphoAnalyzers(allWords: Set[Word], languages: Dict[str, Language], configAll: Dict):
+def initMorphoAnalyzers(allWords: Set[Word], languages: Dict[str, Language], configAll: Dict,
+                        incremental: bool = False):
     """
     Provede inicializaci morfologických analyzátoru pro dané jazyky.
 
     :param allWords: Všechna slova pro všechny jazyky.
     :param languages: jazyky jejichž morfologické analyzátory chceme inicializovat
     :param configAll: programová konfigurace
+    :param incremental: True -> již inicializované analyzátory jsou pouze rozšířeny o dosud neznámá slova.
     """
 
     # filtrace slov do příslušných jazyků
@@ -689,16 +913,31 @@ def initMorphoAnalyzers(allWords: Set[Word], languages: Dict[str, Language], con
             # naznámý jazyk
             continue
 
-    for code, lang in languages.items():
-        lang.initMAnalyzer(langWords[code])
+    def analyzeLanguage(code: str):
+        lang = languages[code]
+        with MorphoAnalyzerLibma.SHARED_STATE_LOCK:
+            if incremental:
+                lang.extendMAnalyzer(langWords[code])
+            else:
+                lang.initMAnalyzer(langWords[code])
+
+    if configAll[ConfigManager.sectionMA]["PARALLEL_LANGUAGES"] and len(languages) > 1:
+        # Analyzátory jednotlivých jazyků běží souběžně, viz SharedStateLock.
+        with ThreadPoolExecutor(len(languages)) as executor:
+            for _ in executor.map(analyzeLanguage, languages):
+                pass
+    else:
+        for code in languages:
+            analyzeLanguage(code)
 
 
-def prepareNameDependantAnalysys(names: NameReader, languages: Dict[str, Language]):
+def prepareNameDependantAnalysys(names: NameReader, languages: Dict[str, Language], incremental: bool = False):
     """
     Provede přípravu na jméně závislé analýzy pro všechny jazyky.
 
     :param names: všechna uvažovaná jména
     :param languages: Všechny uvažované jazyky, které chceme použít.
+    :param incremental: True -> jména jsou přidána k již dříve připraveným jménům (zpracování po dávkách).
     """
 
     # filtrace jmen do příslušných jazyků
@@ -713,7 +952,22 @@ def prepareNameDependantAnalysys(names: NameReader, languages: Dict[str, Languag
             continue
 
     for code, lang in languages.items():
-        lang.ma.prepareNameDependentAnalysis(langNames[code])
+        lang.ma.prepareNameDependentAnalysis(langNames[code], incremental)
+
+
+_workerPipeline = None
+"""Pipeline, kterou procesy při paralelním generování zdědí (fork) od hlavního procesu."""
+
+
+def _generateShardInWorker(shard: Tuple[int, int]):
+    """
+    Vygeneruje tvary pro danou část jmen v pracovním procesu.
+
+    :param shard: Rozsah jmen [začátek, konec) v aktuálně zpracovávaných jménech.
+    :type shard: Tuple[int, int]
+    :return: Viz GenMorphsPipeline.generateShard
+    """
+    return _workerPipeline.generateShard(*shard)
 
 
 class GenMorphsPipeline:
@@ -731,17 +985,34 @@ class GenMorphsPipeline:
         self.derivClasses = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(set))))
         # derivClasses je dict formátu:
         #   [jazyk][gramatika][derivace][True/False - False jména s neznámou analýzou slova] = množina jmen
+        self.stream = hasattr(args, "stream") and args.stream
+        self.workers = args.workers if hasattr(args, "workers") and args.workers is not None else 1
+        if self.workers < 1:
+            raise Errors.ExceptionMessageCode(Errors.ErrorMessenger.CODE_INVALID_ARGUMENTS,
+                                              "Počet procesů (--workers) musí být alespoň 1.")
+        if self.workers > 1 and self.configAll[ConfigManager.sectionGenerators]["ABBRE_FORM_OF_PREPOSITIONS"]:
+            # Nově vygenerovaná jména jedné části by ostatní části při kontrole duplicit neviděly.
+            raise Errors.ExceptionMessageCode(Errors.ErrorMessenger.CODE_INVALID_ARGUMENTS,
+                                              "Více procesů (--workers) nelze použít se zapnutým generováním nových "
+                                              "jmen (GENERATORS/ABBRE_FORM_OF_PREPOSITIONS).")
+        self.maCache = self.openMACache()
         self.languages = self.loadLangauges()
+        # otisky, na kterých jsou závislé výsledky jmen, viz makeResultFingerprints
+        self.resultFingerprints = self.makeResultFingerprints()
+        self.previousOutput = self.readPreviousOutput()
+        # Výsledky aktuálně zpracovávaných jmen převzaté z předchozího výstupu (viz selectPreviousResults).
+        # Klíč viz nameCacheKey.
+        self.previousEntries = {}
+        self.previousReusedCnt = 0
+        # Jména v třídách ekvivalence korespondencí zkratek předložek (viz selectPreviousResults).
+        self._previousEqRelations = defaultdict(set)
         self.namesR = self.readNames()
-        self.filterNames()
-        self.generatedNames = self.equGen()
-        self.namesR.names = self.namesR.names + self.generatedNames  # must to add it here because of the analyzer
-        self.wordsAnalysis()
-        self.filterEquGen()
-        self.prepareNameDependantAnalysis()
-        self.sortNames()
+        if not self.stream:
+            self.prepareNames()
         self.generateNewNames = self.prepareGenerators()
 
+        self.namesCnt = 0  # počet zpracovávaných jmen (včetně rozgenerovaných)
+
         # čítače chyb
         self.errorsOthersCnt = 0
         self.errorsGrammerCnt = 0  # není v gramatice
@@ -777,21 +1048,341 @@ class GenMorphsPipeline:
             self.wordRules[WordTypeMark.LOCATION] = {}
             self.writeWordsOfTypeTo[WordTypeMark.LOCATION] = self.args.locations
 
-        self.duplicityCheck = set()  # zde se budou ukládat jména pro zamezení duplicit
+        # Zde se budou ukládat klíče jmen (viz duplicityKey) pro zamezení duplicit.
+        # Při zpracování po dávkách je sdílen napříč dávkami.
+        self.duplicityCheck = set()
+        # Klíče jmen zpracovaných před spuštěním pracovních procesů. Pracovní procesy je pouze čtou a nové klíče
+        # ukládají do duplicityCheck, který je pak sloučen s hlavním procesem.
+        self.duplicityCheckPrevious = frozenset()
+
+        self.nameCache = self.openNameCache()
+        # Výsledky jmen z cache pro aktuálně zpracovávaná jména (viz loadNameCache) a nově získané výsledky, které
+        # budou do cache uloženy (viz storeNameCache). Klíč viz nameCacheKey.
+        self.nameCacheEntries = {}
+        self.nameCacheNew = {}
+        self.nameCacheHits = 0
+        self.nameCacheMisses = 0
+        # Řádky výsledku právě generovaného jména pro uložení do cache v pořadí přidání (viz addMorphsLine).
+        # None -> neukládá se.
+        self._nameCacheRecord = None
+
+    @staticmethod
+    def duplicityKey(name) -> Tuple[str, Any, str]:
+        """
+        Klíč jména pro kontrolu duplicit. Dvě jména mají stejný klíč, pokud se rovnají (viz Name.__eq__).
+        Nedrží samotné jméno, takže se nemusí v paměti uchovávat všechna již zpracovaná jména.
+
+        :param name: Jméno pro které chceme klíč.
+        :type name: Name
+        :return: Klíč jména.
+        :rtype: Tuple[str, Any, str]
+        """
+
+        return str(name), name.language, str(name.type)
+
+    def isDuplicit(self, nameKey) -> bool:
+        """
+        Zjistí, zda-li již bylo jméno s daným klíčem zpracováno.
+
+        :param nameKey: Klíč jména (viz duplicityKey).
+        :return: True pokud již bylo zpracováno.
+        :rtype: bool
+        """
+
+        return nameKey in self.duplicityCheck or nameKey in self.duplicityCheckPrevious
+
+    def prepareNames(self):
+        """
+        Připraví aktuálně načtená jména ke generování.
+        Při zpracování po dávkách je voláno pro každou dávku.
+        """
+
+        self.filterNames()
+        self.generatedNames = self.equGen()
+        self.namesR.names = self.namesR.names + self.generatedNames  # must to add it here because of the analyzer
+        self.selectPreviousResults()
+        self.wordsAnalysis()
+        self.filterEquGen()
+        self.prepareNameDependantAnalysis()
+        self.sortNames()
+
+    def openMACache(self) -> Optional[MACache]:
+        """
+        Otevře perzistentní cache morfologického analyzátoru, pokud ji uživatel chce používat.
+
+        :return: Cache nebo None, pokud se nemá používat.
+        :rtype: Optional[MACache]
+        """
+
+        path = self.args.ma_cache if hasattr(self.args, "ma_cache") and self.args.ma_cache is not None \
+            else self.configAll[ConfigManager.sectionDataFiles]["MA_CACHE"]
+        if path is None:
+            return None
+
+        return MACache(path, self.configAll[ConfigManager.sectionDataFiles]["MA_CACHE_MAX_ENTRIES"])
+
+    def openNameCache(self) -> Optional[NameCache]:
+        """
+        Otevře perzistentní cache výsledků jmen, pokud ji uživatel chce používat.
+
+        :return: Cache nebo None, pokud se nemá používat.
+        :rtype: Optional[NameCache]
+        """
+
+        path = self.args.name_cache if hasattr(self.args, "name_cache") and self.args.name_cache is not None \
+            else self.configAll[ConfigManager.sectionDataFiles]["NAME_CACHE"]
+        if path is None:
+            return None
+
+        if len(self.wordRules) > 0 or self.derivClassesOutput is not None or self.args.verbose:
+            # tyto výstupy vyžadují analýzu každého jména
+            logging.warning("Cache výsledků jmen se nepoužije, protože je požadován výpis druhů slov, tříd derivací "
+                            "nebo derivací jmen.")
+            return None
+
+        return NameCache(path, self.configAll[ConfigManager.sectionDataFiles]["NAME_CACHE_MAX_ENTRIES"])
+
+    def makeResultFingerprints(self) -> Dict[str, str]:
+        """
+        Vytvoří otisky, na kterých jsou závislé výsledky jmen (cache výsledků jmen, předchozí výstup). Zahrnují data
+        jazyka (viz Language.fingerprint), konfiguraci ovlivňující výsledky a zdrojové kódy programu.
+
+        :return: kód jazyka -> otisk
+        :rtype: Dict[str, str]
+        """
+
+        programFiles = [os.path.abspath(__file__)]
+        for root, _, files in os.walk(os.path.dirname(os.path.abspath(namegenPack.__file__))):
+            programFiles.extend(os.path.join(root, f) for f in files if f.endswith(".py"))
+        programFiles.sort()
+
+        parts = [type(self).__name__, self.args.whole] + \
+                [self.configAll[section] for section in (ConfigManager.sectionDefault, ConfigManager.sectionGenerators,
+                                                         ConfigManager.sectionGrammar, ConfigManager.sectionDeriv)]
+
+        return {code: NameCache.fingerprint(parts + [lng.fingerprint()], programFiles)
+                for code, lng in self.languages.items()}
+
+    def nameCacheKey(self, name) -> Optional[Tuple[str, str, str]]:
+        """
+        Klíč jména v cache výsledků jmen.
+
+        :param name: Jméno se známým jazykem.
+        :type name: Name
+        :return: Klíč (kód jazyka, druh jména, jméno). None pokud se cache nepoužívá, nebo výsledek jména může záviset
+            na ostatních jménech.
+        :rtype: Optional[Tuple[str, str, str]]
+        """
+
+        if self.nameCache is None or self.languages[name.language.code].ma.hasNameDependantAnalysis(name):
+            return None
+
+        return name.language.code, str(name.type), str(name)
+
+    def loadNameCache(self):
+        """
+        Načte z cache výsledky aktuálně zpracovávaných jmen.
+        """
+
+        if self.nameCache is None:
+            return
+
+        keys = defaultdict(set)
+        for name in self.namesR.names:
+            if name.language is not None:
+                keys[name.language.code].add((str(name.type), str(name)))
+
+        self.nameCacheEntries = {}
+        for code, langKeys in keys.items():
+            for (nameType, nameStr), entry in self.nameCache.get(code, self.resultFingerprints[code],
+                                                                 langKeys).items():
+                self.nameCacheEntries[(code, nameType, nameStr)] = entry
+
+    def storeNameCache(self):
+        """
+        Uloží nově získané výsledky jmen do cache.
+        """
+
+        if self.nameCache is None:
+            return
+
+        results = defaultdict(dict)
+        for (code, nameType, nameStr), entry in self.nameCacheNew.items():
+            results[code][(nameType, nameStr)] = entry
+
+        for code, langResults in results.items():
+            self.nameCache.put(code, self.resultFingerprints[code], langResults)
+
+        self.nameCacheNew = {}
+
+    FINGERPRINTS_SUFFIX = ".fingerprints"
+    """Přípona souboru s otisky (viz makeResultFingerprints), který je vytvořen vedle výstupního souboru."""
+
+    def readPreviousOutput(self) -> Optional[Dict[Tuple[str, str, str], List[str]]]:
+        """
+        Načte předchozí výstup (--previous), ze kterého budou převzaty tvary nezměněných jmen.
+        Použijí se pouze jazyky, jejichž otisk (uložený v souboru s příponou FINGERPRINTS_SUFFIX) se shoduje
+        s aktuálním.
+
+        :return: (kód jazyka, druh jména, jméno) -> tvary (sloupec s tvary) v pořadí, v jakém byly ve výstupu.
+            None pokud se předchozí výstup nepoužívá.
+        :rtype: Optional[Dict[Tuple[str, str, str], List[str]]]
+        """
+
+        if not hasattr(self.args, "previous") or self.args.previous is None:
+            return None
+
+        if any(getattr(self.args, a, None) is not None for a in ("error_words", "given_names", "surnames",
+                                                                   "locations", "deriv")) or self.args.verbose:
+            # tyto výstupy vyžadují analýzu každého jména
+            logging.warning("Předchozí výstup se nepoužije, protože je požadován výpis chybových slov, druhů slov, "
+                            "tříd derivací nebo derivací jmen.")
+            return None
+
+        if self.configAll[ConfigManager.sectionGenerators]["ABBRE_FORM_OF_PREPOSITIONS"]:
+            # vygenerovaná jména nelze v předchozím výstupu přiřadit ke jménům, ze kterých vznikla
+            logging.warning("Předchozí výstup se nepoužije, protože je zapnuto generování nových jmen.")
+            return None
+
+        validLanguages = set()
+        try:
+            with open(self.args.previous + self.FINGERPRINTS_SUFFIX, "r") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2 and self.resultFingerprints.get(parts[0]) == parts[1]:
+                        validLanguages.add(parts[0])
+        except OSError:
+            logging.warning("Předchozí výstup se nepoužije, protože chybí soubor s otisky: " +
+                            self.args.previous + self.FINGERPRINTS_SUFFIX)
+            return None
+
+        previous = defaultdict(list)
+        with open(self.args.previous, "r") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) < 4 or parts[1] not in validLanguages or len(parts[3]) == 0:
+                    # Řádky bez tvarů (--include-no-morphs) nepřebíráme, jméno se zpracuje znovu.
+                    continue
+                morphs = previous[(parts[1], parts[2], parts[0])]
+                if parts[3] not in morphs:
+                    morphs.append(parts[3])
+
+        return dict(previous)
+
+    def selectPreviousResults(self):
+        """
+        Vybere aktuálně zpracovávaná jména, jejichž tvary budou převzaty z předchozího výstupu.
+        Jsou to jména ze vstupu (ne rozgenerovaná), která jsou v předchozím výstupu a jejichž analýza nemůže
+        záviset na ostatních jménech (viz MorphoAnalyzer.hasNameDependantAnalysis).
+        """
+
+        self.previousEntries = {}
+        if self.previousOutput is None:
+            return
+
+        generated = set(id(n) for n in self.generatedNames)
+        # Analyzátory ještě nemusí být inicializovány, proto hledáme korespondence zkratek předložek přímo.
+        for n in self.namesR.names:
+            if n.language is not None and len(n) > 2:
+                self._previousEqRelations[EQRelationForPrepAndItsAbbre(n)].add((str(n), str(n.type)))
+
+        for name in self.namesR.names:
+            if name.language is None or id(name) in generated:
+                continue
+            key = (name.language.code, str(name.type), str(name))
+            try:
+                morphs = self.previousOutput[key]
+            except KeyError:
+                continue
+
+            if len(name) > 2 and len(self._previousEqRelations[EQRelationForPrepAndItsAbbre(name)]) > 1:
+                continue
+
+            self.previousEntries[key] = (name.generated, key[1],
+                                         [((key[2], key[0], key[1], m), (), None) for m in morphs])
+
+    def writeResultFingerprints(self):
+        """
+        Uloží otisky (viz makeResultFingerprints) vedle výstupního souboru, aby mohl být výstup později použit
+        jako předchozí (--previous).
+        """
+
+        if not hasattr(self.args, "previous") or not self.args.output:
+            return
+
+        with open(self.args.output + self.FINGERPRINTS_SUFFIX, "w") as f:
+            for code, fingerprint in sorted(self.resultFingerprints.items()):
+                print(code + "\t" + fingerprint, file=f)
+
+    def writeCachedResult(self, name, nameKey, entry) -> bool:
+        """
+        Vypíše výsledek jména uložený v cache s doplňujícími informacemi aktuálního jména.
+
+        :param name: Jméno, jehož výsledek se vypisuje.
+        :type name: Name
+        :param nameKey: Klíč jména pro kontrolu duplicit (viz duplicityKey).
+        :type nameKey: Tuple[str, Any, str]
+        :param entry: Výsledek jména z cache (viz generateForSingleName).
+        :type entry: Tuple[bool, str, List[Tuple[Tuple[str, ...], Tuple[str, ...], Optional[Tuple[str, str, str]]]]]
+        :return: False pokud výsledek nelze pro dané jméno použít, jinak True.
+        :rtype: bool
+        """
+
+        generated, nameType, rows = entry
+        if generated != name.generated:
+            return False
+
+        if nameType != nameKey[2]:
+            # druh jména byl upřesněn (viz generateForSingleName)
+            self.duplicityCheck.discard(nameKey)
+
+        # Řádky jsou uloženy v pořadí, v jakém byly přidány mezi výsledky. Množina je tedy vypsána ve stejném pořadí
+        # jako při zpracování jména bez cache.
+        lines = set()
+        generatedKeys = []
+        for columns, tail, genKey in rows:
+            if genKey is not None:
+                genKey = (genKey[0], self.languages[genKey[1]], genKey[2])
+                if self.isDuplicit(genKey):
+                    continue
+                generatedKeys.append(genKey)
+            lines.add(self.morphsLine(columns, name.additionalInfo, tail))
+
+        for line in lines:
+            print(line, file=self.outF)
+
+        self.duplicityCheck.update(generatedKeys)
+
+        if hasattr(self.args, "include_no_morphs") and self.args.include_no_morphs and len(lines) == 0:
+            # uživatel chce vytisknout i slova bez tvarů
+            print(name.printName(self.NUMBER_OF_TSV_COLUMNS), file=self.outF)
+
+        return True
 
     def loadLangauges(self):
         logging.info("načtení jazyků")
-        languages = langLoad(self.configAll)
+        languages = langLoad(self.configAll, self.maCache, self.maProfile())
         logging.info("\thotovo")
         return languages
 
+    def maProfile(self) -> MAProfile:
+        """
+        Profil analýzy pro morfologické analyzátory. Tvary jmen nepotřebují odvozená slova.
+
+        :return: Profil analýzy.
+        :rtype: MAProfile
+        """
+
+        return MAProfile()
+
     def readNames(self):
         logging.info("čtení jmen")
         # načtení jmen pro zpracování
         namesR = NameReader(languages=self.languages,
                             langDef=self.args.def_lang,
                             inputFile=self.args.input,
-                            shouldSort=False)
+                            shouldSort=False,
+                            chunkSize=self.args.stream_chunk_size if self.stream else None)
         logging.info("\thotovo")
         return namesR
 
@@ -820,7 +1411,11 @@ class GenMorphsPipeline:
         logging.info("analýza slov")
         # přiřazení morfologických analyzátoru
         # Tyto analyzátory jsou nastaveny tak, že z ma ignorují všechny hovorové tvary.
-        initMorphoAnalyzers(self.namesR.allWords(True), self.languages, self.configAll)
+        # jména převzatá z předchozího výstupu není nutné analyzovat
+        names = None if len(self.previousEntries) == 0 else \
+            [n for n in self.namesR.names
+             if n.language is None or (n.language.code, str(n.type), str(n)) not in self.previousEntries]
+        initMorphoAnalyzers(self.namesR.allWords(True, names), self.languages, self.configAll, self.stream)
         logging.info("\thotovo")
 
     def filterEquGen(self):
@@ -839,7 +1434,7 @@ class GenMorphsPipeline:
 
     def prepareNameDependantAnalysis(self):
         logging.info("analýza slov závislá na jménu")
-        prepareNameDependantAnalysys(self.namesR, self.languages)
+        prepareNameDependantAnalysys(self.namesR, self.languages, self.stream)
         logging.info("\thotovo")
 
     def sortNames(self):
@@ -916,20 +1511,10 @@ class GenMorphsPipeline:
                 # Uživatel chce tisknout pouze pokud máme tvary pro všechny pády.
                 # je to tu znovu kvuli nove vygenerovanym
                 continue
-            resAdd = str(nameToWrite) + "\t" + str(nameToWrite.language.code) + "\t" + str(
-                nameToWrite.type) + "\t" + (
-                         "|".join(str(m) for m in morphsToWrite))
-            if len(nameToWrite.additionalInfo) > 0:
-                resAdd += "\t" + ("\t".join(nameToWrite.additionalInfo))
-            if nameToWrite.generated:
-                resAdd += "\tG"
-
-            missing = self.NUMBER_OF_TSV_COLUMNS - 4 - len(nameToWrite.additionalInfo) - nameToWrite.generated
-
-            if missing > 0:
-                resAdd += "\t" * missing
-
-            completedMorphs.add(resAdd)
+            self.addMorphsLine(completedMorphs, name, nameToWrite,
+                               (str(nameToWrite), str(nameToWrite.language.code), str(nameToWrite.type),
+                                "|".join(str(m) for m in morphsToWrite)),
+                               ("G",) if nameToWrite.generated else ())
             if self.args.verbose:
                 logging.info(str(nameToWrite) + "\tDerivace:")
                 for r in ru:
@@ -940,6 +1525,62 @@ class GenMorphsPipeline:
                         logging.info(
                             "\t\t" + str(a.token.word) + "\t" + str(a.matchingTerminal))
 
+    def morphsLine(self, columns: Sequence[str], additionalInfo: Sequence[str], tail: Sequence[str]) -> str:
+        """
+        Vytvoří výstupní řádek s tvary jména. Chybějící sloupce jsou doplněny prázdnými.
+
+        :param columns: Sloupce jméno, jazyk, druh jména a tvary.
+        :type columns: Sequence[str]
+        :param additionalInfo: Doplňující informace jména ze vstupu.
+        :type additionalInfo: Sequence[str]
+        :param tail: Sloupce za doplňujícími informacemi.
+        :type tail: Sequence[str]
+        :return: Výstupní řádek.
+        :rtype: str
+        """
+
+        allColumns = list(columns) + list(additionalInfo) + list(tail)
+        line = "\t".join(allColumns)
+
+        # add missing empty fields
+        missing = self.NUMBER_OF_TSV_COLUMNS - len(allColumns)
+        if missing > 0:
+            line += "\t" * missing
+        return line
+
+    def addMorphsLine(self, completedMorphs: Set[str], name, nameToWrite, columns: Tuple[str, str, str, str],
+                      tail: Tuple[str, ...]):
+        """
+        Přidá výstupní řádek s tvary jména mezi výsledky zpracovávaného jména.
+
+        :param completedMorphs: Výsledky zpracovávaného jména.
+        :type completedMorphs: Set[str]
+        :param name: Zpracovávané jméno.
+        :type name: Name
+        :param nameToWrite: Jméno, ke kterému řádek patří (zpracovávané nebo z něj vygenerované).
+        :type nameToWrite: Name
+        :param columns: Sloupce jméno, jazyk, druh jména a tvary.
+        :type columns: Tuple[str, str, str, str]
+        :param tail: Sloupce za doplňujícími informacemi.
+        :type tail: Tuple[str, ...]
+        """
+
+        line = self.morphsLine(columns, nameToWrite.additionalInfo, tail)
+        completedMorphs.add(line)
+
+        if self._nameCacheRecord is not None:
+            # Doplňující informace zpracovávaného jména se v cache neukládají, jsou převzaty z aktuálního jména.
+            prefixLen = len(name.additionalInfo)
+            if list(nameToWrite.additionalInfo[:prefixLen]) != list(name.additionalInfo):
+                self._nameCacheRecord[line] = None
+            else:
+                self._nameCacheRecord[line] = (
+                    columns,
+                    tuple(nameToWrite.additionalInfo[prefixLen:]) + tuple(tail),
+                    None if nameToWrite is name else
+                    (str(nameToWrite), nameToWrite.language.code, str(nameToWrite.type))
+                )
+
     def generateDerivations(self, name, rules, aTokens):
         completedMorphs = set()  # pro odstranění dualit používáme set
         noMorphsWords = set()
@@ -999,7 +1640,7 @@ class GenMorphsPipeline:
                         generatedNamesNotDuplicit = []
                         if generatedNames is not None:
                             for genName, genNameMorphs in generatedNames:
-                                if genName not in self.duplicityCheck:
+                                if not self.isDuplicit(self.duplicityKey(genName)):
                                     generatedNamesNotDuplicit.append((genName, genNameMorphs))
 
                                     # Přidáme nově vygenerovaná jména, abychom je znovu nemuseli případně dále procházet.
@@ -1038,9 +1679,13 @@ class GenMorphsPipeline:
         for m in completedMorphs:
             print(m, file=self.outF)
 
+        if len(noMorphsWords) > 0 or len(missingCaseWords) > 0:
+            # chybová hlášení by se při použití cache nevypsala
+            self._nameCacheRecord = None
+
         # Přidáme nově vygenerovaná jména, abychom je znovu nemuseli případně dále procházet.
         for gn in generatedNamesThatShouldBeInDuplicityCheckSet:
-            self.duplicityCheck.add(gn)
+            self.duplicityCheck.add(self.duplicityKey(gn))
 
         # zjistíme, zda-li uživatel nechce vypsat nějaké typy jmen do souborů
 
@@ -1076,11 +1721,26 @@ class GenMorphsPipeline:
         wNoInfo = set()  # Zde budou uložena slova nemající analýzu, která by ji měla mít.
 
         try:
-            if name in self.duplicityCheck:
+            nameKey = self.duplicityKey(name)
+            if self.isDuplicit(nameKey):
                 # již jsme jednou generovali
                 self.errorsDuplicity += 1
                 return
-            self.duplicityCheck.add(name)
+            self.duplicityCheck.add(nameKey)
+
+            previousKey = (name.language.code, str(name.type), str(name))
+            if previousKey in self.previousEntries and \
+                    self.writeCachedResult(name, nameKey, self.previousEntries[previousKey]):
+                self.previousReusedCnt += 1
+                return
+
+            cacheKey = self.nameCacheKey(name)
+            if cacheKey is not None:
+                if cacheKey in self.nameCacheEntries and \
+                        self.writeCachedResult(name, nameKey, self.nameCacheEntries[cacheKey]):
+                    self.nameCacheHits += 1
+                    return
+                self.nameCacheMisses += 1
 
             tokens = lang.lex.getTokens(name)
 
@@ -1100,6 +1760,11 @@ class GenMorphsPipeline:
                 else:
                     rules, aTokens = None, None
 
+                if self.duplicityKey(name) != nameKey:
+                    # Druh jména byl upřesněn, takže se již neshoduje s jménem, pod kterým bylo uloženo.
+                    # Další výskyt jména s neupřesněným druhem tedy nepovažujeme za duplicitu.
+                    self.duplicityCheck.discard(nameKey)
+
                 if self.nameTypeGuard(name):
                     self.errorsUnknownNameType += 1
                     return
@@ -1114,8 +1779,16 @@ class GenMorphsPipeline:
 
                 self.priorityDerivationFilter(aTokens, rules)
 
+                self._nameCacheRecord = {} if cacheKey is not None else None
                 morphsPrinted = self.generateDerivations(name, rules, aTokens)
 
+                if self._nameCacheRecord is not None and len(wNoInfo) == 0 and \
+                        all(r is not None for r in self._nameCacheRecord.values()):
+                    # Uložíme pouze výsledky bez chyb, jelikož chybová hlášení a chybová slova se z cache neopakují.
+                    self.nameCacheNew[cacheKey] = (name.generated, str(name.type),
+                                                   list(self._nameCacheRecord.values()))
+                self._nameCacheRecord = None
+
             else:
                 for word, word_mark in wNoInfo:
                     try:
@@ -1127,7 +1800,9 @@ class GenMorphsPipeline:
         except namegenPack.Grammar.Grammar.TimeoutException as e:
             # Při provádění syntaktické analýzy, nad aktuálním jménem, došlo k timeoutu.
             self.errorsTimout += 1
-            print(e.message + "\t" + str(name) + "\t" + str(name.type), file=sys.stderr, flush=True)
+            print(e.message + "\t" + str(name) + "\t" + str(name.type) +
+                  "\tnalezené derivace: " + str(len(e.derivations[0])) + "\tzpracované tokeny: " + str(e.position),
+                  file=sys.stderr, flush=True)
 
         except Word.WordException as e:
             if isinstance(e, Word.WordCouldntGetInfoException):
@@ -1155,6 +1830,186 @@ class GenMorphsPipeline:
             # uživatel chce vytisknout i slova bez tvarů
             print(name.printName(self.NUMBER_OF_TSV_COLUMNS), file=self.outF)
 
+    def shards(self) -> List[Tuple[int, int]]:
+        """
+        Rozdělí aktuálně zpracovávaná jména na části pro paralelní generování.
+        Jména se stejným řetězcem jsou vždy ve stejné části, aby byla zachována kontrola duplicit.
+
+        :return: Rozsahy [začátek, konec) jednotlivých částí v pořadí jmen.
+        :rtype: List[Tuple[int, int]]
+        """
+
+        names = self.namesR.names
+        # více částí než procesů, aby se vyrovnaly rozdíly v náročnosti jednotlivých částí
+        shardSize = max(1, math.ceil(len(names) / (self.workers * 4)))
+
+        shards = []
+        start = 0
+        while start < len(names):
+            end = min(start + shardSize, len(names))
+            while end < len(names) and str(names[end]) == str(names[end - 1]):
+                end += 1
+            shards.append((start, end))
+            start = end
+        return shards
+
+    def resetResults(self):
+        """
+        Vynuluje čítače a nasbírané výsledky (chybová slova, druhy slov, třídy derivací a statistiky gramatik).
+        Používá se v pracovních procesech, aby vracely pouze výsledky své části jmen.
+        """
+
+        self.errorsOthersCnt = 0
+        self.errorsGrammerCnt = 0
+        self.errorsUnknownNameType = 0
+        self.errorsDuplicity = 0
+        self.errorsTimout = 0
+        self.errorWords = {}
+        self.wordRules = {wordType: {} for wordType in self.wordRules}
+        self.derivClasses = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(set))))
+        self.nameCacheNew = {}
+        self.nameCacheHits = 0
+        self.nameCacheMisses = 0
+        self.previousReusedCnt = 0
+        for lng in self.languages.values():
+            for g in [lng.gFemale, lng.gMale, lng.gLocations, lng.gEvents]:
+                g.grammarEllapsedTime = 0
+                g.grammarNumOfAnalyzes = 0
+
+    def generateShard(self, start: int, end: int):
+        """
+        Vygeneruje tvary pro část aktuálně zpracovávaných jmen. Volá se v pracovním procesu.
+
+        :param start: Index prvního jména.
+        :type start: int
+        :param end: Index za posledním jménem.
+        :type end: int
+        :return: Výstup pro danou část a nasbírané výsledky (viz mergeShardResults).
+        :rtype: Tuple[str, Dict[str, Any]]
+        """
+
+        self.resetResults()
+        self.duplicityCheck = set()
+        self.outF = io.StringIO()
+        matchCaches = [Terminal.MATCH_CACHE, namegenPack.Grammar.Grammar.TerminalIndex.CACHE,
+                       namegenPack.Grammar.Grammar.ParsingTableSymbolRow.CACHE]
+        matchCachesStart = [(c.hits, c.misses) for c in matchCaches]
+        morphsCacheStart = (MorphoAnalyze.MORPHS_CACHE.hits, MorphoAnalyze.MORPHS_CACHE.misses)
+
+        for name in self.namesR.names[start:end]:
+            self.generateForSingleName(name)
+
+        results = {
+            "errorsOthersCnt": self.errorsOthersCnt,
+            "errorsGrammerCnt": self.errorsGrammerCnt,
+            "errorsUnknownNameType": self.errorsUnknownNameType,
+            "errorsDuplicity": self.errorsDuplicity,
+            "errorsTimout": self.errorsTimout,
+            "duplicityCheck": self.duplicityCheck,
+            "errorWords": self.errorWords,
+            "wordRules": self.wordRules,
+            # defaultdict s lambdou nelze přenést mezi procesy
+            "derivClasses": {lang: {typeG: {deriv: dict(groups) for deriv, groups in derivations.items()}
+                                    for typeG, derivations in types.items()}
+                             for lang, types in self.derivClasses.items()},
+            "grammars": {lngCode: [(g.grammarEllapsedTime, g.grammarNumOfAnalyzes)
+                                   for g in [lng.gFemale, lng.gMale, lng.gLocations, lng.gEvents]]
+                         for lngCode, lng in self.languages.items()},
+            "matchCaches": [(c.hits - hits, c.misses - misses) for c, (hits, misses) in zip(matchCaches,
+                                                                                             matchCachesStart)],
+            "morphsCache": (MorphoAnalyze.MORPHS_CACHE.hits - morphsCacheStart[0],
+                            MorphoAnalyze.MORPHS_CACHE.misses - morphsCacheStart[1]),
+            "nameCache": (self.nameCacheHits, self.nameCacheMisses, self.nameCacheNew),
+            "previousReusedCnt": self.previousReusedCnt
+        }
+
+        return self.outF.getvalue(), results
+
+    def mergeShardResults(self, results: Dict[str, Any]):
+        """
+        Přidá výsledky z pracovního procesu k výsledkům tohoto.
+
+        :param results: Výsledky z generateShard.
+        :type results: Dict[str, Any]
+        """
+
+        self.errorsOthersCnt += results["errorsOthersCnt"]
+        self.errorsGrammerCnt += results["errorsGrammerCnt"]
+        self.errorsUnknownNameType += results["errorsUnknownNameType"]
+        self.errorsDuplicity += results["errorsDuplicity"]
+        self.errorsTimout += results["errorsTimout"]
+        self.duplicityCheck |= results["duplicityCheck"]
+
+        for k, names in results["errorWords"].items():
+            try:
+                self.errorWords[k] |= names
+            except KeyError:
+                self.errorWords[k] = names
+
+        for wordType, words in results["wordRules"].items():
+            for w, rules in words.items():
+                try:
+                    self.wordRules[wordType][w] = self.wordRules[wordType][w] | rules
+                except KeyError:
+                    self.wordRules[wordType][w] = rules
+
+        for lang, types in results["derivClasses"].items():
+            for typeG, derivations in types.items():
+                for deriv, groups in derivations.items():
+                    for unknownFlag, names in groups.items():
+                        self.derivClasses[lang][typeG][deriv][unknownFlag] |= names
+
+        for lngCode, grammarsStats in results["grammars"].items():
+            lng = self.languages[lngCode]
+            for g, (ellapsedTime, numOfAnalyzes) in zip([lng.gFemale, lng.gMale, lng.gLocations, lng.gEvents],
+                                                         grammarsStats):
+                g.grammarEllapsedTime += ellapsedTime
+                g.grammarNumOfAnalyzes += numOfAnalyzes
+
+        for c, (hits, misses) in zip([Terminal.MATCH_CACHE, namegenPack.Grammar.Grammar.TerminalIndex.CACHE,
+                                      namegenPack.Grammar.Grammar.ParsingTableSymbolRow.CACHE],
+                                     results["matchCaches"]):
+            c.hits += hits
+            c.misses += misses
+
+        MorphoAnalyze.MORPHS_CACHE.hits += results["morphsCache"][0]
+        MorphoAnalyze.MORPHS_CACHE.misses += results["morphsCache"][1]
+
+        self.nameCacheHits += results["nameCache"][0]
+        self.nameCacheMisses += results["nameCache"][1]
+        self.nameCacheNew.update(results["nameCache"][2])
+        self.previousReusedCnt += results["previousReusedCnt"]
+
+    def generateInParallel(self) -> int:
+        """
+        Vygeneruje tvary pro aktuálně zpracovávaná jména pomocí více procesů.
+        Procesy sdílí (fork) s tímto procesem jazyky včetně databáze morfologického analyzátoru.
+        Výstup je vypsán ve stejném pořadí jako při zpracování jedním procesem.
+
+        :return: Počet zpracovaných jmen.
+        :rtype: int
+        """
+
+        global _workerPipeline
+
+        for lng in self.languages.values():
+            # Procesy by jinak při lazy analýze komunikovaly se stejným procesem ma a jejich analýzy by nebyly sdíleny.
+            lng.ma.analyzePending()
+
+        self.outF.flush()
+        self.duplicityCheckPrevious = self.duplicityCheck
+        _workerPipeline = self
+        try:
+            with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+                for output, results in pool.imap(_generateShardInWorker, self.shards()):
+                    self.outF.write(output)
+                    self.mergeShardResults(results)
+        finally:
+            _workerPipeline = None
+            self.duplicityCheckPrevious = frozenset()
+
+        return len(self.namesR.names)
+
     def writeWordsOfType(self):
         for wordType, pathToWrite in self.writeWordsOfTypeTo.items():
             logging.info("\tVýpis slov typu: " + str(wordType))
@@ -1177,12 +2032,12 @@ class GenMorphsPipeline:
 
     def writeGenerationStats(self, startOfGenMorp, endOfGenMorp):
         print("-------------------------", file=sys.stderr)
-        print("Celkem jmen: " + str(self.namesR.errorCnt + len(self.namesR.names)), file=sys.stderr)
+        print("Celkem jmen: " + str(self.namesR.errorCnt + self.namesCnt), file=sys.stderr)
         print("\tNenačtených jmen: " + str(self.namesR.errorCnt), file=sys.stderr)
         print("\tDuplicitních jmen: " + str(self.errorsDuplicity), file=sys.stderr)
-        print("\tNačtených jmen/názvů celkem: ", len(self.namesR.names), file=sys.stderr)
+        print("\tNačtených jmen/názvů celkem: ", self.namesCnt, file=sys.stderr)
         print("\tPrůměrný čas strávený nad generováním tvarů jednoho jména/názvu: ",
-              round((endOfGenMorp - startOfGenMorp) / len(self.namesR.names), 3) if len(self.namesR.names) > 0 else 0,
+              round((endOfGenMorp - startOfGenMorp) / self.namesCnt, 3) if self.namesCnt > 0 else 0,
               file=sys.stderr)
 
         print("\tNeznámý druh jména:", self.errorsUnknownNameType, file=sys.stderr)
@@ -1190,6 +2045,28 @@ class GenMorphsPipeline:
         print("\tPočet jmen, u kterých došlo k timeoutu při syntaktické analýze:", self.errorsTimout, file=sys.stderr)
         print("\tPočet slov, které poskytnutý morfologický analyzátor nezná:",
               len(set(w for (_, _, _, _, w), _ in self.errorWords.items())), file=sys.stderr)
+        if self.maCache is not None:
+            print("\tCache morfologického analyzátoru (nalezeno/nenalezeno):", self.maCache.hits, "/",
+                  self.maCache.misses, file=sys.stderr)
+        if self.previousOutput is not None:
+            print("\tPřevzato z předchozího výstupu:", self.previousReusedCnt, file=sys.stderr)
+        if self.nameCache is not None:
+            print("\tCache výsledků jmen (nalezeno/nenalezeno):", self.nameCacheHits, "/", self.nameCacheMisses,
+                  file=sys.stderr)
+        print("\tCache shody terminálů s tokeny (nalezeno/nenalezeno):", Terminal.MATCH_CACHE.hits, "/",
+              Terminal.MATCH_CACHE.misses, file=sys.stderr)
+        print("\tCache terminálů gramatiky odpovídajících tokenu (nalezeno/nenalezeno):",
+              namegenPack.Grammar.Grammar.TerminalIndex.CACHE.hits, "/",
+              namegenPack.Grammar.Grammar.TerminalIndex.CACHE.misses, file=sys.stderr)
+        print("\tCache výběru pravidel z parsovací tabulky (nalezeno/nenalezeno):",
+              namegenPack.Grammar.Grammar.ParsingTableSymbolRow.CACHE.hits, "/",
+              namegenPack.Grammar.Grammar.ParsingTableSymbolRow.CACHE.misses, file=sys.stderr)
+        morphsLookups = MorphoAnalyze.MORPHS_CACHE.hits + MorphoAnalyze.MORPHS_CACHE.misses
+        print("\tCache tvarů slov (nalezeno/nenalezeno, úspěšnost):", MorphoAnalyze.MORPHS_CACHE.hits, "/",
+              MorphoAnalyze.MORPHS_CACHE.misses, ",",
+              str(round(100 * MorphoAnalyze.MORPHS_CACHE.hits / morphsLookups, 1) if morphsLookups > 0 else 0) + " %",
+              file=sys.stderr)
+
     def writeLanguagesStats(self):
         for lngCode, lng in self.languages.items():
             grammarFemale = lng.gFemale
@@ -1225,6 +2102,9 @@ class GenMorphsPipeline:
                   grammarEvents.grammarEllapsedTime / grammarEvents.grammarNumOfAnalyzes if grammarEvents.grammarNumOfAnalyzes > 0 else 0,
                   file=sys.stderr)
             print("\t\t\t\t Počet analýz:", grammarEvents.grammarNumOfAnalyzes, file=sys.stderr)
+            if lng.hasMAnalyzer:
+                print("\t\tSlova znovu poslaná ma / slova bez odpovědi ma:", lng.ma.retriedWords, "/",
+                      lng.ma.lostWords, file=sys.stderr)
 
             if self.errorWordsShouldSave:
                 # save words with errors into a file
@@ -1251,18 +2131,46 @@ class GenMorphsPipeline:
 
         startOfGenMorp = time.time()
 
-        for name in self.namesR:
-            self.generateForSingleName(name)
-            cnt += 1
-            if cnt % 100 == 0:
+        for namesChunk in self.namesR.chunks():
+            if self.stream:
+                # připravíme aktuální dávku, jména z předešlé dávky již byla zahozena
+                self.prepareNames()
+
+            self.namesCnt += len(namesChunk.names)
+            self.loadNameCache()
+
+            if self.workers > 1:
+                cnt += self.generateInParallel()
                 logging.info("Projito jmen/názvů: " + str(cnt))
+            else:
+                for name in namesChunk:
+                    self.generateForSingleName(name)
+                    cnt += 1
+                    if cnt % 100 == 0:
+                        logging.info("Projito jmen/názvů: " + str(cnt))
+
+            self.storeNameCache()
+
+            if self.stream:
+                self.outF.flush()
 
 
         endOfGenMorp = time.time()
 
+        for lng in self.languages.values():
+            # ma již nebudeme potřebovat
+            lng.closeMAnalyzer()
+
+        if self.maCache is not None:
+            self.maCache.close()
+
+        if self.nameCache is not None:
+            self.nameCache.close()
+
         if self.args.output:
             # close the output file
             self.outF.close()
+            self.writeResultFingerprints()
 
 
         # vypíšeme druhy slov, pokud to uživatel chce
@@ -1290,6 +2198,17 @@ class GenDerivPipeline(GenMorphsPipeline):
 
     NUMBER_OF_TSV_COLUMNS = 6
 
+    def maProfile(self) -> MAProfile:
+        """
+        Profil analýzy pro morfologické analyzátory. Analyzována jsou pouze slova odvozená povolenými druhy odvození
+        (viz GENERATE_DERIV_NAMES_TYPES).
+
+        :return: Profil analýzy.
+        :rtype: MAProfile
+        """
+
+        return MAProfile(True, self.configAll[ConfigManager.sectionDeriv]["GENERATE_DERIV_NAMES_TYPES"])
+
     def prepareGenerators(self):
         return GenerateDerivatedForms(
             self.configAll[ConfigManager.sectionDeriv]["GENERATE_DERIV_NAMES_TYPES"],
@@ -1304,18 +2223,10 @@ class GenDerivPipeline(GenMorphsPipeline):
                 # Uživatel chce tisknout pouze pokud máme tvary pro všechny pády.
                 # je to tu znovu kvuli nove vygenerovanym
                 continue
-            resAdd = str(name) + "\t" + str(name.language.code) + "\t" + str(
-                nameToWrite.type) + "\t" + (
-                         "|".join(str(m) for m in morphsToWrite))
-            if len(nameToWrite.additionalInfo) > 0:
-                resAdd += "\t" + ("\t".join(nameToWrite.additionalInfo))
-
-            # add missing empty fields
-            missing = self.NUMBER_OF_TSV_COLUMNS - 4 - len(nameToWrite.additionalInfo)
-            if missing > 0:
-                resAdd += "\t" * missing
-
-            completedMorphs.add(resAdd)
+            self.addMorphsLine(completedMorphs, name, nameToWrite,
+                               (str(name), str(name.language.code), str(nameToWrite.type),
+                                "|".join(str(m) for m in morphsToWrite)),
+                               ())
 
             if self.args.verbose:
                 logging.info(str(nameToWrite) + "\tDerivace:")
@@ -1342,6 +2253,23 @@ def call_deriv(args, configAll):
     logging.info("\thotovo")
 
 
+def call_compile_grammars(args, configAll):
+    logging.info("kompilace gramatik")
+    languagesDir = configAll[ConfigManager.sectionDataFiles]["LANGUAGES_DIRECTORY"]
+    for lang in sorted(os.listdir(languagesDir)):
+        grammarsPath = os.path.join(languagesDir, lang, "grammars")
+        if not os.path.isdir(grammarsPath) or (args.lang is not None and lang not in args.lang):
+            continue
+
+        for g in ("GRAMMAR_FEMALE", "GRAMMAR_MALE", "GRAMMAR_LOCATIONS", "GRAMMAR_EVENTS"):
+            grammarPath = os.path.join(grammarsPath, configAll[ConfigManager.sectionDataFiles][g])
+            try:
+                logging.info("\t" + namegenPack.Grammar.Grammar.compile(grammarPath))
+            except Errors.ExceptionMessageCode as e:
+                raise Errors.ExceptionMessageCode(e.code, grammarPath + ": " + e.message)
+    logging.info("\thotovo")
+
+
 def main():
     """
     Vstupní bod programu.
@@ -1358,8 +2286,15 @@ def main():
         Terminal.UNKNOWN_ANALYZE_TERMINAL_MATCH = configAll[ConfigManager.sectionGrammar][
             "PARSE_UNKNOWN_ANALYZE_TERMINAL_MATCH"]
 
+    Terminal.MATCH_CACHE.maxSize = configAll[ConfigManager.sectionGrammar]["MATCH_CACHE_SIZE"]
+    namegenPack.Grammar.Grammar.TerminalIndex.CACHE.maxSize = \
+        configAll[ConfigManager.sectionGrammar]["MATCH_CACHE_SIZE"]
+    namegenPack.Grammar.Grammar.ParsingTableSymbolRow.CACHE.maxSize = \
+        configAll[ConfigManager.sectionGrammar]["MATCH_CACHE_SIZE"]
+    MorphoAnalyze.MORPHS_CACHE.maxSize = configAll[ConfigManager.sectionMA]["MORPHS_CACHE_SIZE"]
+
     # koukneme jestli je tu opravdu validní vychozi jazyk
-    if args.def_lang not in set(os.listdir(configAll[ConfigManager.sectionDataFiles]["LANGUAGES_DIRECTORY"])):
+    if hasattr(args, "def_lang") and args.def_lang not in set(os.listdir(configAll[ConfigManager.sectionDataFiles]["LANGUAGES_DIRECTORY"])):
         raise ConfigManagerInvalidException(Errors.ErrorMessenger.CODE_INVALID_CONFIG,
                                             f"Nenašel jsem výchozí jazyk {args.def_lang}.")
 
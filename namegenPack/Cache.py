@@ -0,0 +1,59 @@
+"""
+Created on 16. 10. 2026
+
+Modul obsahuje pomocné cache sdílené více částmi namegenu.
+"""
+from collections import OrderedDict
+from typing import Optional
+
+
+class LRUCache(object):
+    """
+    Cache s omezeným počtem záznamů. Při překročení je odstraněn nejdéle nepoužitý záznam.
+    Počítá úspěšná a neúspěšná vyhledání.
+
+    Používá se stejně jako dict:
+        try:
+            v = cache[k]
+        except KeyError:
+            v = ...
+            cache[k] = v
+    """
+
+    def __init__(self, maxSize: Optional[int] = None):
+        """
+        Vytvoření prázdné cache.
+
+        :param maxSize: Maximální počet záznamů. None -> neomezeně
+        :type maxSize: Optional[int]
+        """
+        self.maxSize = maxSize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, key):
+        try:
+            v = self._data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return v
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.maxSize is not None and len(self._data) > self.maxSize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """
+        Odstraní všechny záznamy. Počty vyhledání zůstávají zachovány.
+        """
+        self._data.clear()
@@ -69,6 +69,8 @@ class ErrorMessenger(object):
     CODE_GRAMMAR_NONTERMINAL_NO_CORESPONDING_RULE = 33
     CODE_UNKNOWN_LANGUAGE = 34
     CODE_LANGUAGE_NOT_INIT_MA = 35
+    CODE_MA_CACHE = 36
+    CODE_NAME_CACHE = 37
 
     CODE_ALL_VALUES_NOT_COVERED = 99
     CODE_UNKNOWN_ERROR = 100
@@ -114,6 +116,8 @@ class ErrorMessenger(object):
         CODE_ALL_VALUES_NOT_COVERED: "Nejsou pokryty všechny hodnoty.",
         CODE_UNKNOWN_LANGUAGE: "Jméno {} je v neznámém jazyce.",
         CODE_LANGUAGE_NOT_INIT_MA: "Je nutné nejprve inicializovat morfologický analyzátor.",
+        CODE_MA_CACHE: "Nelze pracovat s cache morfologického analyzátoru.",
+        CODE_NAME_CACHE: "Nelze pracovat s cache výsledků jmen.",
         CODE_UNKNOWN_ERROR: "Neznámá chyba.",
     }
 
@@ -7,16 +7,21 @@ Modul pro práci s gramatikou (Bezkontextovou).
 :contact:    xdocek09@stud.fit.vubtr.cz
 """
 import copy
+import hashlib
 import itertools
+import os
+import pickle
 import time
 from builtins import isinstance
 from enum import Enum
-from typing import Set, Dict, List, Tuple, Optional
+from typing import Set, Dict, List, Tuple, Optional, Iterable, Generator, Any
 
 import regex as re
 
 from namegenPack import Errors
+from namegenPack.Cache import LRUCache
 from namegenPack.Word import Word, WordTypeMark
+from namegenPack.morpho.MorphoAnalyzer import MorphoAnalyzerLibma
 from namegenPack.morpho.MorphCategories import MorphCategory, Gender, Number, \
     MorphCategories, POS, Case, Note, Flag
 
@@ -180,6 +185,9 @@ class Terminal(object):
     # Množina druhů terminálů, kterým odpovídá token ANALYZE_UNKNOWN.
     UNKNOWN_ANALYZE_TERMINAL_MATCH = set()
 
+    # Cache pro tokenMatch sdílená všemi terminály a jmény. Klíčem je terminál a Token.matchKey.
+    MATCH_CACHE = LRUCache(1000000)
+
     class Type(Enum):
         """
         Druh terminálu.
@@ -501,9 +509,6 @@ class Terminal(object):
 
         self._hasVoluntaryAttribut = len(self._fillteringAttrVal) != len(self._fillteringAttrValWithoutVoluntary)
 
-        # cache pro zrychlení tokenMatch
-        self._matchCache = {}
-
     def getAttribute(self, t):
         """
         Vrací atribut daného druhu.
@@ -572,12 +577,13 @@ class Terminal(object):
         :rtype: bool
         """
 
+        key = (self, t.matchKey)
         try:
-            return self._matchCache[t]
+            return self.MATCH_CACHE[key]
         except KeyError:
             # zatím není v cache
             res = self.tokenMatchWithoutCache(t)
-            self._matchCache[t] = res
+            self.MATCH_CACHE[key] = res
             return res
 
     def tokenMatchWithoutCache(self, t):
@@ -734,8 +740,30 @@ class Token(object):
         :param tokenType: Druh tokenu.
         :type tokenType: self.Type
         """
-        self.word = word
+        self._word = word
         self._type = tokenType
+        self._matchKey = None
+        self._terminalMatches = None  # (klíč shody, terminál -> shoda), viz terminalMatches
+
+    @property
+    def word(self) -> Optional[Word]:
+        """
+        Slovo ze, kterého token vznikl.
+
+        :rtype: Optional[namegenPack.Name.Word]
+        """
+        return self._word
+
+    @word.setter
+    def word(self, w: Optional[Word]):
+        """
+        Nastav slovo tokenu.
+
+        :param w: Nové slovo.
+        :type w: Optional[namegenPack.Name.Word]
+        """
+        self._word = w
+        self._matchKey = None
 
     @property
     def type(self):
@@ -756,6 +784,50 @@ class Token(object):
         """
 
         self._type = t
+        self._matchKey = None
+
+    @property
+    def matchKey(self) -> tuple:
+        """
+        Klíč tokenu pro cache shody s terminálem (viz Terminal.tokenMatch).
+        Obsahuje pouze to, na čem shoda závisí: druh tokenu, slovo, separátory, druh jména a analýzu slova.
+        Stejná slova v různých jménech tedy mají stejný klíč, pokud nemají analýzu závislou na jménu.
+
+        :rtype: tuple
+        """
+        if self._word is None:
+            return self._type, None
+
+        if self._matchKey is None:
+            analysis = None
+            if self._type in Lex.TOKEN_TYPES_THAT_CAN_USE_MA:
+                try:
+                    # Analýza je ze sdílené databáze analyzátoru a pro dané slovo je stále stejná. Jen analýza
+                    # závislá na jménu je pokaždé nová, takový klíč se tedy již znovu nepoužije.
+                    analysis = self._word.info
+                except Word.WordCouldntGetInfoException:
+                    pass
+
+            self._matchKey = (self._type, str(self._word), str(self._word.leftSeparator),
+                              str(self._word.rightSeparator), analysis)
+
+        # druh jména se může změnit (odhad druhu), proto jej nelze uložit
+        return self._matchKey + (str(self._word.name.type),)
+
+    def terminalMatches(self) -> Dict["Terminal", bool]:
+        """
+        Již zjištěné shody tokenu s terminály (viz Grammar.TerminalIndex.tokenMask).
+        Jsou sdíleny všemi gramatikami, kterými je token analyzován (např. ženská a mužská gramatika při odhadu
+        druhu jména). Při změně klíče shody (viz matchKey) jsou zahozeny.
+
+        :return: Terminál -> True odpovídá, jinak False.
+        :rtype: Dict[Terminal, bool]
+        """
+        key = self.matchKey
+        if self._terminalMatches is None or self._terminalMatches[0] != key:
+            self._terminalMatches = (key, {})
+
+        return self._terminalMatches[1]
 
     def __str__(self):
         return str(self._type) + "(" + str(self.word) + ")"
@@ -1629,10 +1701,13 @@ class RuleTemplate(object):
 
 class Symbol(object):
     """
-        Reprezentace symbolu na zásobníku
+        Reprezentace symbolu na zásobníku.
+        Symbol je neměnný, stejné symboly jsou sdíleny napříč pravidly (viz Grammar._makeRuleSymbols).
         """
 
-    def __init__(self, s, isTerm=True, morph=True):
+    __slots__ = ("_s", "_isTerm", "_morph", "_bit")
+
+    def __init__(self, s, isTerm=True, morph=True, bit: int = 0):
         """
             Vytvoření symbolu s typu t.
             :param s: Symbol
@@ -1646,11 +1721,14 @@ class Symbol(object):
                 Flag, který určuje zda-li se nacházíme v části stromu, kde se slova mají ohýbat, či ne.
                 Jedná se o zohlednění příznaku self.NON_GEN_MORPH_SIGN z gramatiky.
             :type morph: bool
+            :param bit: Bit terminálu v masce terminálů gramatiky (viz Grammar.TerminalIndex). Pro neterminál 0.
+            :type bit: int
             """
 
         self._s = s
         self._isTerm = isTerm
         self._morph = morph
+        self._bit = bit
 
     @property
     def val(self):
@@ -1670,6 +1748,259 @@ class Symbol(object):
             """
         return self._morph
 
+    @property
+    def bit(self):
+        """
+            Bit terminálu v masce terminálů gramatiky (viz Grammar.TerminalIndex).
+            """
+        return self._bit
+
+
+class StackNode(object):
+    """
+    Uzel neměnného zásobníku syntaktického analyzátoru (viz Grammar.crawling).
+
+    Zásobník je reprezentován svým vrcholem, prázdný zásobník je None. Vložení symbolu vytvoří nový uzel
+    odkazující na původní zásobník, který zůstává beze změny. Větve analýzy tak sdílí společnou část zásobníku
+    a není nutné jej kopírovat.
+    """
+
+    __slots__ = ("symbol", "next")
+
+    def __init__(self, symbol: Symbol, nextNode: Optional["StackNode"] = None):
+        """
+        :param symbol: Symbol na vrcholu zásobníku.
+        :type symbol: Symbol
+        :param nextNode: Zbytek zásobníku pod symbolem.
+        :type nextNode: Optional[StackNode]
+        """
+        self.symbol = symbol
+        self.next = nextNode
+
+
+class ForestParser(object):
+    """
+    Syntaktický analyzátor hledající všechny derivace (stejně jako Grammar.crawling), ale bez zpětného navracení.
+
+    Jedná se o memoizovanou analýzu shora dolů řízenou parsovací tabulkou gramatiky. Neterminál je na dané pozici
+    vstupu analyzován pouze jednou a výsledek je sdílen všemi derivacemi, které jej využívají. Výsledky tvoří
+    sdílený les derivací, ze kterého jsou jednotlivé derivace vyčteny až na konci analýzy. Pracovní zásobník se tedy
+    nekopíruje pro každou alternativu a složitost analýzy je polynomiální (výčet derivací je úměrný jejich počtu).
+
+    Uzly lesa:
+        neterminál  (neterminál, příznak ohýbání, počáteční pozice)
+                    -> koncová pozice -> [(pravidlo, klíč uzlu posloupnosti)]
+        posloupnost (pravidlo, příznak ohýbání, index symbolu pravé strany, počáteční pozice)
+                    -> koncová pozice -> [(hlava, pozice za hlavou)]
+                    Hlava je AnalyzedToken pro terminál, nebo klíč uzlu neterminálu. Zbytek posloupnosti je uzel
+                    s indexem o jedna větším začínající na pozici za hlavou. Prázdná posloupnost má jedinou
+                    položku None.
+
+    Analýza i výčet derivací jsou prováděny iterativně (viz _run), takže nejsou omezeny hloubkou rekurze ani u velmi
+    dlouhých jmen.
+    """
+
+    def __init__(self, grammar: "Grammar", tokens: List[Token]):
+        """
+        Připraví analýzu.
+
+        :param grammar: Gramatika, dle které se analyzuje.
+        :type grammar: Grammar
+        :param tokens: Tokeny pro analýzu. Poslední musí být EOF.
+        :type tokens: List[Token]
+        """
+        self._grammar = grammar
+        self._tokens = tokens
+        self._matchMatrix = grammar._terminalIndex.matchMatrix(tokens)
+        self._nonterminalNodes = {}
+        self._sequenceNodes = {}
+
+    def parse(self) -> Tuple[List[List["Rule"]], List[List[AnalyzedToken]]]:
+        """
+        Provede analýzu.
+
+        :return: Dvojici s listem listu pravidel určujících všechny možné derivace a list listů analyzovaných tokenů.
+        :rtype: Tuple[List[List[Rule]], List[List[AnalyzedToken]]]
+        :raise NotInLanguage: Řetězec není v jazyce generovaným danou gramatikou.
+        :raise TimeoutException: Při provádění syntaktické analýzy, nad daným řetězcem, došlo k timeoutu.
+        """
+        g = self._grammar
+        startKey = (g._startS, g._startS[0] != g.NON_GEN_MORPH_SIGN, 0)
+        eof = Terminal(Terminal.Type.EOF)
+
+        resRules = []
+        resATokens = []
+        for end in self._run(self._parseNonterminal(startKey)):
+            if end < len(self._tokens) and eof.tokenMatch(self._tokens[end]):
+                token = self._tokens[end]
+                eofAToken = AnalyzedToken(token, False if token.type == Token.Type.ANALYZE_UNKNOWN else eof.morph, eof)
+                self._run(self._derivations(startKey, end, eofAToken, resRules, resATokens))
+
+        if len(resRules) == 0:
+            raise g.NotInLanguage()
+
+        return resRules, resATokens
+
+    @staticmethod
+    def _run(frame: Generator):
+        """
+        Provede výpočet daný generátorem. Místo rekurzivního volání generátor předá (yield) generátor podvýpočtu
+        a dostane zpět jeho výsledek (návratovou hodnotu). Rozpracované výpočty jsou na vlastním zásobníku, takže
+        hloubka výpočtu není omezena hloubkou rekurze.
+
+        :param frame: Generátor výpočtu.
+        :type frame: Generator
+        :return: Výsledek výpočtu.
+        """
+        stack = [frame]
+        result = None
+        while True:
+            try:
+                sub = stack[-1].send(result)
+            except StopIteration as e:
+                stack.pop()
+                if not stack:
+                    return e.value
+                result = e.value
+            else:
+                stack.append(sub)
+                result = None
+
+    def _checkTimeout(self):
+        """
+        Kontrola na timeout.
+
+        :raise TimeoutException: Došlo k timeoutu.
+        """
+        g = self._grammar
+        if g.timeout is not None and (time.time() - g.analyzeStartTime) * 1000 >= g.timeout:
+            raise g.TimeoutException()
+
+    def _parseNonterminal(self, key: Tuple[str, bool, int]) \
+            -> Generator[Generator, Any, Dict[int, List[Tuple["Rule", tuple]]]]:
+        """
+        Analyzuje neterminál na dané pozici. Výpočet pro _run.
+
+        :param key: Klíč uzlu neterminálu (neterminál, příznak ohýbání, počáteční pozice).
+        :type key: Tuple[str, bool, int]
+        :return: Koncová pozice -> seznam (pravidlo, klíč uzlu posloupnosti pravé strany).
+        :rtype: Generator[Generator, Any, Dict[int, List[Tuple[Rule, tuple]]]]
+        """
+        try:
+            res = self._nonterminalNodes[key]
+            # None značí, že se neterminál právě analyzuje (cyklus v gramatice) a takovou derivaci nepřijímáme
+            return {} if res is None else res
+        except KeyError:
+            pass
+
+        self._checkTimeout()
+        self._nonterminalNodes[key] = None
+
+        nonterminal, morph, position = key
+        res = {}
+        for r in self._grammar._table[nonterminal].rulesForMask(self._matchMatrix[position]):
+            seqKey = (r, morph, 0, position)
+            for end in (yield self._parseSequence(seqKey)):
+                res.setdefault(end, []).append((r, seqKey))
+
+        self._nonterminalNodes[key] = res
+        return res
+
+    def _parseSequence(self, key: Tuple["Rule", bool, int, int]) -> Generator[Generator, Any, Dict[int, list]]:
+        """
+        Analyzuje posloupnost symbolů pravé strany pravidla od daného indexu do konce. Výpočet pro _run.
+
+        :param key: Klíč uzlu posloupnosti (pravidlo, příznak ohýbání, index symbolu, počáteční pozice).
+        :type key: Tuple[Rule, bool, int, int]
+        :return: Koncová pozice -> seznam (hlava, pozice za hlavou). Pro prázdnou posloupnost [None].
+        :rtype: Generator[Generator, Any, Dict[int, list]]
+        """
+        try:
+            return self._sequenceNodes[key]
+        except KeyError:
+            pass
+
+        rule, morph, index, position = key
+        # symboly pravé strany jsou připraveny v pořadí pro vložení na zásobník, tedy pozpátku
+        symbols = self._grammar._ruleSymbols[rule][morph]
+        res = {}
+
+        if index == len(symbols):
+            res[position] = [None]
+        else:
+            symbol = symbols[-1 - index]
+            if symbol.isTerm:
+                if position < len(self._tokens) and symbol.bit & self._matchMatrix[position]:
+                    token = self._tokens[position]
+                    aToken = AnalyzedToken(token, False if token.type == Token.Type.ANALYZE_UNKNOWN else
+                                           symbol.isMorph and symbol.val.morph, symbol.val)
+                    for end in (yield self._parseSequence((rule, morph, index + 1, position + 1))):
+                        res[end] = [(aToken, position + 1)]
+            else:
+                childKey = (symbol.val, symbol.isMorph, position)
+                for mid in (yield self._parseNonterminal(childKey)):
+                    for end in (yield self._parseSequence((rule, morph, index + 1, mid))):
+                        res.setdefault(end, []).append((childKey, mid))
+
+        self._sequenceNodes[key] = res
+        return res
+
+    def _derivations(self, key: Tuple[str, bool, int], end: int, lastAToken: AnalyzedToken,
+                     resRules: List[List["Rule"]], resATokens: List[List[AnalyzedToken]]) -> Generator:
+        """
+        Vyčte z lesa všechny derivace neterminálu končící na dané pozici. Výpočet pro _run.
+        Derivace se skládají průchodem do hloubky nad sdílenými seznamy pravidel a tokenů, které se kopírují
+        pouze při dokončení derivace.
+
+        :param key: Klíč uzlu neterminálu.
+        :type key: Tuple[str, bool, int]
+        :param end: Koncová pozice.
+        :type end: int
+        :param lastAToken: Analyzovaný token přidaný na konec každé derivace.
+        :type lastAToken: AnalyzedToken
+        :param resRules: Sem se přidají pravidla derivací.
+        :type resRules: List[List[Rule]]
+        :param resATokens: Sem se přidají analyzované tokeny derivací.
+        :type resATokens: List[List[AnalyzedToken]]
+        :rtype: Generator
+        """
+        rules = []
+        aTokens = []
+
+        def continueWith(cont):
+            # cont je spojový seznam ((klíč uzlu posloupnosti, koncová pozice), další)
+            if cont is None:
+                self._checkTimeout()
+                resRules.append(rules.copy())
+                resATokens.append(aTokens + [lastAToken])
+            else:
+                (seqKey, seqEnd), nextCont = cont
+                yield sequence(seqKey, seqEnd, nextCont)
+
+        def sequence(seqKey, seqEnd, cont):
+            rule, morph, index, _ = seqKey
+            for item in self._sequenceNodes[seqKey][seqEnd]:
+                if item is None:
+                    yield continueWith(cont)
+                    continue
+
+                head, mid = item
+                tailCont = (((rule, morph, index + 1, mid), seqEnd), cont)
+                if isinstance(head, AnalyzedToken):
+                    aTokens.append(head)
+                    yield continueWith(tailCont)
+                    aTokens.pop()
+                else:
+                    yield nonterminal(head, mid, tailCont)
+
+        def nonterminal(ntKey, ntEnd, cont):
+            for r, seqKey in self._nonterminalNodes[ntKey][ntEnd]:
+                rules.append(r)
+                yield sequence(seqKey, ntEnd, cont)
+                rules.pop()
+
+        yield nonterminal(key, end, None)
+
 
 class Grammar(object):
     """
@@ -1687,6 +2018,32 @@ class Grammar(object):
     Separátor používány v auto. generovaných neterminálech pro oddělení původního jména s počítadlem.
     """
 
+    COMPILED_EXTENSION = ".compiled"
+    """
+    Přípona souboru s předkompilovanou gramatikou. Soubor je uložen vedle souboru s gramatikou
+    (grammar_male.txt -> grammar_male.txt.compiled).
+    """
+
+    COMPILED_FORMAT_VERSION = 1
+    """Verze formátu předkompilované gramatiky. Při změně struktury ukládaných dat je nutné ji zvýšit."""
+
+    COMPILED_ATTRIBUTES = ("_terminals", "_nonterminals", "_rules", "_startS", "_empty", "_first", "_follow",
+                           "_predict", "_table", "_terminalIndex", "_ruleSymbols")
+    """Atributy gramatiky, které se ukládají do předkompilované gramatiky."""
+
+    _compiledVersionCache = None
+
+    PARSER_BACKTRACKING = "backtracking"
+    """Syntaktická analýza se zpětným navracením (viz crawling)."""
+
+    PARSER_FOREST = "forest"
+    """Syntaktická analýza se sdíleným lesem derivací (viz ForestParser)."""
+
+    PARSERS = {PARSER_BACKTRACKING, PARSER_FOREST}
+
+    TIMEOUT_CHECK_STEPS = 64
+    """Po kolika krocích metody crawling (zpracovaných symbolech ze zásobníku) se kontroluje timeout."""
+
     class NotInLanguage(Errors.ExceptionMessageCode):
         """
         Řetězec není v jazyce generovaným danou gramatikou.
@@ -1698,10 +2055,83 @@ class Grammar(object):
     class TimeoutException(Errors.ExceptionMessageCode):
         """
         Při provádění syntaktické analýzy, nad daným řetězcem, došlo k timeoutu.
+
+        :ivar derivations: Derivace nalezené před timeoutem ve stejném formátu jako výsledek Grammar.analyse.
+        :vartype derivations: Tuple[List[List[Rule]], List[List[AnalyzedToken]]]
+        :ivar position: Počet tokenů, které se podařilo zpracovat v nejdelší prozkoumané větvi analýzy.
+        :vartype position: int
         """
 
-        def __init__(self):
+        def __init__(self, derivations: Optional[Tuple[List[List["Rule"]], List[List["AnalyzedToken"]]]] = None,
+                     position: int = 0):
+            """
+            :param derivations: Derivace nalezené před timeoutem.
+            :type derivations: Optional[Tuple[List[List[Rule]], List[List[AnalyzedToken]]]]
+            :param position: Počet zpracovaných tokenů v nejdelší prozkoumané větvi analýzy.
+            :type position: int
+            """
             super().__init__(Errors.ErrorMessenger.CODE_GRAMMAR_SYN_ANAL_TIMEOUT)
+            self.derivations = ([], []) if derivations is None else derivations
+            self.position = position
+
+    class TerminalIndex(object):
+        """
+        Očíslování terminálů gramatiky. Pro token určuje množinu všech terminálů, kterým odpovídá, ve formě bitové
+        masky (bit i odpovídá terminálu s číslem i). Shoda tokenu s terminály se tak zjišťuje jednou pro celou
+        gramatiku a ne zvlášť pro každý řádek parsovací tabulky.
+        """
+
+        CACHE = LRUCache(1000000)
+        """Cache masek terminálů odpovídajících tokenu sdílená všemi gramatikami. Klíčem je index a Token.matchKey."""
+
+        def __init__(self, terminals: Iterable[Terminal]):
+            """
+            :param terminals: Terminály gramatiky. Číslovány jsou v daném pořadí.
+            :type terminals: Iterable[Terminal]
+            """
+            self.terminals = tuple(terminals)
+            self.ids = {t: i for i, t in enumerate(self.terminals)}
+
+        def tokenMask(self, token: Token) -> int:
+            """
+            Maska všech terminálů, kterým odpovídá daný token.
+
+            :param token: Token pro kontrolu.
+            :type token: Token
+            :return: Bitová maska terminálů.
+            :rtype: int
+            """
+            cacheKey = (self, token.matchKey)
+            try:
+                return self.CACHE[cacheKey]
+            except KeyError:
+                # shody zjištěné již pro jinou gramatiku
+                matches = token.terminalMatches()
+                mask = 0
+                for i, t in enumerate(self.terminals):
+                    try:
+                        match = matches[t]
+                    except KeyError:
+                        match = t.tokenMatch(token)
+                        matches[t] = match
+
+                    if match:
+                        mask |= 1 << i
+
+                self.CACHE[cacheKey] = mask
+                return mask
+
+        def matchMatrix(self, tokens: List[Token]) -> List[int]:
+            """
+            Matice shody tokenů s terminály gramatiky. Zjišťuje se jednou před syntaktickou analýzou, která pak
+            shodu tokenu s terminálem pouze čte (viz Symbol.bit).
+
+            :param tokens: Tokeny pro analýzu.
+            :type tokens: List[Token]
+            :return: Pro každý token maska terminálů, kterým odpovídá (viz tokenMask).
+            :rtype: List[int]
+            """
+            return [self.tokenMask(t) for t in tokens]
 
     class ParsingTableSymbolRow(dict):
         """
@@ -1710,15 +2140,33 @@ class Grammar(object):
         vybere všechna pravidla (vrací množinu pravidel), která je možné aplikovat pro daný token (jeden token může
         odpovídat více terminálům).
     
-        Vkládané klíče musí být Terminály.
+        Vkládané klíče musí být Terminály. Po naplnění řádku je nutné zavolat buildIndex.
+
+        Pravidla jsou kromě slovníku uložena i v poli indexovaném číslem terminálu (viz TerminalIndex). Pro token
+        se pak pravidla vybírají jen z terminálů, které jsou v průniku masky terminálů tokenu a masky terminálů
+        s nějakým pravidlem v řádku.
         
         Používá cache pro rychlejší vyhodnocení.
         
         """
 
-        def __init__(self, *arg, **kw):
-            super().__init__(*arg, **kw)
-            self._cache = {}
+        CACHE = LRUCache(1000000)
+        """Cache pro výběr pravidel dle tokenu sdílená všemi řádky. Klíčem je řádek a maska terminálů tokenu."""
+
+        def buildIndex(self, terminalIndex: "Grammar.TerminalIndex"):
+            """
+            Vytvoří pole pravidel indexované číslem terminálu.
+
+            :param terminalIndex: Očíslování terminálů gramatiky.
+            :type terminalIndex: Grammar.TerminalIndex
+            """
+            self._terminalIndex = terminalIndex
+            self._rulesById = [dict.get(self, t) for t in terminalIndex.terminals]
+            # terminály, pro které má řádek nějaké pravidlo
+            self._mask = 0
+            for i, rules in enumerate(self._rulesById):
+                if rules:
+                    self._mask |= 1 << i
 
         def __getitem__(self, key):
             """
@@ -1731,49 +2179,77 @@ class Grammar(object):
             """
             if isinstance(key, Token):
                 # Nutné zjistit všechny terminály, které odpovídají danému tokenu.
-                try:
-                    # zkusíme použít cache
-                    return self._cache[str(key)]
-                except KeyError:
-                    # bohužel nelze použít cache
-                    res = set()
-                    for k in self.keys():
-                        if k.tokenMatch(key):
-                            # daný terminál odpovídá tokenu, přidejme pravidla
-                            res |= dict.__getitem__(self, k)
-
-                    self._cache[str(key)] = res
-                    return res
+                return self.rulesForMask(self._terminalIndex.tokenMask(key))
             else:
                 # běžný výběr
                 return dict.__getitem__(self, key)
 
-    def __init__(self, filePath, timeout=None):
+        def rulesForMask(self, tokenMask: int) -> Set["Rule"]:
+            """
+            Vybere všechna pravidla pro terminály z masky terminálů tokenu (viz TerminalIndex.tokenMask).
+
+            :param tokenMask: Maska terminálů, kterým odpovídá token.
+            :type tokenMask: int
+            :return: Pravidla, která je možné pro token aplikovat.
+            :rtype: Set[Rule]
+            """
+            cacheKey = (id(self), tokenMask)
+            try:
+                # zkusíme použít cache
+                return self.CACHE[cacheKey]
+            except KeyError:
+                # bohužel nelze použít cache
+                res = set()
+                mask = self._mask & tokenMask
+                while mask:
+                    # terminály procházíme vzestupně dle čísla
+                    lowest = mask & -mask
+                    res |= self._rulesById[lowest.bit_length() - 1]
+                    mask ^= lowest
+
+                self.CACHE[cacheKey] = res
+                return res
+
+    def __init__(self, filePath, timeout=None, useCompiled=True, parser=PARSER_BACKTRACKING,
+                 maxDerivations: Optional[int] = None):
         """
         Inicializace grammatiky jejim načtením ze souboru.
+
+        Pokud existuje předkompilovaná gramatika (viz compile), která je novější než soubor s gramatikou,
+        je načtena namísto zpracování gramatiky.
         
         :param filePath: Cesta k souboru s gramatikou
         :type filePath: str
         :param timeout: TimeoutException pro syntaktickou analýzu. Po kolik max milisekundách má přestat.
-            TimeoutException je kontrolován vždy na začátku metody crawling.
+            Metoda crawling jej kontroluje vždy po TIMEOUT_CHECK_STEPS krocích.
         :type timeout: None | int
+        :param useCompiled: True -> použije předkompilovanou gramatiku, pokud je k dispozici a aktuální.
+        :type useCompiled: bool
+        :param parser: Druh syntaktického analyzátoru (viz PARSERS).
+        :type parser: str
+        :param maxDerivations: Maximální počet derivací, po jehož nalezení metoda crawling skončí.
+            None -> neomezeně
+        :type maxDerivations: Optional[int]
         :raise exception:
             Errors.ExceptionMessageCode pokud nemůže přečíst vstupní soubor.
             InvalidGrammarException pokud je problém se samotnou gramtikou.
         """
 
-        self._terminals = {Terminal(Terminal.Type.EOF)}  # implicitní terminál je konec souboru
-        self._nonterminals = set()
-        self._rules = set()
+        if not useCompiled or not self._loadCompiled(filePath):
+            self._terminals = {Terminal(Terminal.Type.EOF)}  # implicitní terminál je konec souboru
+            self._nonterminals = set()
+            self._rules = set()
 
-        self._load(filePath)
+            self._load(filePath)
 
-        self._simplify()
+            self._simplify()
 
-        # vytvoříme si tabulku pro parsování
-        self._makeTable()
+            # vytvoříme si tabulku pro parsování
+            self._makeTable()
 
         self.timeout = timeout
+        self.parser = parser
+        self.maxDerivations = maxDerivations
         self.grammarEllapsedTime = 0
         self.grammarNumOfAnalyzes = 0
 
@@ -1781,6 +2257,102 @@ class Grammar(object):
 
         self.analyzeStartTime = None
 
+    @classmethod
+    def compiledPath(cls, filePath: str) -> str:
+        """
+        Cesta k souboru s předkompilovanou gramatikou.
+
+        :param filePath: Cesta k souboru s gramatikou.
+        :type filePath: str
+        :return: Cesta k předkompilované gramatice.
+        :rtype: str
+        """
+        return filePath + cls.COMPILED_EXTENSION
+
+    @classmethod
+    def _compiledVersion(cls) -> str:
+        """
+        Verze předkompilované gramatiky. Skládá se z verze formátu, verze modulu regex a otisku zdrojových kódů
+        balíčku namegenPack, aby se při změně tříd, které jsou v předkompilované gramatice uloženy (terminály,
+        kategorie z MorphCategories, druhy slov z Word, regulární výrazy...), nepoužila neaktuální data.
+
+        :return: Verze předkompilované gramatiky.
+        :rtype: str
+        """
+        if cls._compiledVersionCache is None:
+            packageDir = os.path.dirname(os.path.abspath(__file__))
+            sources = []
+            for root, _, files in os.walk(packageDir):
+                sources.extend(os.path.join(root, f) for f in files if f.endswith(".py"))
+
+            h = hashlib.sha1()
+            h.update(str(getattr(re, "__version__", "")).encode())
+            for path in sorted(sources):
+                h.update(os.path.relpath(path, packageDir).encode())
+                with open(path, "rb") as f:
+                    h.update(f.read())
+
+            cls._compiledVersionCache = str(cls.COMPILED_FORMAT_VERSION) + ":" + h.hexdigest()
+        return cls._compiledVersionCache
+
+    @classmethod
+    def compile(cls, filePath: str) -> str:
+        """
+        Zpracuje gramatiku a uloží ji jako předkompilovanou gramatiku vedle souboru s gramatikou.
+
+        :param filePath: Cesta k souboru s gramatikou.
+        :type filePath: str
+        :return: Cesta k uložené předkompilované gramatice.
+        :rtype: str
+        :raise exception:
+            Errors.ExceptionMessageCode pokud nemůže přečíst vstupní soubor nebo uložit výsledek.
+            InvalidGrammarException pokud je problém se samotnou gramtikou.
+        """
+
+        g = cls(filePath, useCompiled=False)
+        compiledPath = cls.compiledPath(filePath)
+        tmpPath = compiledPath + ".tmp"
+        try:
+            with open(tmpPath, "wb") as f:
+                pickle.dump((cls._compiledVersion(), {a: getattr(g, a) for a in cls.COMPILED_ATTRIBUTES}), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, compiledPath)
+        except OSError:
+            raise Errors.ExceptionMessageCode(Errors.ErrorMessenger.CODE_COULDNT_WORK_WITH_FILE,
+                                              Errors.ErrorMessenger.getMessage(
+                                                  Errors.ErrorMessenger.CODE_COULDNT_WORK_WITH_FILE) + "\n\t" +
+                                              compiledPath)
+        return compiledPath
+
+    def _loadCompiled(self, filePath: str) -> bool:
+        """
+        Pokusí se načíst předkompilovanou gramatiku.
+        Neexistující, starší než zdrojový soubor, nebo jinak neaktuální předkompilovaná gramatika se nepoužije.
+
+        :param filePath: Cesta k souboru s gramatikou.
+        :type filePath: str
+        :return: True -> načteno. False -> gramatiku je nutné zpracovat ze zdrojového souboru.
+        :rtype: bool
+        """
+        compiledPath = self.compiledPath(filePath)
+        try:
+            if os.path.getmtime(compiledPath) < os.path.getmtime(filePath):
+                return False
+
+            with open(compiledPath, "rb") as f:
+                version, attributes = pickle.load(f)
+        except Exception:
+            # chybějící či poškozená předkompilovaná gramatika, zpracujeme zdrojový soubor
+            return False
+
+        if version != self._compiledVersion():
+            return False
+
+        for a in self.COMPILED_ATTRIBUTES:
+            setattr(self, a, attributes[a])
+
+        return True
+
     @property
     def flexible(self) -> bool:
         """
@@ -1994,145 +2566,227 @@ class Grammar(object):
         if tokens[-1].type != Token.Type.EOF:
             tokens.append(Token(None, Token.Type.EOF))
 
-        # Přidáme na zásoník konec vstupu a počáteční symbol
-        stack = [Symbol(Terminal(Terminal.Type.EOF), True, True),
-                 Symbol(self._startS, False, self._startS[0] != self.NON_GEN_MORPH_SIGN)]
-        position = 0
+        if self.parser == self.PARSER_FOREST:
+            res = ForestParser(self, tokens).parse()
+        else:
+            # Přidáme na zásoník konec vstupu a počáteční symbol
+            eof = Terminal(Terminal.Type.EOF)
+            stack = StackNode(Symbol(self._startS, False, self._startS[0] != self.NON_GEN_MORPH_SIGN),
+                              StackNode(Symbol(eof, True, True, 1 << self._terminalIndex.ids[eof])))
+            position = 0
 
-        res = self.crawling(stack, tokens, position)
+            res = self.crawling(stack, tokens, position, self._terminalIndex.matchMatrix(tokens))
 
         self.grammarEllapsedTime += time.time() - self.analyzeStartTime
         self.grammarNumOfAnalyzes += 1
         return res
 
-    def crawling(self, stack, tokens, position):
+    def crawling(self, stack: Optional[StackNode], tokens, position, matchMatrix: Optional[List[int]] = None):
         """
         Provádí analýzu zda-li posloupnost daných tokenů patří do jazyka definovaného gramatikou. Vrací posloupnost
-        použitých pravidel. Nezastaví se na první vhodné posloupnosti pravidel, ale hledá všechny možné.
-        
-        Tato metoda slouží především pro možnost implementace zpětného navracení při selhání, či hledání další vhodné
-        posloupnosti pravidel.
-        
-        :param stack: Aktuální obsah zásobníku. (modifukuje jej)
-        :type stack: list(Symbol)
+        použitých pravidel. Nezastaví se na první vhodné posloupnosti pravidel, ale hledá všechny možné
+        (nejvýše však maxDerivations).
+
+        Analýza se zpětným navracením je prováděna iterativně s vlastním zásobníkem rozpracovaných větví, takže není
+        omezena hloubkou rekurze. Při více možných pravidlech vznikne pro každé z nich nová větev. Zásobník
+        analyzátoru je neměnný (viz StackNode), takže větve sdílí jeho zbytek a vytvoření větve nezávisí na jeho
+        hloubce. Větve jsou procházeny do hloubky v pořadí pravidel, derivace jsou tedy vráceny ve stejném pořadí jako
+        při rekurzivním procházení.
+
+        Pokud více větví zpracuje každá své pravidlo pro neterminál a dostanou se tak ke stejnému zbytku zásobníku
+        na stejné pozici vstupu, tak by pokračovaly stejně. Zbytek derivace je proto zjištěn pouze jednou a ostatní
+        větve jej převezmou.
+
+        :param stack: Vrchol zásobníku.
+        :type stack: Optional[StackNode]
         :param tokens: posloupnost tokenů na vstupu
         :type tokens: list(Token)
         :param position: Index aktuálního tokenu. Definuje část vstupní posloupnosti tokenů, kterou budeme procházet.
             Od předaného indexu do konce.
         :type position: integer
+        :param matchMatrix: Matice shody tokenů s terminály (viz TerminalIndex.matchMatrix). Pokud není uvedena,
+            je vytvořena.
+        :type matchMatrix: Optional[List[int]]
         :return: Dvojici s listem listu pravidel určujících všechny možné derivace a list listů analyzovaných tokenů.
         :rtype: (list(list(Rule)), list(list(AnalyzedToken)))
         :raise NotInLanguage: Řetězec není v jazyce generovaným danou gramatikou.
         :raise TimeoutException: Při provádění syntaktické analýzy, nad daným řetězcem, došlo k timeoutu.
+            Obsahuje derivace nalezené do té doby.
         """
+        if matchMatrix is None:
+            matchMatrix = self._terminalIndex.matchMatrix(tokens)
+
+        deadline = None
         if self.timeout is not None:
-            # kontrola na timeout
-            if (time.time() - self.analyzeStartTime) * 1000 >= self.timeout:
-                # překročen timeout -> končíme
-                raise self.TimeoutException()
-
-        aTokens = []  # analyzované tokeny
-        rules = []  # použitá pravidla
-
-        while len(stack) > 0:
-            s = stack.pop()
-            token = tokens[position]
-
-            if s.isTerm:
-                # terminál na zásobníku
-                if s.val.tokenMatch(token):
-                    # stejný token můžeme se přesunout
-                    # token odpovídá terminálu na zásobníku
+            deadline = time.monotonic() + self.timeout / 1000 - (time.time() - self.analyzeStartTime)
+
+        resRules = []
+        resATokens = []
+        furthest = position  # nejvzdálenější token, ke kterému se některá z větví dostala
+        steps = 0
+
+        # Zbytky zásobníku, které sdílí více větví (zbytek pod neterminálem s více možnými pravidly).
+        joins = set()
+        # Zbytky derivací pro (zbytek zásobníku, pozice) ve formátu [(pravidla, analyzované tokeny)].
+        suffixes = {}
+        # Klíče suffixes, jejichž zbytky derivací jsou ještě zjišťovány.
+        recording = set()
+        # Značka ukončení zjišťování zbytků derivací, na zásobníku větví je dvojice (značka, klíč).
+        recordingEnd = object()
+
+        # Rozpracované větve ve formátu (zásobník, index aktuálního tokenu, část derivace).
+        # Část derivace je čtveřice (předchozí část derivace, pravidla, analyzované tokeny, klíč do suffixes).
+        # Větve vzniklé ze stejného místa tak sdílí společný začátek derivace. Klíč do suffixes má část derivace,
+        # od které se zaznamenávají zbytky derivací, jinak je None.
+        branches = [(stack, position, (None, [], [], None))]
+
+        while branches:
+            branch = branches.pop()
+            if branch[0] is recordingEnd:
+                # všechny větve pokračující z daného místa jsou zpracovány
+                recording.discard(branch[1])
+                continue
+
+            stack, position, derivation = branch
+            rules, aTokens = derivation[1], derivation[2]
+
+            while True:
+                if stack in joins:
+                    key = (stack, position)
+                    if key in suffixes:
+                        if key not in recording:
+                            # zbytek derivace již známe
+                            for sufRules, sufATokens in suffixes[key]:
+                                self._completeDerivation((derivation, sufRules, sufATokens, None), suffixes,
+                                                         resRules, resATokens)
+                                if self.maxDerivations is not None and len(resRules) >= self.maxDerivations:
+                                    break
+                            break
+                    else:
+                        # začneme zaznamenávat zbytky derivací
+                        suffixes[key] = []
+                        recording.add(key)
+                        branches.append((recordingEnd, key))
+                        derivation = (derivation, [], [], key)
+                        rules, aTokens = derivation[1], derivation[2]
+
+                if stack is None:
+                    # Zásobník je prázdný, příjmáme naši část vstupní posloupnosti a máme celou derivaci.
+                    self._completeDerivation(derivation, suffixes, resRules, resATokens)
+                    break
+
+                steps += 1
+                if deadline is not None and steps % self.TIMEOUT_CHECK_STEPS == 0 and time.monotonic() >= deadline:
+                    # překročen timeout -> končíme
+                    raise self.TimeoutException((resRules, resATokens), max(furthest, position))
+
+                s = stack.symbol
+                stack = stack.next
+                token = tokens[position]
+
+                if s.isTerm:
+                    # terminál na zásobníku
+                    if not s.bit & matchMatrix[position]:
+                        # chyba rozdílný terminál na vstupu a zásobníku, tato větev nikam nevede
+                        break
+
+                    # token odpovídá terminálu na zásobníku, můžeme se přesunout
                     position += 1
 
                     aTokens.append(AnalyzedToken(token,
                                                  False if token.type == Token.Type.ANALYZE_UNKNOWN else
                                                  s.isMorph and s.val.morph, s.val))  # s je odpovídající terminál
-
                 else:
-                    # chyba rozdílný terminál na vstupu a zásobníku
-                    raise self.NotInLanguage()
-            else:
-                # neterminál na zásobníku
-
-                # vybereme všechna možná pravidla pro daný token na vstupu a symbol na zásobníku
-
-                actRules = self._table[s.val][token]
+                    # neterminál na zásobníku
 
-                # díky použité třídě ParsingTableSymbolRow si můžeme dovolit použít přímo token
+                    # vybereme všechna možná pravidla pro daný token na vstupu a symbol na zásobníku
+                    actRules = self._table[s.val].rulesForMask(matchMatrix[position])
 
-                if not actRules:
-                    # v gramatice neexistuje vhodné pravidlo
-                    raise self.NotInLanguage()
-
-                if len(actRules) == 1:
-                    # jedno možné pravidlo
-                    r = next(iter(actRules))
-                    self.putRuleOnStack(r, stack, s.isMorph)
-                    rules.append(r)
-
-                else:
-                    # více možných pravidel
-                    # pro každou možnou derivaci zavoláme rekurzivně tuto metodu
-                    newRules = []
-                    newATokens = []
-
-                    for r in actRules:
-                        try:
-                            # prvně aplikujeme pravidlo na nový stack
-                            newStack = stack.copy()
-                            self.putRuleOnStack(r, newStack, s.isMorph)
-
-                            # zkusíme zdali s tímto pravidlem uspějeme
-                            resRules, resATokens = self.crawling(newStack, tokens, position)
-
-                            if resRules and resATokens:
-                                # zaznamenáme aplikováná pravidla a analyzované tokeny
-                                # může obsahovat i více různých derivací
-                                for x in resRules:
-                                    # musíme předřadit aktuální pravidlo a pravidla předešlá
-                                    newRules.append(rules + [r] + x)
+                    if not actRules:
+                        # v gramatice neexistuje vhodné pravidlo
+                        break
 
-                                for x in resATokens:
-                                    # musíme předřadit předešlé analyzované tokeny
-                                    newATokens.append(aTokens + x)
+                    if len(actRules) == 1:
+                        # jedno možné pravidlo
+                        r = next(iter(actRules))
+                        stack = self.putRuleOnStack(r, stack, s.isMorph)
+                        rules.append(r)
+                    else:
+                        # více možných pravidel
+                        # pro každé vytvoříme novou větev, vkládáme pozpátku, aby první pravidlo bylo zpracováno první
+                        joins.add(stack)
+                        for r in reversed(list(actRules)):
+                            branches.append((self.putRuleOnStack(r, stack, s.isMorph), position,
+                                             (derivation, [r], [], None)))
+                        break
 
-                        except self.NotInLanguage:
-                            # tato větev nikam nevede, takže ji prostě přeskočíme
-                            pass
+            furthest = max(furthest, position)
 
-                    if len(newRules) == 0:
-                        # v gramatice neexistuje vhodné pravidlo
-                        raise self.NotInLanguage()
+            if self.maxDerivations is not None and len(resRules) >= self.maxDerivations:
+                break
 
-                    # jelikož jsme zbytek prošli rekurzivním voláním, tak můžeme již skončit
-                    return newRules, newATokens
+        if len(resRules) == 0:
+            # v gramatice neexistuje vhodné pravidlo
+            raise self.NotInLanguage()
 
-        # Již jsme vyčerpali všechny možnosti. Příjmáme naši část vstupní pousloupnosti a končíme.
-        # Zde se dostaneme pouze pokud jsme po cestě měli možnost aplikovat pouze jen přímo
-        # terminály a nebo vždy právě jedno pravidlo.
-        return [rules], [aTokens]
+        return resRules, resATokens
 
-    def putRuleOnStack(self, rule: Rule, stack, morph):
+    @staticmethod
+    def _completeDerivation(derivation, suffixes, resRules, resATokens):
+        """
+        Spojí části celé derivace (viz crawling) a přidá ji do výsledků. Zbytek derivace zaznamená ke všem
+        jejím částem, od kterých se zbytky zaznamenávají.
+
+        :param derivation: Poslední část derivace.
+        :type derivation: Tuple[Optional[tuple], List[Rule], List[AnalyzedToken], Optional[tuple]]
+        :param suffixes: Zaznamenané zbytky derivací.
+        :type suffixes: Dict[tuple, List[Tuple[List[Rule], List[AnalyzedToken]]]]
+        :param resRules: Pravidla nalezených derivací. Derivace je přidána na konec.
+        :type resRules: List[List[Rule]]
+        :param resATokens: Analyzované tokeny nalezených derivací. Derivace je přidána na konec.
+        :type resATokens: List[List[AnalyzedToken]]
+        """
+        parts = []
+        while derivation is not None:
+            parts.append(derivation)
+            if derivation[3] is not None:
+                # zbytek derivace od této části
+                sufRules = []
+                sufATokens = []
+                for part in reversed(parts):
+                    sufRules += part[1]
+                    sufATokens += part[2]
+                suffixes[derivation[3]].append((sufRules, sufATokens))
+
+            derivation = derivation[0]
+
+        rules = []
+        aTokens = []
+        for _, partRules, partATokens, _ in reversed(parts):
+            rules += partRules
+            aTokens += partATokens
+
+        resRules.append(rules)
+        resATokens.append(aTokens)
+
+    def putRuleOnStack(self, rule: Rule, stack: Optional[StackNode], morph: bool) -> Optional[StackNode]:
         """
         Vloží pravou stranu pravidla na zásobník.
-        
+
         :param rule: Pravidlo pro vložení.
         :type rule: Rule
-        :param stack: Zásobník pro manipulaci. Obsahuje výsledek.
-        :type stack:list
+        :param stack: Vrchol zásobníku. Zůstává beze změny.
+        :type stack: Optional[StackNode]
         :param morph: Příznak ohýbání slov.
         :type morph: bool
+        :return: Vrchol zásobníku s vloženou pravou stranou pravidla.
+        :rtype: Optional[StackNode]
         """
 
-        for rulePart in reversed(rule.rightSide):
-            if rulePart != self.EMPTY_STR:  # prázdný symbol nemá smysl dávat na zásobník
-                isTerminal = rulePart in self._terminals or rulePart == self.EMPTY_STR
-                # aby se jednalo o ohebnou část jména musíme se nacházet v ohebné částistromu (morph=true)
-                # a navíc pokud máme neterminál, tak musím zkontrolovat zda-li se nedostáváme do neohebné části
-                # rulePart.val[0]!=self.NON_GEN_MORPH_SIGN
-                shouldMorph = morph and (True if isTerminal else rulePart[0] != self.NON_GEN_MORPH_SIGN)
-                stack.append(Symbol(rulePart, isTerminal, shouldMorph))
+        for symbol in self._ruleSymbols[rule][morph]:
+            stack = StackNode(symbol, stack)
+
+        return stack
 
     @classmethod
     def getMorphMask(cls, rules, morph=True):
@@ -2476,8 +3130,48 @@ class Grammar(object):
                     # t může být nejlevěji derivován
                     self._table[r.leftSide][t].add(r)
 
+        # Terminály číslujeme ve stejném pořadí, v jakém jsou klíči řádků, takže pravidla pro token se sjednocují
+        # ve stejném pořadí jako při procházení celého řádku.
+        self._terminalIndex = self.TerminalIndex(self._terminals)
+        for row in self._table.values():
+            row.buildIndex(self._terminalIndex)
+
+        self._makeRuleSymbols()
+
         # Jen pro testovani self.printParsingTable()
 
+    def _makeRuleSymbols(self):
+        """
+        Pro každé pravidlo připraví symboly pravé strany v pořadí, ve kterém se vkládají na zásobník (viz
+        putRuleOnStack). Připravuje se varianta pro neohebnou (index False) i ohebnou (index True) část stromu.
+        Stejné symboly jsou sdíleny napříč pravidly.
+        """
+
+        symbols = {}
+        self._ruleSymbols = {}
+
+        for r in self._rules:
+            variants = []
+            for morph in (False, True):
+                ruleSymbols = []
+                for rulePart in reversed(r.rightSide):
+                    if rulePart != self.EMPTY_STR:  # prázdný symbol nemá smysl dávat na zásobník
+                        isTerminal = rulePart in self._terminals
+                        # aby se jednalo o ohebnou část jména musíme se nacházet v ohebné části stromu (morph=true)
+                        # a navíc pokud máme neterminál, tak musím zkontrolovat zda-li se nedostáváme do neohebné
+                        # části rulePart[0]!=self.NON_GEN_MORPH_SIGN
+                        shouldMorph = morph and (isTerminal or rulePart[0] != self.NON_GEN_MORPH_SIGN)
+                        try:
+                            symbol = symbols[(rulePart, shouldMorph)]
+                        except KeyError:
+                            symbol = Symbol(rulePart, isTerminal, shouldMorph,
+                                            1 << self._terminalIndex.ids[rulePart] if isTerminal else 0)
+                            symbols[(rulePart, shouldMorph)] = symbol
+                        ruleSymbols.append(symbol)
+                variants.append(tuple(ruleSymbols))
+
+            self._ruleSymbols[r] = tuple(variants)
+
     '''
     Jen pro testovani
     Potřebuje importovat pandas.
@@ -2663,3 +3357,7 @@ class Grammar(object):
         """
 
         return all(self._empty[s] for s in seq)
+
+
+# Klíče cache shody tokenů s terminály obsahují analýzy slov (viz Token.matchKey).
+MorphoAnalyzerLibma.WordDatabase.ANALYSIS_CACHES.extend([Terminal.MATCH_CACHE, Grammar.TerminalIndex.CACHE])
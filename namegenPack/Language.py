@@ -6,12 +6,26 @@ Modul pro práci s jazykem.
 :author:     Martin Dočekal
 """
 import ast
+import hashlib
 import os
-from typing import Optional, Set
+from typing import Optional, Set, Dict, Any
 
 from namegenPack.Errors import ExceptionMessageCode, ErrorMessenger
 from namegenPack.Grammar import Grammar, Lex, InvalidGrammarException
-from namegenPack.morpho.MorphoAnalyzer import MorphoAnalyzerLibma
+from namegenPack.morpho.MACache import MACache
+from namegenPack.morpho.MorphoAnalyzer import MorphoAnalyzerLibma, MAProfile
+
+
+def _loadedLanguage(code: str) -> "Language":
+    """
+    Získá již načtený jazyk dle jeho kódu. Používá se při obnovení objektů odkazujících na jazyk (pickle).
+
+    :param code: kód jazyka (cs)
+    :type code: str
+    :return: Načtený jazyk.
+    :rtype: Language
+    """
+    return Language.loaded[code]
 
 
 class Language(object):
@@ -41,9 +55,13 @@ class Language(object):
     :vartype lex: Lex
     """
 
+    loaded = {}
+    """Všechny načtené jazyky. Klíčem je kód jazyka."""
+
     def __init__(self, langFolder: str, gFemale: str, gMale: str, gLocations: str, gEvents: str, titles: str, eqGen: str,
                  ma: str,
-                 gTimeout: Optional[int]):
+                 gTimeout: Optional[int], maOptions: Optional[Dict[str, Any]] = None,
+                 gParser: str = Grammar.PARSER_BACKTRACKING, gMaxDerivations: Optional[int] = None):
         """
         Načte jazyk z jeho složky.
 
@@ -68,6 +86,12 @@ class Language(object):
         :type ma: str
         :param gTimeout: Timeout pro gramatiky.
         :type gTimeout: Optional[int]
+        :param maOptions: Dodatečné parametry pro morfologický analyzátor (viz MorphoAnalyzerLibma).
+        :type maOptions: Optional[Dict[str, Any]]
+        :param gParser: Druh syntaktického analyzátoru pro gramatiky (viz Grammar.PARSERS).
+        :type gParser: str
+        :param gMaxDerivations: Maximální počet hledaných derivací jména pro gramatiky (viz Grammar).
+        :type gMaxDerivations: Optional[int]
         """
 
         self.code = os.path.split(langFolder)[-1]
@@ -77,13 +101,17 @@ class Language(object):
 
         grammar = "female"  # just to mark which grammar is problematic
         try:
-            self.gFemale = Grammar(os.path.join(grammarsPath, gFemale), gTimeout)
+            self.gFemale = Grammar(os.path.join(grammarsPath, gFemale), gTimeout, parser=gParser,
+                                   maxDerivations=gMaxDerivations)
             grammar = "male"
-            self.gMale = Grammar(os.path.join(grammarsPath, gMale), gTimeout)
+            self.gMale = Grammar(os.path.join(grammarsPath, gMale), gTimeout, parser=gParser,
+                                 maxDerivations=gMaxDerivations)
             grammar = "locations"
-            self.gLocations = Grammar(os.path.join(grammarsPath, gLocations), gTimeout)
+            self.gLocations = Grammar(os.path.join(grammarsPath, gLocations), gTimeout, parser=gParser,
+                                      maxDerivations=gMaxDerivations)
             grammar = "events"
-            self.gEvents = Grammar(os.path.join(grammarsPath, gEvents), gTimeout)
+            self.gEvents = Grammar(os.path.join(grammarsPath, gEvents), gTimeout, parser=gParser,
+                                   maxDerivations=gMaxDerivations)
 
         except InvalidGrammarException as e:
             e.message = "\n" + grammar + "\n" + e.message
@@ -91,16 +119,26 @@ class Language(object):
 
         self.titles = self._readTitles(os.path.join(langFolder, titles))
 
-
+        # soubory s daty jazyka, viz fingerprint
+        self._dataFiles = [g.filePath for g in (self.gFemale, self.gMale, self.gLocations, self.gEvents)] + \
+                          [os.path.join(langFolder, titles), os.path.join(langFolder, eqGen)]
 
         with open(os.path.join(langFolder, eqGen), "r") as f:
             self.eqGen = ast.literal_eval(f.read())
 
         self.lex = Lex(self.titles)
         self._maPath = os.path.join(langFolder, ma)
+        self._maOptions = {} if maOptions is None else maOptions
 
         self._ma = None
 
+        Language.loaded[self.code] = self
+
+    def __reduce__(self):
+        # Jazyk se nepřenáší celý (gramatiky, analyzátor...), ale pouze jako odkaz na již načtený jazyk.
+        # Toho se využívá při přenosu jmen mezi procesy.
+        return _loadedLanguage, (self.code,)
+
     @property
     def ma(self) -> MorphoAnalyzerLibma:
         """
@@ -114,6 +152,14 @@ class Language(object):
             raise ExceptionMessageCode(ErrorMessenger.CODE_LANGUAGE_NOT_INIT_MA)
         return self._ma
 
+    @property
+    def hasMAnalyzer(self) -> bool:
+        """
+        Zdali je morfologický analyzátor inicializován.
+        """
+
+        return self._ma is not None
+
     def initMAnalyzer(self, words: Set[str]):
         """
         Provede inicializaci morfologického analyzátoru pomocí daných slov.
@@ -121,7 +167,44 @@ class Language(object):
         :param words: Slova pro inicializaci
         """
 
-        self._ma = MorphoAnalyzerLibma(self._maPath, words)
+        self._ma = MorphoAnalyzerLibma(self._maPath, words, cacheLang=self.code, **self._maOptions)
+
+    def extendMAnalyzer(self, words: Set[str]):
+        """
+        Rozšíří morfologický analyzátor o analýzu daných slov. Pokud ještě nebyl inicializován, tak jej inicializuje.
+
+        :param words: Slova pro analýzu. Slova, která již analyzátor zná, nejsou analyzována znovu.
+        """
+
+        if self._ma is None:
+            self.initMAnalyzer(words)
+        else:
+            self._ma.addWords(words)
+
+    def fingerprint(self) -> str:
+        """
+        Otisk jazyka. Je tvořen obsahem gramatik, titulů, souboru s ekvivalentními slovy a otiskem morfologického
+        analyzátoru (viz MACache.fingerprint).
+
+        :return: Otisk jazyka.
+        :rtype: str
+        """
+
+        h = hashlib.sha1()
+        h.update(self.code.encode())
+        for path in self._dataFiles:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        h.update(MACache.fingerprint(self._maPath, self._maOptions.get("profile", MAProfile.FULL).maArgs).encode())
+        return h.hexdigest()
+
+    def closeMAnalyzer(self):
+        """
+        Ukončí případný běžící proces morfologického analyzátoru. Jeho databáze slov zůstává zachována.
+        """
+
+        if self._ma is not None:
+            self._ma.close()
 
     @staticmethod
     def _readTitles(pathT) -> Set[str]:
@@ -6,12 +6,13 @@ Modul se třídami pro reprezentaci jména/názvu.
 :contact:    xdocek09@stud.fit.vubtr.cz
 """
 
+import itertools
 import locale
 import logging
 import sys
 from builtins import str
 from enum import Enum
-from typing import List, Dict, Set, Tuple, Union, Optional, TextIO
+from typing import List, Dict, Set, Tuple, Union, Optional, TextIO, Iterable
 
 import namegenPack.Grammar
 from namegenPack import Errors
@@ -717,7 +718,7 @@ class Name(object):
             wordsWithRules=[]
             for i, (word, aToken) in enumerate(zip(self._words, analyzedTokens)):
 
-                if aToken.morph and isinstance(genMorphsForWords[i], set):
+                if aToken.morph and genMorphsForWords[i] is not None:
                     # ohýbáme
 
                     morphsThatWeAlreadyHaves = set()
@@ -840,7 +841,8 @@ class NameReader(object):
 
     """
 
-    def __init__(self, languages: Dict[str, Language], langDef: str, inputFile=None, shouldSort:bool=True):
+    def __init__(self, languages: Dict[str, Language], langDef: str, inputFile=None, shouldSort:bool=True,
+                 chunkSize: Optional[int] = None):
         """
         Konstruktor
 
@@ -852,10 +854,23 @@ class NameReader(object):
             Pokud je None čte z stdin
         :type inputFile: string | None
         :param shouldSort: Příznak zda si má po přečtení uložit jména v sežazeném pořadí vzestupně.
+            Při čtení po dávkách se řadí jména v rámci každé dávky.
         :type shouldSort: bool
+        :param chunkSize: Pokud je uvedeno, tak se vstup nenačítá celý v konstruktoru, ale postupně po dávkách
+            o daném počtu řádků pomocí :func:`~NameReader.chunks`.
+        :type chunkSize: Optional[int]
         """
         self.names = []
         self._errorCnt = 0  # počet chybných nenačtených jmen
+        self._languages = languages
+        self._langDef = langDef
+        self._inputFile = inputFile
+        self._shouldSort = shouldSort
+        self._chunkSize = chunkSize
+
+        if chunkSize is not None:
+            # čteme až na požádání po dávkách
+            return
 
         if inputFile is None:
             self._readInput(sys.stdin, languages, langDef)
@@ -866,6 +881,36 @@ class NameReader(object):
         if shouldSort:
             self.sortNames()
 
+    def chunks(self):
+        """
+        Postupně čte vstup po dávkách. Načtená jména aktuální dávky jsou vždy v :attr:`names` a jména z předešlé
+        dávky jsou zahozena. Ostatní metody (filter, allWords, sortNames...) tedy pracují nad aktuální dávkou.
+
+        :return: Generátor, který pro každou dávku vrací tento objekt.
+        :rtype: Generator[NameReader, None, None]
+        """
+
+        if self._chunkSize is None:
+            # vše již máme načtené
+            yield self
+            return
+
+        rInput = sys.stdin if self._inputFile is None else open(self._inputFile, "r")
+        try:
+            while True:
+                lines = list(itertools.islice(rInput, self._chunkSize))
+                if len(lines) == 0:
+                    break
+                self.names = []
+                self._readInput(lines, self._languages, self._langDef)
+                if self._shouldSort:
+                    self.sortNames()
+                yield self
+        finally:
+            self.names = []
+            if rInput is not sys.stdin:
+                rInput.close()
+
     def sortNames(self):
         """
         Performs sorting of all names.
@@ -918,22 +963,24 @@ class NameReader(object):
         """
         return self._errorCnt
 
-    def allWords(self, alnumCheck: bool = False) -> Set[Word]:
+    def allWords(self, alnumCheck: bool = False, names: Optional[Iterable["Name"]] = None) -> Set[Word]:
         """
         Slova vyskytující se ve všech jménech.
 
         :param alnumCheck: Vybere jen ta slova, která obsahují aspoň jeden alfanumerický znak.
+        :param names: Jména, jejichž slova chceme. Pokud None, tak všechna jména.
         :return Množina všech slov ve jménech.
         """
         words = set()
+        names = self.names if names is None else names
 
         if alnumCheck:
-            for name in self.names:
+            for name in names:
                 for w in name:
                     if any(s.isalnum() for s in str(w)):
                         words.add(w)
         else:
-            for name in self.names:
+            for name in names:
                 for w in name:
                     words.add(w)
         return words
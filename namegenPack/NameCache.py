@@ -0,0 +1,199 @@
+"""
+Created on 16. 10. 2026
+
+Modul obsahuje perzistentní cache výsledků generování pro celá jména.
+"""
+import hashlib
+import pickle
+import sqlite3
+import time
+import zlib
+from enum import Enum
+from typing import Dict, Iterable, Optional, Any, Tuple
+
+from .Errors import ExceptionMessageCode, ErrorMessenger
+
+
+class NameCacheException(ExceptionMessageCode):
+    """
+    Vyjímka pro problémy s cache výsledků jmen.
+    """
+    pass
+
+
+class NameCache(object):
+    """
+    Perzistentní cache výsledků generování jmen uložená v SQLite databázi.
+
+    Záznam je klíčován kódem jazyka, druhem jména ze vstupu, samotným jménem a otiskem (viz fingerprint), který má
+    zachytit vše, na čem výsledek jména závisí (gramatiky, morfologický analyzátor, konfigurace, program).
+    Ukládá se vypsaný výsledek bez doplňujících informací ze vstupu, takže opakované jméno s jinými doplňujícími
+    informacemi (např. jiné URL) lze vypsat bez analýzy.
+
+    Velikost cache je omezena počtem záznamů. Při překročení jsou odstraněny nejdéle nepoužité záznamy.
+    """
+
+    FORMAT_VERSION = 1
+    """Verze formátu uložených dat. Při změně struktury uloženého výsledku je nutné ji zvýšit."""
+
+    SQLITE_MAX_VARIABLES = 900
+    """Maximální počet parametrů v jednom SQL dotazu."""
+
+    def __init__(self, path: str, maxEntries: Optional[int] = None):
+        """
+        Otevře (případně vytvoří) cache.
+
+        :param path: Cesta k souboru s cache.
+        :type path: str
+        :param maxEntries: Maximální počet záznamů v cache. None -> neomezeně
+        :type maxEntries: Optional[int]
+        :raise NameCacheException: Cache nelze otevřít.
+        """
+
+        self._path = path
+        self._maxEntries = maxEntries
+        self._now = int(time.time())
+        try:
+            self._conn = sqlite3.connect(path)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS names ("
+                               "lang TEXT NOT NULL, fingerprint TEXT NOT NULL, name_type TEXT NOT NULL, "
+                               "name TEXT NOT NULL, data BLOB NOT NULL, last_used INTEGER NOT NULL, "
+                               "PRIMARY KEY (lang, fingerprint, name, name_type))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS names_last_used ON names (last_used)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            raise NameCacheException(ErrorMessenger.CODE_NAME_CACHE,
+                                     ErrorMessenger.getMessage(ErrorMessenger.CODE_NAME_CACHE) + "\n\t" + path + ": " +
+                                     str(e))
+
+    @classmethod
+    def fingerprint(cls, parts: Iterable[Any], files: Iterable[str] = ()) -> str:
+        """
+        Vytvoří otisk, na kterém jsou závislé výsledky jmen.
+
+        :param parts: Hodnoty, které otisk tvoří (konfigurace, otisky jiných částí...). Množiny a slovníky mohou
+            být v libovolném pořadí.
+        :type parts: Iterable[Any]
+        :param files: Cesty k souborům, jejichž obsah otisk tvoří.
+        :type files: Iterable[str]
+        :return: Otisk.
+        :rtype: str
+        """
+
+        h = hashlib.sha1()
+        h.update(str(cls.FORMAT_VERSION).encode())
+        for p in parts:
+            h.update(cls._stableRepr(p).encode())
+
+        for path in files:
+            h.update(path.encode())
+            try:
+                with open(path, "rb") as f:
+                    h.update(f.read())
+            except OSError:
+                pass
+
+        return h.hexdigest()
+
+    @classmethod
+    def _stableRepr(cls, obj: Any) -> str:
+        """
+        Textová reprezentace hodnoty, která nezávisí na pořadí prvků v množinách a slovnících.
+
+        :param obj: Hodnota.
+        :type obj: Any
+        :return: Reprezentace hodnoty.
+        :rtype: str
+        """
+
+        if isinstance(obj, dict):
+            return "{" + ", ".join(sorted(cls._stableRepr(k) + ": " + cls._stableRepr(v) for k, v in obj.items())) \
+                   + "}"
+        if isinstance(obj, (set, frozenset)):
+            return "{" + ", ".join(sorted(cls._stableRepr(x) for x in obj)) + "}"
+        if isinstance(obj, (list, tuple)):
+            return "[" + ", ".join(cls._stableRepr(x) for x in obj) + "]"
+        if isinstance(obj, Enum):
+            return type(obj).__name__ + "." + obj.name
+        if type(obj).__repr__ is object.__repr__:
+            # výchozí reprezentace obsahuje adresu objektu
+            return type(obj).__name__ + "(" + str(obj) + ")"
+        return repr(obj)
+
+    def get(self, lang: str, fingerprint: str, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Any]:
+        """
+        Získá výsledky jmen z cache.
+
+        :param lang: Kód jazyka.
+        :type lang: str
+        :param fingerprint: Otisk (viz fingerprint).
+        :type fingerprint: str
+        :param keys: Dvojice (druh jména, jméno) pro vyhledání.
+        :type keys: Iterable[Tuple[str, str]]
+        :return: (druh jména, jméno) -> uložený výsledek. Obsahuje pouze nalezená jména.
+        :rtype: Dict[Tuple[str, str], Any]
+        """
+
+        keys = set(keys)
+        names = list(set(name for _, name in keys))
+        res = {}
+        for offset in range(0, len(names), self.SQLITE_MAX_VARIABLES):
+            part = names[offset:offset + self.SQLITE_MAX_VARIABLES]
+            rows = self._conn.execute(
+                "SELECT name_type, name, data FROM names WHERE lang = ? AND fingerprint = ? AND name IN ({})".format(
+                    ",".join("?" * len(part))), [lang, fingerprint] + part)
+
+            for nameType, name, data in rows:
+                if (nameType, name) in keys:
+                    res[(nameType, name)] = pickle.loads(zlib.decompress(data))
+
+        if len(res) > 0:
+            self._conn.executemany("UPDATE names SET last_used = ? "
+                                   "WHERE lang = ? AND fingerprint = ? AND name_type = ? AND name = ?",
+                                   ((self._now, lang, fingerprint, nameType, name) for nameType, name in res))
+            self._conn.commit()
+
+        return res
+
+    def put(self, lang: str, fingerprint: str, results: Dict[Tuple[str, str], Any]):
+        """
+        Uloží výsledky jmen do cache.
+
+        :param lang: Kód jazyka.
+        :type lang: str
+        :param fingerprint: Otisk (viz fingerprint).
+        :type fingerprint: str
+        :param results: (druh jména, jméno) -> výsledek jména.
+        :type results: Dict[Tuple[str, str], Any]
+        """
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO names (lang, fingerprint, name_type, name, data, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((lang, fingerprint, nameType, name,
+              zlib.compress(pickle.dumps(r, protocol=pickle.HIGHEST_PROTOCOL)), self._now)
+             for (nameType, name), r in results.items()))
+        self._conn.commit()
+
+    def evict(self):
+        """
+        Odstraní nejdéle nepoužité záznamy, pokud je překročen maximální počet záznamů.
+        """
+
+        if self._maxEntries is None:
+            return
+
+        cnt = self._conn.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+        if cnt > self._maxEntries:
+            self._conn.execute("DELETE FROM names WHERE rowid IN "
+                               "(SELECT rowid FROM names ORDER BY last_used LIMIT ?)", (cnt - self._maxEntries,))
+            self._conn.commit()
+
+    def close(self):
+        """
+        Provede případné odstranění záznamů nad limit a uzavře cache.
+        """
+        if self._conn is not None:
+            self.evict()
+            self._conn.close()
+            self._conn = None
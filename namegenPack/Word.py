@@ -150,9 +150,10 @@ class Word(object):
         :type wordFilter: Set[MorphCategory]
         :param groupFlags: Flagy, které musí mít daná skupina vázající se na slovo.
         :type groupFlags: Set[Flag]
-        :return: Vrací možné tvary i s jejich pravidly.
-                Set[Tuple[MARule,str]]    str je tvar
-        :rtype: Set[Tuple[MARule,str]]
+        :return: Vrací možné tvary i s jejich pravidly. Výsledek je sdílený napříč jmény (viz
+            MorphoAnalyze.getMorphsCached), a proto neměnný.
+                FrozenSet[Tuple[MARule,str]]    str je tvar
+        :rtype: FrozenSet[Tuple[MARule,str]]
         :raise WordNoMorphsException: pokud se nepodaří získat tvary.
         """
         # na základě filtrů získáme všechny možné tvary
@@ -163,7 +164,7 @@ class Word(object):
         if groupFlags is None:
             groupFlags = set()
 
-        tmp = self.info.getMorphs(categories, {StylisticFlag.COLLOQUIALLY}, wordFilter, groupFlags)
+        tmp = self.info.getMorphsCached(categories, {StylisticFlag.COLLOQUIALLY}, wordFilter, groupFlags)
         if tmp is None or len(tmp) < 1:
             raise self.WordNoMorphsException(self, Errors.ErrorMessenger.CODE_WORD_NO_MORPHS_GENERATED,
                                              Errors.ErrorMessenger.getMessage(
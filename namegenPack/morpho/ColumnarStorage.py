@@ -0,0 +1,183 @@
+"""
+Created on 16. 10. 2026
+
+Modul obsahuje sloupcové úložiště dat v souboru, které je namapováno do paměti (mmap).
+Používá se pro kompaktní uložení databáze slov morfologického analyzátoru.
+"""
+import mmap
+import pickle
+import struct
+from array import array
+from typing import Dict, Any, List, Optional, BinaryIO
+
+
+class ColumnarSegment(object):
+    """
+    Neměnný segment dat uložený v souboru a namapovaný do paměti.
+
+    Obsahuje:
+        tabulku řetězců (jeden sdílený buffer utf-8 a pole offsetů)
+            Prvních keysCnt řetězců jsou klíče seřazené vzestupně, dle kterých lze vyhledávat (viz find).
+        pojmenované sloupce celých čísel (array.array)
+        libovolná doplňková data (pickle)
+
+    Čísla jsou uložena v nativním pořadí bajtů, soubor je tedy určen pro použití na stejném stroji (např. dočasný
+    soubor sdílený pracovními procesy).
+    """
+
+    MAGIC = b"NGCOLS01"
+    ALIGNMENT = 8
+
+    def __init__(self, f: BinaryIO):
+        """
+        Otevře segment ze souboru.
+
+        :param f: Soubor se segmentem (viz write). Musí zůstat otevřený po celou dobu používání segmentu.
+        :type f: BinaryIO
+        :raise ValueError: Soubor neobsahuje segment.
+        """
+        self._file = f
+        self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError("Invalid columnar segment.")
+
+        headerStart = len(self.MAGIC) + 8
+        headerLen = struct.unpack("<Q", self._mmap[len(self.MAGIC):headerStart])[0]
+        header = pickle.loads(self._mmap[headerStart:headerStart + headerLen])
+
+        view = memoryview(self._mmap)
+        self.meta = header["meta"]
+        self.keysCnt = header["keysCnt"]
+
+        offsetsStart, stringsCnt, bufferStart = header["strings"]
+        self._strOffsets = view[offsetsStart:offsetsStart + (stringsCnt + 1) * 8].cast("q")
+        self._strBuffer = bufferStart
+
+        self._columns = {}
+        for name, (typecode, start, length) in header["columns"].items():
+            itemSize = array(typecode).itemsize
+            self._columns[name] = view[start:start + length * itemSize].cast(typecode)
+        view.release()
+
+    @classmethod
+    def write(cls, f: BinaryIO, strings: List[str], keysCnt: int, columns: Dict[str, array], meta: Any = None):
+        """
+        Zapíše segment do souboru.
+
+        :param f: Soubor pro zápis (binární). Zapisuje se od aktuální pozice, která by měla být na začátku souboru.
+        :type f: BinaryIO
+        :param strings: Tabulka řetězců. Prvních keysCnt řetězců musí být seřazeno vzestupně.
+        :type strings: List[str]
+        :param keysCnt: Počet klíčů na začátku tabulky řetězců.
+        :type keysCnt: int
+        :param columns: Pojmenované sloupce.
+        :type columns: Dict[str, array]
+        :param meta: Doplňková data, musí jít serializovat pomocí pickle.
+        :type meta: Any
+        """
+
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = array("q", [0])
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+
+        sections = [("strOffsets", offsets.tobytes())]
+        sections.extend((name, col.tobytes()) for name, col in columns.items())
+        sections.append(("strBuffer", b"".join(encoded)))
+
+        # Hlavička obsahuje pozice dat, které ale závisí na její délce. Místo pro hlavičku proto zvětšujeme,
+        # dokud se do něj nevejde.
+        headerSpace = 0
+        while True:
+            layout = {}
+            pos = cls._align(len(cls.MAGIC) + 8 + headerSpace)
+            for name, data in sections:
+                layout[name] = pos
+                pos = cls._align(pos + len(data))
+
+            header = pickle.dumps({
+                "meta": meta,
+                "keysCnt": keysCnt,
+                "strings": (layout["strOffsets"], len(strings), layout["strBuffer"]),
+                "columns": {name: (col.typecode, layout[name], len(col)) for name, col in columns.items()}
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+
+            if len(header) <= headerSpace:
+                break
+            headerSpace = len(header) + 64
+
+        f.write(cls.MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        written = len(cls.MAGIC) + 8 + len(header)
+        for name, data in sections:
+            f.write(b"\0" * (layout[name] - written))
+            f.write(data)
+            written = layout[name] + len(data)
+        f.flush()
+
+    def close(self):
+        """
+        Uvolní namapovanou paměť a zavře soubor segmentu. Segment již poté nelze používat.
+        """
+        self._strOffsets.release()
+        for column in self._columns.values():
+            column.release()
+        self._mmap.close()
+        self._file.close()
+
+    @classmethod
+    def _align(cls, pos: int) -> int:
+        """
+        Zarovná pozici v souboru.
+
+        :param pos: Pozice.
+        :type pos: int
+        :return: Nejbližší vyšší zarovnaná pozice.
+        :rtype: int
+        """
+        return (pos + cls.ALIGNMENT - 1) // cls.ALIGNMENT * cls.ALIGNMENT
+
+    def string(self, i: int) -> str:
+        """
+        Řetězec z tabulky řetězců.
+
+        :param i: Index řetězce.
+        :type i: int
+        :return: Řetězec.
+        :rtype: str
+        """
+        return str(self._mmap[self._strBuffer + self._strOffsets[i]:self._strBuffer + self._strOffsets[i + 1]],
+                   "utf-8")
+
+    def column(self, name: str) -> memoryview:
+        """
+        Sloupec celých čísel.
+
+        :param name: Název sloupce.
+        :type name: str
+        :return: Sloupec (jen pro čtení).
+        :rtype: memoryview
+        """
+        return self._columns[name]
+
+    def find(self, key: str) -> Optional[int]:
+        """
+        Vyhledá klíč (binárním vyhledáváním).
+
+        :param key: Hledaný klíč.
+        :type key: str
+        :return: Index klíče v tabulce řetězců. None pokud klíč v segmentu není.
+        :rtype: Optional[int]
+        """
+        lo, hi = 0, self.keysCnt
+        while lo < hi:
+            mid = (lo + hi) // 2
+            s = self.string(mid)
+            if s < key:
+                lo = mid + 1
+            elif s > key:
+                hi = mid
+            else:
+                return mid
+        return None
@@ -0,0 +1,233 @@
+"""
+Created on 16. 10. 2026
+
+Modul obsahuje perzistentní cache výsledků morfologického analyzátoru.
+"""
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Any, List
+
+from ..Errors import ExceptionMessageCode, ErrorMessenger
+
+
+class MACacheException(ExceptionMessageCode):
+    """
+    Vyjímka pro problémy s cache morfologického analyzátoru.
+    """
+    pass
+
+
+class MACache(object):
+    """
+    Perzistentní cache analýz slov z morfologického analyzátoru uložená v SQLite databázi.
+
+    Záznam je klíčován slovem, kódem jazyka a otiskem analyzátoru (viz fingerprint). Při změně skriptu ma,
+    programu, slovníku či formátu uložených dat se tedy původní záznamy nepoužijí.
+    Ukládá se i informace o tom, že slovo ma nezná.
+
+    Velikost cache je omezena počtem záznamů. Při překročení jsou odstraněny nejdéle nepoužité záznamy.
+    """
+
+    FORMAT_VERSION = 3
+    """Verze formátu uložených dat. Při změně struktury analýzy slova je nutné ji zvýšit."""
+
+    SQLITE_MAX_VARIABLES = 900
+    """Maximální počet parametrů v jednom SQL dotazu."""
+
+    MA_CONF_ARG = "-C"
+    """Parametr ma, za kterým následuje cesta ke konfiguračnímu souboru (odkazuje na slovníky)."""
+
+    MAX_CONF_BYTES = 1048576
+    """Maximální velikost konfiguračního souboru ma, ve kterém jsou hledány odkazy na soubory."""
+
+    def __init__(self, path: str, maxEntries: Optional[int] = None):
+        """
+        Otevře (případně vytvoří) cache.
+
+        :param path: Cesta k souboru s cache.
+        :type path: str
+        :param maxEntries: Maximální počet záznamů v cache. None -> neomezeně
+        :type maxEntries: Optional[int]
+        :raise MACacheException: Cache nelze otevřít.
+        """
+
+        self._path = path
+        self._maxEntries = maxEntries
+        self._now = int(time.time())
+        try:
+            # Při paralelní analýze jazyků je cache používána z více vláken, přístup je serializován zámkem
+            # analyzátorů (viz MorphoAnalyzerLibma.SHARED_STATE_LOCK).
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS analysis ("
+                               "lang TEXT NOT NULL, fingerprint TEXT NOT NULL, word TEXT NOT NULL, data BLOB, "
+                               "last_used INTEGER NOT NULL, PRIMARY KEY (lang, fingerprint, word))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS analysis_last_used ON analysis (last_used)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            raise MACacheException(ErrorMessenger.CODE_MA_CACHE,
+                                   ErrorMessenger.getMessage(ErrorMessenger.CODE_MA_CACHE) + "\n\t" + path + ": " +
+                                   str(e))
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def fingerprint(cls, pathToMa: str, maArgs: List[str]) -> str:
+        """
+        Vytvoří otisk morfologického analyzátoru.
+        Je tvořen obsahem skriptu ma, parametry, se kterými je spouštěn a velikostí a časem změny všech
+        existujících souborů, na které skript odkazuje absolutní cestou (program ma, slovník...). U konfiguračního
+        souboru ma (parametr -C) jsou navíc zahrnuty i soubory, na které odkazuje on (slovníky).
+        Změny ostatních souborů (např. odkazovaných relativní cestou ze skriptu) se v otisku neprojeví a cache je
+        pak nutné smazat.
+
+        :param pathToMa: Cesta ke skriptu ma.
+        :type pathToMa: str
+        :param maArgs: Parametry, se kterými je ma spouštěno.
+        :type maArgs: List[str]
+        :return: Otisk analyzátoru.
+        :rtype: str
+        """
+
+        h = hashlib.sha1()
+        h.update(str(cls.FORMAT_VERSION).encode())
+        h.update(" ".join(maArgs).encode())
+
+        try:
+            with open(pathToMa, "rb") as f:
+                script = f.read()
+        except OSError:
+            script = pathToMa.encode()
+
+        h.update(script)
+
+        tokens = script.decode(errors="replace").split()
+        for i, token in enumerate(tokens):
+            if os.path.isabs(token) and os.path.isfile(token):
+                cls._updateByFile(h, token)
+                if i > 0 and tokens[i - 1] == cls.MA_CONF_ARG:
+                    cls._updateByConfFiles(h, token)
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _updateByFile(h, path: str):
+        """
+        Přidá do otisku velikost a čas změny souboru.
+
+        :param h: Otisk pro aktualizaci.
+        :param path: Cesta k souboru.
+        :type path: str
+        """
+        st = os.stat(path)
+        h.update("{}:{}:{}".format(path, st.st_size, st.st_mtime_ns).encode())
+
+    @classmethod
+    def _updateByConfFiles(cls, h, confPath: str):
+        """
+        Přidá do otisku soubory, na které odkazuje konfigurační soubor ma. Relativní cesty jsou brány vzhledem
+        ke složce s konfiguračním souborem.
+
+        :param h: Otisk pro aktualizaci.
+        :param confPath: Cesta ke konfiguračnímu souboru ma.
+        :type confPath: str
+        """
+
+        if os.path.getsize(confPath) > cls.MAX_CONF_BYTES:
+            # nejedná se o textovou konfiguraci
+            return
+
+        try:
+            with open(confPath, "r", errors="replace") as f:
+                conf = f.read()
+        except OSError:
+            return
+
+        confDir = os.path.dirname(confPath)
+        for token in re.split(r"[\s=\"',;]+", conf):
+            if len(token) == 0:
+                continue
+            path = os.path.normpath(os.path.join(confDir, token))
+            if os.path.isfile(path) and path != os.path.normpath(confPath):
+                cls._updateByFile(h, path)
+
+    def get(self, lang: str, fingerprint: str, words: Iterable[str]) -> Dict[str, Any]:
+        """
+        Získá analýzy slov z cache.
+
+        :param lang: Kód jazyka.
+        :type lang: str
+        :param fingerprint: Otisk analyzátoru.
+        :type fingerprint: str
+        :param words: Slova pro vyhledání.
+        :type words: Iterable[str]
+        :return: Slovo -> uložená analýza slova (None pokud ma slovo nezná). Obsahuje pouze nalezená slova.
+        :rtype: Dict[str, Any]
+        """
+
+        words = list(words)
+        res = {}
+        for offset in range(0, len(words), self.SQLITE_MAX_VARIABLES):
+            part = words[offset:offset + self.SQLITE_MAX_VARIABLES]
+            rows = self._conn.execute(
+                "SELECT word, data FROM analysis WHERE lang = ? AND fingerprint = ? AND word IN ({})".format(
+                    ",".join("?" * len(part))), [lang, fingerprint] + part)
+
+            for w, data in rows:
+                res[w] = None if data is None else pickle.loads(zlib.decompress(data))
+
+        if len(res) > 0:
+            self._conn.executemany("UPDATE analysis SET last_used = ? WHERE lang = ? AND fingerprint = ? AND word = ?",
+                                   ((self._now, lang, fingerprint, w) for w in res))
+            self._conn.commit()
+
+        self.hits += len(res)
+        self.misses += len(words) - len(res)
+        return res
+
+    def put(self, lang: str, fingerprint: str, analyses: Dict[str, Any]):
+        """
+        Uloží analýzy slov do cache.
+
+        :param lang: Kód jazyka.
+        :type lang: str
+        :param fingerprint: Otisk analyzátoru.
+        :type fingerprint: str
+        :param analyses: Slovo -> analýza slova (None pokud ma slovo nezná).
+        :type analyses: Dict[str, Any]
+        """
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO analysis (lang, fingerprint, word, data, last_used) VALUES (?, ?, ?, ?, ?)",
+            ((lang, fingerprint, w,
+              None if a is None else zlib.compress(pickle.dumps(a, protocol=pickle.HIGHEST_PROTOCOL)),
+              self._now) for w, a in analyses.items()))
+        self._conn.commit()
+
+    def evict(self):
+        """
+        Odstraní nejdéle nepoužité záznamy, pokud je překročen maximální počet záznamů.
+        """
+
+        if self._maxEntries is None:
+            return
+
+        cnt = self._conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        if cnt > self._maxEntries:
+            self._conn.execute("DELETE FROM analysis WHERE rowid IN "
+                               "(SELECT rowid FROM analysis ORDER BY last_used LIMIT ?)", (cnt - self._maxEntries,))
+            self._conn.commit()
+
+    def close(self):
+        """
+        Provede případné odstranění záznamů nad limit a uzavře cache.
+        """
+        if self._conn is not None:
+            self.evict()
+            self._conn.close()
+            self._conn = None
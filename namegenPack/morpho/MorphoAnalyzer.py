@@ -7,28 +7,102 @@ Tento modul obsahuje třídy pro morfologickou analýzu.
 :contact:    xdocek09@stud.fit.vubtr.cz
 """
 
+import codecs
 import collections
+import io
 import logging
 import math
+import os
+import select
 import string
+import tempfile
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from array import array
 from copy import copy
 from subprocess import Popen, PIPE
-from typing import Set, Dict, Tuple, Optional, List, Type
+from typing import Set, Dict, Tuple, Optional, List, Type, Any, Iterable, FrozenSet, ItemsView, AbstractSet, \
+    Generator
 
 from namegenPack.morpho.MorphCategories import *
+from .ColumnarStorage import ColumnarSegment
+from ..Cache import LRUCache
+from .MACache import MACache
 from ..Errors import ExceptionMessageCode, ErrorMessenger
 
 
+def _internedMARule(d: Dict[MorphCategories, Any]) -> "MARule":
+    """
+    Získá internované pravidlo. Používá se při obnovení pravidel (pickle), aby i načtená pravidla byla sdílena.
+
+    :param d: Mluvnické kategorie pravidla.
+    :type d: Dict[MorphCategories, Any]
+    :return: Internované pravidlo.
+    :rtype: MARule
+    """
+    return MARule.intern(d)
+
+
 class MARule(collections.Mapping):
     """
     Reprezentace pravidla tvaru z morfologické analýzy.
     Pravidlo reprezentuje mluvnické kategorie, které ma dané slovo.
+
+    Pravidlo je neměnné. Pravidla vytvářená z analýzy jsou internována (viz intern), takže stejná pravidla sdílí
+    jeden objekt a porovnání je většinou rozhodnuto již identitou.
+
+    Hodnoty pravidla jsou navíc zakódovány do bitové masky (viz VALUE_BITS), takže filtrování pravidel
+    (viz fitsToFilters a compileFilters) je jen několik operací s celými čísly.
     """
 
+    __slots__ = ("_d", "_hash", "_mask", "_valueSets")
+
+    VALUE_BITS = {v: 1 << i for i, v in enumerate(
+        v for c in (POS, Gender, Number, Case, Negation, DegreeOfComparison, Person, StylisticFlag, Note) for v in c)}
+    """Bit pro každou hodnotu mluvnické kategorie."""
+
+    _interned = {}
+    """Internovaná pravidla. Klíčem jsou dvojice (kategorie, hodnota) pravidla."""
+
+    _compiledFilters = {}
+    """Již převedené filtry (viz compileFilters). Klíčem je dvojice (valFilter, notValFilter) jako frozenset."""
+
     def __init__(self, *args, **kwargs):
         self._d = dict(*args, **kwargs)
-        self._hash = None
+        self._hash = 0
+        self._mask = 0
+        # hodnoty kategorií vždy jako množina, odpadá tak rozlišování jedné hodnoty a množiny hodnot
+        self._valueSets = {}
+        for pair in self._d.items():
+            self._hash ^= hash(pair)
+            values = pair[1] if isinstance(pair[1], frozenset) else frozenset((pair[1],))
+            self._valueSets[pair[0]] = values
+            for v in values:
+                self._mask |= self.VALUE_BITS[v]
+
+    @classmethod
+    def intern(cls, d: Dict[MorphCategories, Any]) -> "MARule":
+        """
+        Získá sdílený objekt pravidla s danými mluvnickými kategoriemi.
+
+        :param d: Mluvnické kategorie pravidla.
+        :type d: Dict[MorphCategories, Any]
+        :return: Internované pravidlo.
+        :rtype: MARule
+        """
+        key = frozenset(d.items())
+        try:
+            return cls._interned[key]
+        except KeyError:
+            rule = cls(d)
+            cls._interned[key] = rule
+            return rule
+
+    def __reduce__(self):
+        # hash se musí přepočítat (hashe hodnot se mezi procesy liší) a pravidlo se znovu internuje
+        return _internedMARule, (self._d,)
 
     def __iter__(self):
         return iter(self._d)
@@ -40,12 +114,15 @@ class MARule(collections.Mapping):
         return self._d[key]
 
     def __hash__(self):
-        if self._hash is None:
-            self._hash = 0
-            for pair in self._d.items():
-                self._hash ^= hash(pair)
         return self._hash
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, MARule):
+            return self._hash == other._hash and self._d == other._d
+        return super().__eq__(other)
+
     def __str__(self):
         return str(self._d)
 
@@ -64,6 +141,10 @@ class MARule(collections.Mapping):
         :param exceptCat: Kategorie, které nejsou zohledňovány při kontrole na shodu.
         :type exceptCat: Set[MorphCategories]
         """
+        if self is other:
+            # internovaná pravidla, stejný objekt je shodný sám se sebou
+            return True
+
         if exceptCat is None:
             exceptCat = set()
 
@@ -100,62 +181,88 @@ class MARule(collections.Mapping):
         :type valFilter: Set[MorphCategory]
         :param notValFilter: Stejné jako valFilter s tím rozdílem, že dané hodnoty nesmí pravidlo obsahovat.
         :type notValFilter:Set[MorphCategory]
-        :param valFilterUsedCategories: Tento parametr lze použít pro urychlení aplikování filtru. Přeskočí se fáze získávání morfologických kategorií
-            z hodnot ve valFilter.
+        :param valFilterUsedCategories: Již se nepoužívá, kategorie filtru jsou součástí převedeného filtru
+            (viz compileFilters). Ponecháno kvůli kompatibilitě.
         :type valFilterUsedCategories: Set[MorphCategories]
         :return: Vrácí True pokud pravidlo projde přes dané filtry.
         :rtype: bool
         """
-        if valFilter is None:
-            valFilter = set()
-        if notValFilter is None:
-            notValFilter = set()
 
-        if valFilterUsedCategories is None:
-            valFilterUsedCategories = {f.category() for f in valFilter}
+        return self.fitsToMasks(*self.compileFilters(valFilter, notValFilter))
 
-        try:
-            # Kategorie pravidla může obsahovat přímo hodnotu nebo množinu hodnot.
-            # Musíme se tedy rozhodnout zdali budeme danou kategorii pravidla zpracovávat jako množinu nebo hodnotu,
-
-            if all(self._categoryValFilter(c, valFilter) for c in valFilterUsedCategories):
-                # Máme splněny všechny valFilter podmínky.
-
-                # Ted se mrkneme na notValFilter podmínky.
-                for forbidden in notValFilter:
-                    if forbidden.category() in self:
-                        if isinstance(self[forbidden.category()], frozenset):
-                            if forbidden in self[forbidden.category()]:
-                                return False
-                        else:
-                            if self[forbidden.category()] == forbidden:
-                                return False
+    def fitsToMasks(self, valMasks: Tuple[int, ...], notValMask: int) -> bool:
+        """
+        Detekce zdali pravidlo padne na filtry převedené pomocí compileFilters.
 
-                # vše ok
-                return True
+        :param valMasks: Masky povolených hodnot pro každou kategorii z valFilter.
+        :type valMasks: Tuple[int, ...]
+        :param notValMask: Maska zakázaných hodnot.
+        :type notValMask: int
+        :return: Vrácí True pokud pravidlo projde přes dané filtry.
+        :rtype: bool
+        """
+        if self._mask & notValMask:
+            return False
+
+        for m in valMasks:
+            # Pravidlo musí mít alespoň jednu z povolených hodnot kategorie (není-li kategorie v pravidle vůbec,
+            # nemá ani žádnou z jejích hodnot).
+            if not self._mask & m:
+                return False
+
+        return True
+
+    @classmethod
+    def compileFilters(cls, valFilter: Optional[Set[MorphCategory]] = None,
+                       notValFilter: Optional[Set[MorphCategory]] = None) -> Tuple[Tuple[int, ...], int]:
+        """
+        Převede filtry (viz fitsToFilters) na bitové masky.
+
+        :param valFilter: Filtr povolených hodnot.
+        :type valFilter: Optional[Set[MorphCategory]]
+        :param notValFilter: Filtr zakázaných hodnot.
+        :type notValFilter: Optional[Set[MorphCategory]]
+        :return: Dvojice (masky povolených hodnot pro každou kategorii z valFilter, maska zakázaných hodnot).
+        :rtype: Tuple[Tuple[int, ...], int]
+        """
+        key = (frozenset(valFilter) if valFilter else frozenset(), frozenset(notValFilter) if notValFilter else frozenset())
 
+        try:
+            return cls._compiledFilters[key]
         except KeyError:
             pass
 
-        return False
+        valMasks = {}
+        for v in key[0]:
+            valMasks[v.category()] = valMasks.get(v.category(), 0) | cls.VALUE_BITS.get(v, 0)
 
-    def _categoryValFilter(self, category: MorphCategories, valFilter: Set[MorphCategory]):
+        notValMask = 0
+        for v in key[1]:
+            notValMask |= cls.VALUE_BITS.get(v, 0)
+
+        res = (tuple(valMasks.values()), notValMask)
+        cls._compiledFilters[key] = res
+        return res
+
+    def valuesOf(self, category: MorphCategories) -> FrozenSet[MorphCategory]:
         """
-        Zjistí zdali daná kategorie v pravidle obsahuje pouze hodnoty z valFilter.
+        Hodnoty dané kategorie pravidla vždy jako množina (i pro jednohodnotové kategorie).
 
-        :param category: Morfologická kategorie pravidla, kterou chceme prozkoumat.
+        :param category: Mluvnická kategorie.
         :type category: MorphCategories
-        :param valFilter: Hodnoty, které jsou povoleny.
-        (Může obsahovat klidně i další hodnoty z jiných kategorii.)
-        :type valFilter: Set[MorphCategory]
-        :return: True pokud je filter splněn. Flase jinak.
-        :rtype bool
+        :return: Hodnoty kategorie.
+        :rtype: FrozenSet[MorphCategory]
+        :raise KeyError: Pravidlo kategorii nemá.
         """
+        return self._valueSets[category]
 
-        if isinstance(self[category], frozenset):
-            return any(v in valFilter for v in self[category])
-        else:
-            return self[category] in valFilter
+    def valueSets(self) -> ItemsView:
+        """
+        Dvojice (kategorie, hodnoty) pravidla, kde hodnoty jsou vždy množinou (i pro jednohodnotové kategorie).
+
+        :rtype: ItemsView
+        """
+        return self._valueSets.items()
 
     @property
     def lntrf(self):
@@ -337,6 +444,50 @@ class MorphoAnalyze(ABC):
         """
         pass
 
+    MORPHS_CACHE = LRUCache(100000)
+    """Cache výsledků getMorphsCached sdílená všemi analýzami (a tedy i jmény)."""
+
+    def _morphsCacheVersion(self) -> Any:
+        """
+        Verze obsahu analýzy pro klíč cache getMorphsCached. Musí se změnit při každé změně analýzy, která má vliv
+        na výsledek getMorphs.
+
+        :return: Verze obsahu analýzy.
+        :rtype: Any
+        """
+        return None
+
+    def getMorphsCached(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None,
+                        wordFilter: Set[MorphCategory] = None, groupFlags: Set[Flag] = None) \
+            -> FrozenSet[Tuple[MARule, str]]:
+        """
+        Stejné jako getMorphs, ale výsledek je uložen do sdílené cache (viz MORPHS_CACHE). Stejné dotazy nad stejnou
+        analýzou (např. časté křestní jméno ve více jménech) se tak nepočítají znovu.
+
+        :param valFilter: Viz getMorphs.
+        :type valFilter: Set[MorphCategory]
+        :param notValFilter: Viz getMorphs.
+        :type notValFilter:Set[MorphCategory]
+        :param wordFilter: Viz getMorphs.
+        :type wordFilter: Set[MorphCategory]
+        :param groupFlags: Viz getMorphs.
+        :type groupFlags: Set[Flag]
+        :return: Množinu dvojic (pravidlo, tvar).
+        :rtype: FrozenSet[Tuple[MARule,str]]
+        """
+
+        key = (self, self._morphsCacheVersion(),
+               frozenset(valFilter) if valFilter else None,
+               frozenset(notValFilter) if notValFilter else None,
+               frozenset(wordFilter) if wordFilter else None,
+               frozenset(groupFlags) if groupFlags else None)
+        try:
+            return self.MORPHS_CACHE[key]
+        except KeyError:
+            res = frozenset(self.getMorphs(valFilter, notValFilter, wordFilter, groupFlags))
+            self.MORPHS_CACHE[key] = res
+            return res
+
 
 class MorphoAnalyzer(ABC):
     """
@@ -358,6 +509,27 @@ class MorphoAnalyzer(ABC):
         """
         pass
 
+    @abstractmethod
+    def hasNameDependantAnalysis(self, name) -> bool:
+        """
+        Zjistí zdali může mít některé slovo daného jména na jméně závislou analýzu. Ta je závislá i na ostatních
+        zpracovávaných jménech.
+
+        :param name: Jméno pro kontrolu.
+        :type name: Name
+        :return: True -> jméno může mít slova s na jméně závislou analýzou.
+                False -> nemá
+        :rtype: bool
+        """
+        pass
+
+    @abstractmethod
+    def analyzePending(self):
+        """
+        Analyzuje všechna slova, jejichž analýza byla odložena (lazy analýza).
+        """
+        pass
+
     @abstractmethod
     def analyze(self, word: str, name=None, wordPos: Optional[int]=None) -> MorphoAnalyze:
         """
@@ -437,6 +609,286 @@ class MorphoAnalyzerException(ExceptionMessageCode):
     pass
 
 
+class MAProfile(object):
+    """
+    Profil analýzy určující, co má být od ma získáváno.
+
+    Odvozená slova (-D) jsou potřebná pouze pro generování odvozených tvarů (GenerateDerivatedForms). Bez nich ma
+    vypisuje méně textu a databáze slov je menší.
+    """
+
+    BASE_ARGS = ["-F", "-m", "-n"]
+    """Parametry, se kterými je ma spouštěno vždy."""
+
+    def __init__(self, derivations: bool = False,
+                 derivTypes: Optional[AbstractSet[Tuple[str, Optional[str]]]] = None):
+        """
+        Inicializace profilu.
+
+        :param derivations: True -> získávají se i odvozená slova (-D) a ta jsou také analyzována.
+        :type derivations: bool
+        :param derivTypes: Druhy odvození, jejichž odvozená slova mají být analyzována. Pokud None, tak všechny.
+            Množina dvojic (typ relace, poznámka), poznámka None odpovídá libovolné poznámce
+            (stejně jako u GenerateDerivatedForms).
+        :type derivTypes: Optional[AbstractSet[Tuple[str, Optional[str]]]]
+        """
+
+        self.derivations = derivations
+        self._derivTypes = None if derivTypes is None else {relation: note for relation, note in derivTypes}
+
+    @property
+    def maArgs(self) -> List[str]:
+        """
+        Parametry, se kterými má být spouštěno ma.
+        """
+
+        return self.BASE_ARGS + ["-D"] if self.derivations else self.BASE_ARGS
+
+    def allowsDerivation(self, derivType: Optional[Tuple[str, Optional[str]]]) -> bool:
+        """
+        Zjistí, zda-li má být analyzováno slovo odvozené daným druhem odvození.
+
+        :param derivType: Druh odvození (typ relace, poznámka).
+        :type derivType: Optional[Tuple[str, Optional[str]]]
+        :return: True -> slovo má být analyzováno.
+        :rtype: bool
+        """
+
+        if not self.derivations:
+            return False
+
+        if self._derivTypes is None:
+            return True
+
+        if derivType is None or derivType[0] not in self._derivTypes:
+            return False
+
+        note = self._derivTypes[derivType[0]]
+        return note is None or note == derivType[1]
+
+
+MAProfile.FULL = MAProfile(True)
+"""Profil se všemi odvozenými slovy."""
+
+
+class SharedStateLock(object):
+    """
+    Zámek stavu sdíleného analyzátory všech jazyků (internovaná pravidla, převedená značko pravidla, cache analýz...)
+    a databáze slov analyzátoru při souběžné analýze ve více vláknech.
+
+    Vlákno jej drží po celou dobu analýzy a uvolňuje jej pouze na dobu komunikace s ma (viz released). Procesy ma
+    tak běží souběžně, ale zpracování jejich výstupů je sériové.
+    Vlákno, které zámek drží, jej může získat znovu.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._lock.acquire()
+        self._local.depth = depth + 1
+        return self
+
+    def __exit__(self, excType, excVal, excTb):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            self._lock.release()
+
+    @contextmanager
+    def released(self):
+        """
+        Uvolní zámek, pokud jej aktuální vlákno drží, a po skončení bloku jej znovu získá.
+        """
+
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            yield
+            return
+
+        self._local.depth = 0
+        self._lock.release()
+        try:
+            yield
+        finally:
+            self._lock.acquire()
+            self._local.depth = depth
+
+
+class MAProcess(object):
+    """
+    Dlouhodobě běžící proces morfologického analyzátoru ma, kterému jsou slova předávána postupně po dávkách.
+    Ušetří se tak opakované spouštění ma a načítání jeho slovníku.
+
+    Hranice odpovědí jednotlivých slov jsou určeny promptem ma> na začátku řádku. Za každou dávku je poslán
+    ještě rámcovací řetězec (FRAME_WORD) a odpověď na dávku je kompletní ve chvíli, kdy se objeví jeho prompt.
+    Zbytek odpovědi na rámcovací řetězec je přeskočen před čtením odpovědi na další dávku.
+
+    Výstup ma je připojen na pseudoterminál, aby ma (stdio) vypisovalo po řádcích a nedrželo odpověď v bufferu.
+    """
+
+    PROMPT = "ma>"
+    FRAME_WORD = "namegenframeboundary"
+
+    def __init__(self, args: List[str], stallTimeout: Optional[float] = None):
+        """
+        Inicializace. Samotný proces je spuštěn až s první dávkou.
+
+        :param args: Příkaz pro spuštění ma i s parametry.
+        :type args: List[str]
+        :param stallTimeout: Maximální počet sekund, po které může ma při zpracování dávky nic nevypsat.
+            Poté je odpověď považována za neúplnou a proces je restartován. None -> neomezeně
+        :type stallTimeout: Optional[float]
+        """
+
+        self._args = args
+        self._stallTimeout = stallTimeout
+        self._p = None
+        self._master = None  # čtecí konec pseudoterminálu s výstupem ma
+        self._buffer = ""  # dosud nezpracovaná (neúplná) část výstupu
+        self._decoder = None
+        self._skipToPrompt = False  # přeskočí zbytek odpovědi na rámcovací řetězec předešlé dávky
+
+    def _start(self):
+        """
+        Spustí proces ma.
+
+        :raise MorphoAnalyzerException: Nepodařilo se spustit.
+        """
+        import pty
+        import termios
+
+        master, slave = pty.openpty()
+        # bez převodu \n -> \r\n
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.ONLCR
+        attrs[3] &= ~termios.ECHO
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+        try:
+            self._p = Popen(self._args, stdin=PIPE, stdout=slave, stderr=None)
+        except OSError as e:
+            os.close(master)
+            raise MorphoAnalyzerException(ErrorMessenger.CODE_MA_FAILURE,
+                                          ErrorMessenger.getMessage(ErrorMessenger.CODE_MA_FAILURE) + "\n\t" + str(e))
+        finally:
+            os.close(slave)
+
+        self._master = master
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._skipToPrompt = False
+
+    def close(self):
+        """
+        Ukončí proces ma.
+        """
+
+        if self._p is not None:
+            try:
+                self._p.stdin.close()
+            except OSError:
+                pass
+            try:
+                self._p.wait(timeout=5)
+            except Exception:
+                self._p.kill()
+                self._p.wait()
+            self._p = None
+
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+
+    def _write(self, data: bytes):
+        """
+        Zapíše data na vstup ma. Běží ve vlastním vlákně, aby se souběžně mohl číst výstup.
+
+        :param data: Data pro zápis.
+        :type data: bytes
+        """
+        try:
+            self._p.stdin.write(data)
+            self._p.stdin.flush()
+        except OSError:
+            # ma skončilo, to se projeví při čtení
+            pass
+
+    def communicate(self, words: List[str]) -> Generator[str, None, None]:
+        """
+        Předá ma dávku slov a postupně vrací řádky odpovědi tak, jak je ma vypisuje.
+        Slova jsou zapisována ve vlastním vlákně souběžně se čtením odpovědi.
+
+        Pokud ma nedokončí odpověď (spadne, nebo nic nevypisuje déle než stallTimeout), tak je proces ukončen
+        a s další dávkou spuštěn znovu. Vrácené řádky pak končí dříve.
+        Odpověď je nutné přečíst celou, před další dávkou.
+
+        :param words: Slova pro analýzu.
+        :type words: List[str]
+        :return: Generátor řádků odpovědi.
+        :rtype: Generator[str, None, None]
+        :raise MorphoAnalyzerException: Nepodařilo se spustit ma, nebo ma neodpovědělo na jediné slovo dávky
+            (skončilo, nebo přestalo odpovídat).
+        """
+
+        if self._p is None or self._p.poll() is not None:
+            self.close()
+            self._start()
+
+        writer = threading.Thread(target=self._write,
+                                  args=(str.encode("\n".join(words + [self.FRAME_WORD]) + "\n"),), daemon=True)
+        writer.start()
+
+        prompts = 0
+        expected = len(words) + 1  # +1 za rámcovací řetězec
+        exited = False  # ma uzavřelo výstup
+
+        while prompts < expected:
+            ready, _, _ = select.select([self._master], [], [], self._stallTimeout)
+            if not ready:
+                # ma neodpovídá
+                break
+            try:
+                chunk = os.read(self._master, 65536)
+            except OSError:
+                # pseudoterminál byl uzavřen, ma skončilo
+                chunk = b""
+            if not chunk:
+                exited = True
+                break
+
+            self._buffer += self._decoder.decode(chunk)
+            *completeLines, self._buffer = self._buffer.split("\n")
+
+            for line in completeLines:
+                if line.startswith(self.PROMPT):
+                    self._skipToPrompt = False
+                    prompts += 1
+                    if prompts == expected:
+                        # odpověď na rámcovací řetězec již nepotřebujeme
+                        break
+                elif self._skipToPrompt:
+                    continue
+                yield line
+
+        if prompts < expected:
+            # neúplná odpověď, nevíme v jakém stavu je ma
+            if self._p.poll() is None:
+                self._p.kill()
+            writer.join()
+            self.close()
+
+            if prompts == 0:
+                # selhání analyzátoru, nepodařilo se zpracovat ani jedno slovo (např. ma nelze spustit, nebo visí)
+                raise MorphoAnalyzerException(ErrorMessenger.CODE_MA_FAILURE)
+            return
+
+        writer.join()
+
+        self._skipToPrompt = True
+
+
 class MorphoAnalyzerLibma(MorphoAnalyzer):
     """
     Obálka pro Morfologický analyzátor postavený na knihovně libma
@@ -504,6 +956,17 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             self._tagRules = []  # značko pravidla pro slovo
             self._morphs = []  # tvary k danému slovu ve formátu dvojic (tagRule, tvar)
             self._derivations = []  # odvozená slova
+            # Pomocné struktury pro přidávání tvarů, viz addMorph a releaseMorphsIndex.
+            # Již přidané tvary, pro odstranění duplicit.
+            self._morphsSet = None
+            # Index značko pravidel pro kontrolu relevance tvaru:
+            #   kategorie pravidla (bez CASE, STYLISTIC_FLAG a NOTE) -> hodnoty těchto kategorií -> poznámky
+            #   Poznámky jsou None pokud pravidlo poznámku nemá.
+            self._relevanceIndex = None
+            # Index hodnot mluvnických kategorií, viz categoryValues:
+            #   (kategorie, masky povolených hodnot, maska zakázaných hodnot) -> hodnoty kategorie
+            # Vytváří se postupně při dotazech a zahazuje se při přidání značko pravidla.
+            self._categoryIndex = None
 
         @property
         def flags(self):
@@ -581,15 +1044,78 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
 
             if len(rule) > 0:
                 # nechceme prázdná pravidla
-                if relevant:
+                if relevant and not self._isRelevant(rule):
                     # uživatel chce přidat jen relevantní
-                    for r in self._tagRules:
-                        if r.sameExcept(rule, {MorphCategories.CASE, MorphCategories.STYLISTIC_FLAG}):
-                            # je stejné jako alespoň jedno pravidlo
-                            self._morphs.append((rule, morph))
-                else:
+                    return
+
+                if self._morphsSet is None:
+                    self._morphsSet = set(self._morphs)
+
+                if (rule, morph) not in self._morphsSet:
+                    self._morphsSet.add((rule, morph))
                     self._morphs.append((rule, morph))
 
+        RELEVANCE_EXCEPT_CATEGORIES = frozenset((MorphCategories.CASE, MorphCategories.STYLISTIC_FLAG))
+        """Kategorie, které nejsou zohledňovány při kontrole relevance tvaru (viz addMorph)."""
+
+        def _isRelevant(self, rule: MARule) -> bool:
+            """
+            Zjistí, zda-li tvar s daným pravidlem odpovídá alespoň jednomu značko pravidlu skupiny, až na CASE
+            a STYLISTIC_FLAG (viz MARule.sameExcept).
+
+            Místo porovnání se všemi značko pravidly používá index pravidel dle hodnot jejich kategorií. Jediná
+            vícehodnotová kategorie, poznámka, se porovnává (průnikem) jen s nalezenými pravidly.
+
+            :param rule: Pravidlo tvaru.
+            :type rule: MARule
+            :return: True -> tvar je relevantní.
+            :rtype: bool
+            """
+
+            if self._relevanceIndex is None:
+                self._relevanceIndex = {}
+                for r in self._tagRules:
+                    self._indexTagRule(r)
+
+            ruleNotes = rule.get(MorphCategories.NOTE)
+            for categories, values in self._relevanceIndex.items():
+                try:
+                    notes = values[tuple(rule[c] for c in categories)]
+                except KeyError:
+                    # pravidlo nemá některou z kategorií, nebo se liší hodnotou
+                    continue
+
+                for n in notes:
+                    if n is None or (ruleNotes is not None and
+                                     (len(n & ruleNotes) > 0 or len(n) == len(ruleNotes) == 0)):
+                        return True
+
+            return False
+
+        def _indexTagRule(self, tagRule: MARule):
+            """
+            Přidá značko pravidlo do indexu pro kontrolu relevance tvarů (viz _isRelevant).
+
+            :param tagRule: Značko pravidlo
+            :type tagRule: MARule
+            """
+
+            categories = tuple(sorted((c for c in tagRule
+                                       if c not in self.RELEVANCE_EXCEPT_CATEGORIES and c != MorphCategories.NOTE),
+                                      key=lambda c: c.lntrf))
+            self._relevanceIndex.setdefault(categories, {}) \
+                .setdefault(tuple(tagRule[c] for c in categories), set()) \
+                .add(tagRule.get(MorphCategories.NOTE))
+
+        def releaseMorphsIndex(self):
+            """
+            Uvolní pomocné struktury pro přidávání tvarů. Volá se po dokončení skupiny, aby nezabíraly paměť.
+            Při dalším přidání tvaru budou vytvořeny znovu.
+            """
+
+            self._morphsSet = None
+            self._relevanceIndex = None
+
         def getMorphs(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None) \
                 -> Set[Tuple[MARule, str]]:
             """
@@ -608,42 +1134,74 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :rtype: Set[Tuple[MARule,str]]
             """
 
-            if valFilter is None:
-                valFilter = set()
+            return self.filterMorphs(self._word, self._morphs, *MARule.compileFilters(valFilter, notValFilter))
+
+        @staticmethod
+        def filterMorphs(word: str, morphs: Iterable[Tuple[MARule, str]], valMasks: Tuple[int, ...],
+                         notValMask: int) -> Set[Tuple[MARule, str]]:
+            """
+            Vybere tvary skupiny, které odpovídají filtrům (viz getMorphs).
+            Slouží i pro kompaktní podobu skupiny (viz CompactMAWord).
+
+            :param word: Slovo skupiny. Dle jeho počátečního písmene se upraví velikost počátečního písmene tvarů.
+            :type word: str
+            :param morphs: Tvary skupiny ve formátu dvojic (pravidlo, tvar).
+            :type morphs: Iterable[Tuple[MARule, str]]
+            :param valMasks: Filtr povolených hodnot převedený pomocí MARule.compileFilters.
+            :type valMasks: Tuple[int, ...]
+            :param notValMask: Filtr zakázaných hodnot převedený pomocí MARule.compileFilters.
+            :type notValMask: int
+            :return: Množinu dvojic (pravidlo, tvar).
+            :rtype: Set[Tuple[MARule,str]]
+            """
 
-            if notValFilter is None:
-                notValFilter = set()
+            res = set()
+            upper = word[0].isupper()
 
-            morphs = set()
-            valFilterCategories = set(f.category() for f in valFilter)
+            for r, m in morphs:
+                # zkontrolujeme zdali platí filtry
+                if r.fitsToMasks(valMasks, notValMask):
+                    # úprava velikosti počátečního písmene tvaru na základě původního slova
+                    if upper:
+                        newM = m[0].upper() + m[1:]
+                    else:
+                        newM = m[0].lower() + m[1:]
 
-            for r, m in self._morphs:
-                try:
-                    # zkontrolujeme zdali platí filtry
-                    if r.fitsToFilters(valFilter, notValFilter, valFilterCategories):
-                        # úprava velikosti počátečního písmene tvaru na základě původního slova
-                        if self._word[0].isupper():
-                            newM = m[0].upper() + m[1:]
-                        else:
-                            newM = m[0].lower() + m[1:]
+                    res.add((r, newM))
 
-                        morphs.add((r, newM))
-                except KeyError:
-                    # neobsahuje danou mluvnickou kategorii
-                    pass
+            return res
 
-            return morphs
+        _convertedTagRules = {}
+        """Již převedená značko pravidla. Značko pravidlo -> internované MARule."""
 
-        @staticmethod
-        def convTagRule(tagRule):
+        @classmethod
+        def convTagRule(cls, tagRule):
             """
             Převod značko pravidla ze str do MARule
+            Výsledek je internované pravidlo, které je pro stejné značko pravidlo vždy stejným objektem.
 
             :param tagRule: Značko pravidlo (příklad k1gFnPc1)
             :type tagRule: str
             :return: Převedené pravidlo z morfologické analýzy.
             :rtype: MARule
             """
+            try:
+                return cls._convertedTagRules[tagRule]
+            except KeyError:
+                res = MARule.intern(cls._convTagRuleDict(tagRule))
+                cls._convertedTagRules[tagRule] = res
+                return res
+
+        @staticmethod
+        def _convTagRuleDict(tagRule):
+            """
+            Převod značko pravidla ze str na mluvnické kategorie.
+
+            :param tagRule: Značko pravidlo (příklad k1gFnPc1)
+            :type tagRule: str
+            :return: Mluvnické kategorie pravidla.
+            :rtype: Dict[MorphCategories, Any]
+            """
             # Příklad převodu: k1gFnPc1;jL
             #
             #    {"k":"1","g":"F","n":"P","c":"1","note":"jL"}
@@ -688,7 +1246,7 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                 if len(tmpVals) > 0:  # Jen neprázdné.
                     res[mCategory] = frozenset(tmpVals)
 
-            return MARule(res)
+            return res
 
         def addTagRuleConv(self, tagRule: MARule):
             """
@@ -709,6 +1267,9 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                     self._flags.add(Flag.NOT_GENERAL_WORD)
 
             self._tagRules.append(tagRule)
+            self._categoryIndex = None
+            if self._relevanceIndex is not None:
+                self._indexTagRule(tagRule)
 
         def addTagRule(self, tagRule):
             """
@@ -741,35 +1302,36 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :rtype: Dict[MorphCategories, Set[MorphCategory]]
             """
 
-            if valFilter is None:
-                valFilter = set()
-            if notValFilter is None:
-                notValFilter = set()
-            values = {}
+            return self.rulesGetAll(self._tagRules, *MARule.compileFilters(valFilter, notValFilter))
 
-            valFilterCategories = set(f.category() for f in valFilter)
-            for r in self._tagRules:
-                try:
-                    # zkontrolujeme zdali platí filtry
-                    if r.fitsToFilters(valFilter, notValFilter, valFilterCategories):
-                        for morphCat, morphCatVal in r.items():
-                            try:
-                                if isinstance(r[morphCat], frozenset):
-                                    # máme množinu hodnot
-                                    values[morphCat] |= morphCatVal
-                                else:
-                                    values[morphCat].add(morphCatVal)
-                            except KeyError:
-                                # první vložení hodnoty dané kategorie
-                                if isinstance(morphCatVal, frozenset):
-                                    # máme množinu hodnot
-                                    values[morphCat] = set(morphCatVal)
-                                else:
-                                    values[morphCat] = {morphCatVal}
+        @staticmethod
+        def rulesGetAll(rules: Iterable[MARule], valMasks: Tuple[int, ...], notValMask: int) \
+                -> Dict[MorphCategories, Set[MorphCategory]]:
+            """
+            Vrácení všech možných hodnot mluvnických kategorií daných pravidel (viz getAll).
+            Slouží i pro kompaktní podobu skupiny (viz CompactMAWord).
+
+            :param rules: Značko pravidla skupiny.
+            :type rules: Iterable[MARule]
+            :param valMasks: Filtr povolených hodnot převedený pomocí MARule.compileFilters.
+            :type valMasks: Tuple[int, ...]
+            :param notValMask: Filtr zakázaných hodnot převedený pomocí MARule.compileFilters.
+            :type notValMask: int
+            :return: Hodnoty mluvnických kategorií.
+            :rtype: Dict[MorphCategories, Set[MorphCategory]]
+            """
 
-                except KeyError:
-                    # neobsahuje danou mluvnickou kategorii
-                    pass
+            values = {}
+
+            for r in rules:
+                # zkontrolujeme zdali platí filtry
+                if r.fitsToMasks(valMasks, notValMask):
+                    for morphCat, morphCatVals in r.valueSets():
+                        try:
+                            values[morphCat] |= morphCatVals
+                        except KeyError:
+                            # první vložení hodnoty dané kategorie
+                            values[morphCat] = set(morphCatVals)
 
             return values
 
@@ -790,39 +1352,92 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :param notValFilter: Stejné jako valFilter s tím rozdílem, že dané hodnoty nesmí pravidlo tvaru obsahovat.
             :type notValFilter:Set[MorphCategory]
             :return: Hodnoty dané mluvnické kategorie.
-            :rtype: Set[MorphCategory]
+            :rtype: FrozenSet[MorphCategory]
             """
 
-            if valFilter is None:
-                valFilter = set()
+            return self.categoryValues(morphCategory, *MARule.compileFilters(valFilter, notValFilter))
 
-            if notValFilter is None:
-                notValFilter = set()
+        def categoryValues(self, morphCategory: MorphCategories, valMasks: Tuple[int, ...], notValMask: int) \
+                -> FrozenSet[MorphCategory]:
+            """
+            Vrácení všech možných hodnot mluvnické kategorie pro filtry převedené na masky (viz getAllForCategory).
+            Výsledek je při prvním dotazu uložen do indexu skupiny, opakovaný dotaz už pravidla neprochází.
 
-            values = set()
-            valFilterCategories = set(f.category() for f in valFilter)
+            :param morphCategory: Mluvnická kategorie.
+            :type morphCategory: MorphCategories
+            :param valMasks: Filtr povolených hodnot převedený pomocí MARule.compileFilters.
+            :type valMasks: Tuple[int, ...]
+            :param notValMask: Filtr zakázaných hodnot převedený pomocí MARule.compileFilters.
+            :type notValMask: int
+            :return: Hodnoty dané mluvnické kategorie.
+            :rtype: FrozenSet[MorphCategory]
+            """
 
-            for r in self._tagRules:
-                try:
-                    # zkontrolujeme zdali platí filtry
-                    if r.fitsToFilters(valFilter, notValFilter, valFilterCategories):
-                        # Jednotlivé kategorie mohou obsahovat jednu hodnotu nebo množinu hodnot.
-                        if isinstance(r[morphCategory], frozenset):
-                            # máme množinu hodnot
-                            values |= r[morphCategory]
-                        else:
-                            values.add(r[morphCategory])
-                except KeyError:
-                    # neobsahuje danou mluvnickou kategorii
-                    pass
+            if self._categoryIndex is None:
+                self._categoryIndex = {}
 
-            return values
+            key = (morphCategory, valMasks, notValMask)
+            try:
+                return self._categoryIndex[key]
+            except KeyError:
+                values = frozenset(self.rulesGetAllForCategory(self._tagRules, morphCategory, valMasks, notValMask))
+                self._categoryIndex[key] = values
+                return values
 
-        def addDerivation(self, derivation, type: Optional[Tuple[str, str]]):
+        @staticmethod
+        def rulesGetAllForCategory(rules: Iterable[MARule], morphCategory: MorphCategories,
+                                   valMasks: Tuple[int, ...], notValMask: int) -> Set[MorphCategory]:
             """
-            Přidání odvozeného slova.
+            Vrácení všech možných hodnot mluvnické kategorie daných pravidel (viz getAllForCategory).
+            Slouží i pro kompaktní podobu skupiny (viz CompactMAWord).
 
-            :param derivation: Odvozené slovo.
+            :param rules: Značko pravidla skupiny.
+            :type rules: Iterable[MARule]
+            :param morphCategory: Mluvnická kategorie.
+            :type morphCategory: MorphCategories
+            :param valMasks: Filtr povolených hodnot převedený pomocí MARule.compileFilters.
+            :type valMasks: Tuple[int, ...]
+            :param notValMask: Filtr zakázaných hodnot převedený pomocí MARule.compileFilters.
+            :type notValMask: int
+            :return: Hodnoty dané mluvnické kategorie.
+            :rtype: Set[MorphCategory]
+            """
+
+            values = set()
+
+            for r in rules:
+                try:
+                    # zkontrolujeme zdali platí filtry
+                    if r.fitsToMasks(valMasks, notValMask):
+                        values |= r.valuesOf(morphCategory)
+                except KeyError:
+                    # neobsahuje danou mluvnickou kategorii
+                    pass
+
+            return values
+
+        @staticmethod
+        def rulesAnyFits(rules: Iterable[MARule], valMasks: Tuple[int, ...], notValMask: int) -> bool:
+            """
+            Zjistí zdali alespoň jedno neprázdné pravidlo projde přes filtry.
+            Odpovídá len(rulesGetAll(rules, valMasks, notValMask)) > 0, ale nesestavuje hodnoty.
+
+            :param rules: Značko pravidla skupiny.
+            :type rules: Iterable[MARule]
+            :param valMasks: Filtr povolených hodnot převedený pomocí MARule.compileFilters.
+            :type valMasks: Tuple[int, ...]
+            :param notValMask: Filtr zakázaných hodnot převedený pomocí MARule.compileFilters.
+            :type notValMask: int
+            :return: True -> alespoň jedno pravidlo projde.
+            :rtype: bool
+            """
+            return any(len(r) > 0 and r.fitsToMasks(valMasks, notValMask) for r in rules)
+
+        def addDerivation(self, derivation, type: Optional[Tuple[str, str]]):
+            """
+            Přidání odvozeného slova.
+
+            :param derivation: Odvozené slovo.
             :type derivation: str
             :param type: Typ odvození.
                 type a poznamka
@@ -846,6 +1461,43 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             """
             return self._tagRules
 
+        @property
+        def morphs(self) -> List[Tuple[MARule, str]]:
+            """
+            Všechny tvary skupiny ve formátu dvojic (pravidlo, tvar).
+            """
+            return self._morphs
+
+        @classmethod
+        def fromParts(cls, word: str, lemma: Optional[str], flags: Set[Flag], tagRules: List[MARule],
+                      morphs: List[Tuple[MARule, str]], derivations: List[Tuple[str, Optional[Tuple[str, str]]]]) \
+                -> "MorphoAnalyzerLibma.MAWordGroup":
+            """
+            Vytvoří skupinu z již zpracovaných částí (např. z kompaktní databáze slov).
+
+            :param word: Slovo pro nějž je skupina vytvořena.
+            :type word: str
+            :param lemma: Lemma slova.
+            :type lemma: Optional[str]
+            :param flags: Flagy skupiny.
+            :type flags: Set[Flag]
+            :param tagRules: Značko pravidla.
+            :type tagRules: List[MARule]
+            :param morphs: Tvary ve formátu dvojic (pravidlo, tvar).
+            :type morphs: List[Tuple[MARule, str]]
+            :param derivations: Odvozená slova ve formátu dvojic (slovo, typ odvození).
+            :type derivations: List[Tuple[str, Optional[Tuple[str, str]]]]
+            :return: Skupina.
+            :rtype: MorphoAnalyzerLibma.MAWordGroup
+            """
+            g = cls(word)
+            g.lemma = lemma
+            g._flags = flags
+            g._tagRules = tagRules
+            g._morphs = morphs
+            g._derivations = derivations
+            return g
+
         def __str__(self):
             s = "Tag rules:\n"
             for tr in self._tagRules:
@@ -870,6 +1522,20 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
 
             """
             self._groups = []
+            # Výsledky getAllForCategory: (kategorie, masky filtrů, flagy skupin) -> hodnoty kategorie
+            self._categoryIndex = {}
+
+        def __copy__(self):
+            """
+            Kopie analýzy slova. Skupiny jsou sdíleny, ale seznam skupin má kopie vlastní, takže přidání skupiny
+            do kopie (viz analyze) nemění původní analýzu ve sdílené databázi slov.
+
+            :return: Kopie analýzy.
+            :rtype: MorphoAnalyzerLibma.MAWord
+            """
+            c = self.__class__()
+            c._groups = list(self._groups)
+            return c
 
         def addGroup(self, group):
             """
@@ -879,6 +1545,7 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :type group: MorphoAnalyzerLibma.MAWordGroup
             """
             self._groups.append(group)
+            self._categoryIndex.clear()
 
         def delGroup(self, group):
             """
@@ -889,6 +1556,12 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             """
 
             self._groups.remove(group)
+            self._categoryIndex.clear()
+
+        def _morphsCacheVersion(self):
+            # Skupiny se pouze přidávají (mazání jen během načítání výstupu ma, před jakýmkoliv dotazem),
+            # proto je verzí jejich počet.
+            return len(self._groups)
 
         def getAll(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None,
                    groupFlags: Set[Flag] = None) -> Dict[MorphCategories, Set[MorphCategory]]:
@@ -910,19 +1583,17 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :return: Hodnoty mluvnických kategorií.
             :rtype: Dict[MorphCategories, Set[MorphCategory]]
             """
-            if valFilter is None:
-                valFilter = set()
-            if notValFilter is None:
-                notValFilter = set()
             if groupFlags is None:
                 groupFlags = set()
             values = {}
+            masks = MARule.compileFilters(valFilter, notValFilter)
 
             for g in self._groups:
                 if len(g.flags & groupFlags) == len(groupFlags):
                     # má všechny flagy
 
-                    for morphCat, morphCatValues in g.getAll(valFilter, notValFilter).items():
+                    for morphCat, morphCatValues in MorphoAnalyzerLibma.MAWordGroup.rulesGetAll(g.rules,
+                                                                                               *masks).items():
                         try:
                             values[morphCat] = values[morphCat] | morphCatValues
                         except KeyError:
@@ -952,22 +1623,26 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :param groupFlags: Flagy, které musí mít daná skupina vázající se na slovo.
             :type groupFlags: Set[Flag]
             :return: Hodnoty dané mluvnické kategorie.
-            :rtype: Set[MorphCategory]
+            :rtype: FrozenSet[MorphCategory]
             """
 
-            if valFilter is None:
-                valFilter = set()
-            if notValFilter is None:
-                notValFilter = set()
-            if groupFlags is None:
-                groupFlags = set()
-            values = set()
+            groupFlags = frozenset(groupFlags) if groupFlags else frozenset()
+            masks = MARule.compileFilters(valFilter, notValFilter)
+            key = (morphCategory, masks, groupFlags)
+
+            try:
+                return self._categoryIndex[key]
+            except KeyError:
+                pass
 
+            values = set()
             for g in self._groups:
                 if len(g.flags & groupFlags) == len(groupFlags):
                     # má všechny flagy
-                    values |= g.getAllForCategory(morphCategory, valFilter, notValFilter)
+                    values |= g.categoryValues(morphCategory, *masks)
 
+            values = frozenset(values)
+            self._categoryIndex[key] = values
             return values
 
         def getMorphs(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None,
@@ -996,22 +1671,18 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             :return: Množinu dvojic (pravidlo, tvar).
             :rtype: Set[Tuple[MARule,str]]
             """
-            if valFilter is None:
-                valFilter = set()
-            if notValFilter is None:
-                notValFilter = set()
-            if wordFilter is None:
-                wordFilter = set()
             if groupFlags is None:
                 groupFlags = set()
             morphs = set()
+            masks = MARule.compileFilters(valFilter, notValFilter)
+            wordMasks = MARule.compileFilters(wordFilter)
 
             for g in self._groups:
 
                 if len(g.flags & groupFlags) == len(groupFlags):
                     # má všechny flagy
-                    if len(g.getAll(wordFilter)):
-                        morphs |= g.getMorphs(valFilter, notValFilter)
+                    if MorphoAnalyzerLibma.MAWordGroup.rulesAnyFits(g.rules, *wordMasks):
+                        morphs |= MorphoAnalyzerLibma.MAWordGroup.filterMorphs(g.word, g.morphs, *masks)
 
             return morphs
 
@@ -1042,13 +1713,419 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             s += "----------"
             return s
 
-    def prepareNameDependentAnalysis(self, names):
+    class CompactMAWord(MorphoAnalyze):
+        """
+        Analýza slova uložená v kompaktní databázi slov (viz WordDatabase).
+
+        Data skupin jsou čtena přímo z polí segmentu, objekty skupin (MAWordGroup) vznikají jen na vyžádání
+        (viz groups). Analýza je pouze pro čtení, pro změny slouží WordDatabase.mutable.
+        """
+
+        __slots__ = ("_segment", "_index")
+
+        def __init__(self, segment: ColumnarSegment, index: int):
+            """
+            Vytvoření analýzy slova ze segmentu.
+
+            :param segment: Segment kompaktní databáze slov.
+            :type segment: ColumnarSegment
+            :param index: Index slova v segmentu.
+            :type index: int
+            """
+            self._segment = segment
+            self._index = index
+
+        def __eq__(self, other):
+            return isinstance(other, self.__class__) and self._segment is other._segment \
+                and self._index == other._index
+
+        def __hash__(self):
+            return hash((id(self._segment), self._index))
+
+        def _groupIndices(self) -> range:
+            """
+            Indexy skupin slova v segmentu.
+
+            :rtype: range
+            """
+            groupStart = self._segment.column("wordGroupStart")
+            return range(groupStart[self._index], groupStart[self._index + 1])
+
+        def _hasFlags(self, group: int, groupFlags: Optional[Set[Flag]]) -> bool:
+            """
+            Zjistí zdali má skupina všechny dané flagy.
+
+            :param group: Index skupiny v segmentu.
+            :type group: int
+            :param groupFlags: Požadované flagy.
+            :type groupFlags: Optional[Set[Flag]]
+            :return: True -> má všechny flagy.
+            :rtype: bool
+            """
+            if not groupFlags:
+                return True
+            mask = MorphoAnalyzerLibma.WordDatabase.flagsMask(groupFlags)
+            return self._segment.column("groupFlags")[group] & mask == mask
+
+        def _groupRules(self, group: int) -> List[MARule]:
+            """
+            Značko pravidla skupiny.
+
+            :param group: Index skupiny v segmentu.
+            :type group: int
+            :rtype: List[MARule]
+            """
+            rules = self._segment.meta["rules"]
+            ruleStart = self._segment.column("groupRuleStart")
+            return [rules[r] for r in self._segment.column("tagRules")[ruleStart[group]:ruleStart[group + 1]]]
+
+        def _groupMorphs(self, group: int) -> List[Tuple[MARule, str]]:
+            """
+            Tvary skupiny.
+
+            :param group: Index skupiny v segmentu.
+            :type group: int
+            :return: Dvojice (pravidlo, tvar).
+            :rtype: List[Tuple[MARule, str]]
+            """
+            rules = self._segment.meta["rules"]
+            morphStart = self._segment.column("groupMorphStart")
+            morphRules = self._segment.column("morphRules")
+            morphForms = self._segment.column("morphForms")
+            return [(rules[morphRules[i]], self._segment.string(morphForms[i]))
+                    for i in range(morphStart[group], morphStart[group + 1])]
+
+        def _groupDerivations(self, group: int) -> List[Tuple[str, Optional[Tuple[str, Optional[str]]]]]:
+            """
+            Odvozená slova skupiny.
+
+            :param group: Index skupiny v segmentu.
+            :type group: int
+            :return: Dvojice (odvozené slovo, typ odvození).
+            :rtype: List[Tuple[str, Optional[Tuple[str, Optional[str]]]]]
+            """
+            derivStart = self._segment.column("groupDerivStart")
+            derivWords = self._segment.column("derivWords")
+            derivTypes = self._segment.column("derivTypes")
+            derivNotes = self._segment.column("derivNotes")
+
+            derivations = []
+            for i in range(derivStart[group], derivStart[group + 1]):
+                t = None
+                if derivTypes[i] >= 0:
+                    t = (self._segment.string(derivTypes[i]),
+                         None if derivNotes[i] < 0 else self._segment.string(derivNotes[i]))
+                derivations.append((self._segment.string(derivWords[i]), t))
+            return derivations
+
+        def getAll(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None,
+                   groupFlags: Set[Flag] = None) -> Dict[MorphCategories, Set[MorphCategory]]:
+            """
+            Viz MAWord.getAll
+            """
+            values = {}
+            masks = MARule.compileFilters(valFilter, notValFilter)
+
+            for g in self._groupIndices():
+                if self._hasFlags(g, groupFlags):
+                    for morphCat, morphCatValues in MorphoAnalyzerLibma.MAWordGroup.rulesGetAll(
+                            self._groupRules(g), *masks).items():
+                        try:
+                            values[morphCat] = values[morphCat] | morphCatValues
+                        except KeyError:
+                            # první vložení hodnoty dané kategorie
+                            values[morphCat] = morphCatValues
+
+            return values
+
+        def getAllForCategory(self, morphCategory: MorphCategories, valFilter: Set[MorphCategory] = None,
+                              notValFilter: Set[MorphCategory] = None, groupFlags: Set[Flag] = None) \
+                -> Set[MorphCategory]:
+            """
+            Viz MAWord.getAllForCategory
+            """
+            values = set()
+            masks = MARule.compileFilters(valFilter, notValFilter)
+
+            for g in self._groupIndices():
+                if self._hasFlags(g, groupFlags):
+                    values |= MorphoAnalyzerLibma.MAWordGroup.rulesGetAllForCategory(self._groupRules(g),
+                                                                                    morphCategory, *masks)
+
+            return values
+
+        def getMorphs(self, valFilter: Set[MorphCategory] = None, notValFilter: Set[MorphCategory] = None,
+                      wordFilter: Set[MorphCategory] = None, groupFlags: Set[Flag] = None) -> Set[Tuple[MARule, str]]:
+            """
+            Viz MAWord.getMorphs
+            """
+            morphs = set()
+            masks = MARule.compileFilters(valFilter, notValFilter)
+            wordMasks = MARule.compileFilters(wordFilter)
+
+            for g in self._groupIndices():
+                if self._hasFlags(g, groupFlags) and \
+                        MorphoAnalyzerLibma.MAWordGroup.rulesAnyFits(self._groupRules(g), *wordMasks):
+                    morphs |= MorphoAnalyzerLibma.MAWordGroup.filterMorphs(
+                        self._segment.string(self._segment.column("groupWord")[g]), self._groupMorphs(g), *masks)
+
+            return morphs
+
+        @property
+        def groups(self):
+            """
+            Skupiny z morfologické analýzy. Jsou vytvářeny při každém přístupu.
+
+            :rtype: List(MAWordGroup)
+            """
+            groupWord = self._segment.column("groupWord")
+            groupLemma = self._segment.column("groupLemma")
+            groupFlags = self._segment.column("groupFlags")
+
+            groups = []
+            for g in self._groupIndices():
+                groups.append(MorphoAnalyzerLibma.MAWordGroup.fromParts(
+                    self._segment.string(groupWord[g]),
+                    None if groupLemma[g] < 0 else self._segment.string(groupLemma[g]),
+                    {f for f, bit in MorphoAnalyzerLibma.WordDatabase.FLAG_BITS.items() if groupFlags[g] & bit},
+                    self._groupRules(g),
+                    self._groupMorphs(g),
+                    self._groupDerivations(g)
+                ))
+            return groups
+
+        @property
+        def derivations(self) -> List[str]:
+            """
+            Odvozená slova.
+            """
+            res = []
+            for g in self._groupIndices():
+                res.extend(self._groupDerivations(g))
+            return res
+
+        def __str__(self):
+            s = ""
+            for g in self.groups:
+                s += str(g)
+            s += "----------"
+            return s
+
+    class WordDatabase(object):
+        """
+        Databáze analýz slov (slovo -> analýza slova).
+
+        Nové a měněné analýzy jsou uloženy v běžném slovníku jako MAWord. Je-li zapnuto kompaktní uložení,
+        tak je metoda compact přesune do neměnného segmentu (ColumnarSegment) v dočasném souboru namapovaném
+        do paměti, odkud jsou čteny pomocí CompactMAWord. Tím se výrazně sníží počet python objektů v paměti
+        a pracovní procesy (fork) segmenty sdílí bez kopírování.
+
+        Segmentů může být více, novější mají přednost. Aby jich nebylo příliš, jsou při compact slučovány
+        menší starší segmenty s novým (počet segmentů tak roste nanejvýš logaritmicky).
+        """
+
+        FLAG_BITS = {f: 1 << i for i, f in enumerate(Flag)}
+        """Bit pro každý flag skupiny v kompaktním uložení."""
+
+        ANALYSIS_CACHES = [MorphoAnalyze.MORPHS_CACHE]
+        """Cache, jejichž klíče obsahují analýzy slov z databáze (CompactMAWord). Po sloučení segmentů by jejich
+        záznamy již nebyly nalezeny a držely by sloučené segmenty v paměti, proto jsou při něm vyprázdněny."""
+
+        def __init__(self, compact: bool = False, directory: Optional[str] = None):
+            """
+            Vytvoření prázdné databáze.
+
+            :param compact: True -> analýzy jsou při zavolání compact přesunuty do kompaktního uložení.
+            :type compact: bool
+            :param directory: Složka pro dočasné soubory se segmenty. None -> výchozí složka systému.
+            :type directory: Optional[str]
+            """
+            self._compact = compact
+            self._directory = directory
+            self._words = {}
+            self._segments = []
+            self._size = 0
+
+        @classmethod
+        def flagsMask(cls, flags: Iterable[Flag]) -> int:
+            """
+            Převede flagy na bitovou masku.
+
+            :param flags: Flagy.
+            :type flags: Iterable[Flag]
+            :return: Bitová maska flagů.
+            :rtype: int
+            """
+            mask = 0
+            for f in flags:
+                mask |= cls.FLAG_BITS[f]
+            return mask
+
+        def __getitem__(self, word: str) -> MorphoAnalyze:
+            """
+            Analýza slova. Pokud je v kompaktním uložení, tak je pouze pro čtení.
+
+            :param word: Slovo.
+            :type word: str
+            :return: Analýza slova.
+            :rtype: MorphoAnalyze
+            :raise KeyError: Slovo není v databázi.
+            """
+            try:
+                return self._words[word]
+            except KeyError:
+                pass
+
+            for segment in reversed(self._segments):
+                i = segment.find(word)
+                if i is not None:
+                    return MorphoAnalyzerLibma.CompactMAWord(segment, i)
+
+            raise KeyError(word)
+
+        def __setitem__(self, word: str, analysis: "MorphoAnalyzerLibma.MAWord"):
+            if word not in self:
+                self._size += 1
+            self._words[word] = analysis
+
+        def __contains__(self, word: str):
+            return word in self._words or any(s.find(word) is not None for s in self._segments)
+
+        def __len__(self):
+            return self._size
+
+        def mutable(self, word: str) -> "MorphoAnalyzerLibma.MAWord":
+            """
+            Analýza slova, kterou lze měnit. Analýza z kompaktního uložení je převedena zpět na MAWord
+            (až do dalšího compact).
+
+            :param word: Slovo.
+            :type word: str
+            :return: Analýza slova.
+            :rtype: MorphoAnalyzerLibma.MAWord
+            :raise KeyError: Slovo není v databázi.
+            """
+            try:
+                return self._words[word]
+            except KeyError:
+                pass
+
+            analysis = MorphoAnalyzerLibma.MAWord()
+            for g in self[word].groups:
+                analysis.addGroup(g)
+            self._words[word] = analysis
+            return analysis
+
+        def compact(self):
+            """
+            Přesune analýzy z běžného slovníku do kompaktního uložení. Pokud není kompaktní uložení zapnuto,
+            nedělá nic.
+            Sloučené segmenty jsou zavřeny a cache závislé na analýzách (viz ANALYSIS_CACHES) vyprázdněny. Analýzy
+            získané před voláním již tedy nelze číst.
+            """
+            if not self._compact or len(self._words) == 0:
+                return
+
+            analyses = self._words
+            merged = []
+            while len(self._segments) > 0 and self._segments[-1].keysCnt <= len(analyses):
+                # sloučíme s menším starším segmentem
+                segment = self._segments.pop()
+                merged.append(segment)
+                for i in range(segment.keysCnt):
+                    w = segment.string(i)
+                    if w not in analyses:
+                        analyses[w] = MorphoAnalyzerLibma.CompactMAWord(segment, i)
+
+            self._segments.append(self._createSegment(analyses))
+            self._words = {}
+
+            if len(merged) > 0:
+                for cache in self.ANALYSIS_CACHES:
+                    cache.clear()
+                for segment in merged:
+                    segment.close()
+
+        def _createSegment(self, analyses: Dict[str, MorphoAnalyze]) -> ColumnarSegment:
+            """
+            Vytvoří segment z analýz slov.
+
+            :param analyses: Analýzy slov (musí mít groups).
+            :type analyses: Dict[str, MorphoAnalyze]
+            :return: Segment namapovaný do paměti.
+            :rtype: ColumnarSegment
+            """
+
+            words = sorted(analyses)
+            strings = list(words)
+            stringIds = {w: i for i, w in enumerate(words)}
+
+            def stringId(s: str) -> int:
+                try:
+                    return stringIds[s]
+                except KeyError:
+                    stringIds[s] = len(strings)
+                    strings.append(s)
+                    return stringIds[s]
+
+            rules = []
+            ruleIds = {}
+
+            def ruleId(r: MARule) -> int:
+                try:
+                    return ruleIds[r]
+                except KeyError:
+                    ruleIds[r] = len(rules)
+                    rules.append(r)
+                    return ruleIds[r]
+
+            columns = {name: array(typecode) for name, typecode in [
+                ("wordGroupStart", "q"), ("groupWord", "i"), ("groupLemma", "i"), ("groupFlags", "q"),
+                ("groupRuleStart", "q"), ("groupMorphStart", "q"), ("groupDerivStart", "q"),
+                ("tagRules", "i"), ("morphRules", "i"), ("morphForms", "i"),
+                ("derivWords", "i"), ("derivTypes", "i"), ("derivNotes", "i")
+            ]}
+
+            for w in words:
+                columns["wordGroupStart"].append(len(columns["groupWord"]))
+                for g in analyses[w].groups:
+                    columns["groupWord"].append(stringId(g.word))
+                    columns["groupLemma"].append(-1 if g.lemma is None else stringId(g.lemma))
+                    columns["groupFlags"].append(self.flagsMask(g.flags))
+
+                    columns["groupRuleStart"].append(len(columns["tagRules"]))
+                    columns["tagRules"].extend(ruleId(r) for r in g.rules)
+
+                    columns["groupMorphStart"].append(len(columns["morphRules"]))
+                    for r, m in g.morphs:
+                        columns["morphRules"].append(ruleId(r))
+                        columns["morphForms"].append(stringId(m))
+
+                    columns["groupDerivStart"].append(len(columns["derivWords"]))
+                    for d, t in g.getDerivations():
+                        columns["derivWords"].append(stringId(d))
+                        columns["derivTypes"].append(-1 if t is None else stringId(t[0]))
+                        columns["derivNotes"].append(-1 if t is None or t[1] is None else stringId(t[1]))
+
+            # zarážky
+            columns["wordGroupStart"].append(len(columns["groupWord"]))
+            columns["groupRuleStart"].append(len(columns["tagRules"]))
+            columns["groupMorphStart"].append(len(columns["morphRules"]))
+            columns["groupDerivStart"].append(len(columns["derivWords"]))
+
+            f = tempfile.TemporaryFile(dir=self._directory)
+            ColumnarSegment.write(f, strings, len(words), columns, {"rules": rules})
+            return ColumnarSegment(f)
+
+    def prepareNameDependentAnalysis(self, names, incremental: bool = False):
         """
         Přípraví analýzou závislou na jménu.
 
         :param names: Předpokládáme, že jsou jména seřazena vzestupně.
         :type names: List[Name]
-
+        :param incremental: True -> jména jsou přidána k již dříve připraveným (zpracování vstupu po dávkách).
+            Třídy ekvivalence tak mohou obsahovat jména z různých dávek.
+        :type incremental: bool
         """
 
         """
@@ -1062,25 +2139,52 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
         """
 
         # Tvoříme vlastně rozklad na třídy ekvivalence, dle relace ekvivalence definované výše uvedenou korespondencí.
-        self._prepAbberEqClasses = {}
+        if not incremental:
+            self._prepAbberEqClassesAll = {}
+            self._prepAbberEqClasses = {}
+
         for n in names:
             if len(n) > 2:
+                eqR = EQRelationForPrepAndItsAbbre(n)
                 try:
-                    self._prepAbberEqClasses[EQRelationForPrepAndItsAbbre(n)].add(n)
+                    eqClass = self._prepAbberEqClassesAll[eqR]
+                    eqClass.add(n)
                 except KeyError:
-                    self._prepAbberEqClasses[EQRelationForPrepAndItsAbbre(n)] = {n}
+                    eqClass = {n}
+                    self._prepAbberEqClassesAll[eqR] = eqClass
 
-        # odfiltrujeme všechny třídy s méně jak 2 položkami
-        self._prepAbberEqClasses = {eqR: names for eqR, names in self._prepAbberEqClasses.items() if len(names) > 1}
+                if len(eqClass) > 1:
+                    # zajímají nás jen třídy s alespoň 2 položkami
+                    self._prepAbberEqClasses[eqR] = eqClass
 
-    def __init__(self, pathToMa, words, hint=None):
+        if not incremental:
+            # jednoprvkové třídy již nebudeme potřebovat
+            self._prepAbberEqClassesAll = {}
+
+    SHARED_STATE_LOCK = SharedStateLock()
+    """Zámek sdíleného stavu při paralelní analýze více jazyků (viz SharedStateLock)."""
+
+    MIN_SHARD_WORDS = 100
+    """Minimální počet slov v jedné části při rozdělení slov mezi více procesů ma."""
+
+    PREPOSITIONS = frozenset(w for prep in ["dalla", "de", "der", "da", "del", "di", "dos", "el", "la", "le", "van",
+                                            "von", "und", "ben", "bin", "y", "zu"]
+                             for w in [prep, prep.capitalize()])
+    """Slova, ke kterým je přidána analýza, že se jedná o předložky, za nimiž se slova ohýbají. Obsahuje i variantu
+    s velkým písmenem na začátku."""
+
+    def __init__(self, pathToMa, words, hint=None, persistent: bool = False, stallTimeout: Optional[float] = None,
+                 cache: Optional[MACache] = None, cacheLang: str = "", compactDatabase: bool = False,
+                 databaseDirectory: Optional[str] = None, lazy: bool = False, lazyBatchSize: int = 1000,
+                 profile: MAProfile = MAProfile.FULL, shards: int = 1, maxBatchBytes: Optional[int] = None):
         """
         Provede vytvoření objektu Morfologického analyzátoru.
         Spustí nad všemy slovy z words morfologický analyzátor s parametry:
             -F vrací všechny možné tvary.
             -m Na výstup se vypíše flektivní analýza zadaného slova.
             -n Přidá poznámku.
-            -D Odvozená slova. (jsou automaticky přidána)
+            -D Odvozená slova. Pouze pokud to určuje profil (viz profile), který také vybírá druhy odvozených
+                slov, jež jsou automaticky přidána.
         Výsledek si poté načte a bude sloužit jako databáze, která bude použita pro získávání informací
         o slovech.
 
@@ -1094,35 +2198,232 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             Pokud je předán set, platí nápověda pro všechny slova stejná. Pokud je předán Dict, tak pro každé slovo je jiná (klíč udává slovo pro nějž nápověda platí).
             Pozor pokud se daná morfologická kategorie vůbec v analýze slova nevyskytuj, pak je nápověda ignorována.
         :type hint: :Set[MorphCategory] | Dict[MorphCategory]
+        :param persistent: True -> ma běží jako jeden dlouhodobý proces (viz MAProcess), kterému jsou slova
+            předávána postupně. Jinak je pro každou dávku slov spuštěn nový proces.
+        :type persistent: bool
+        :param stallTimeout: Viz MAProcess. Použije se pouze pokud persistent=True.
+        :type stallTimeout: Optional[float]
+        :param cache: Perzistentní cache analýz slov. Analyzátoru jsou předložena pouze slova, která v ní nejsou.
+            Při použití nápovědy (hint) se cache nepoužívá.
+        :type cache: Optional[MACache]
+        :param cacheLang: Kód jazyka, pod kterým jsou analýzy v cache uloženy.
+        :type cacheLang: str
+        :param compactDatabase: True -> databáze slov je po každém přidání slov převedena do kompaktní podoby
+            namapované do paměti (viz WordDatabase).
+        :type compactDatabase: bool
+        :param databaseDirectory: Složka pro dočasné soubory kompaktní databáze slov. None -> výchozí složka systému.
+        :type databaseDirectory: Optional[str]
+        :param lazy: True -> slova nejsou analyzována hned, ale až při prvním dotazu na některé z nich (analyze).
+            Analyzátoru je pak předloženo dotazované slovo spolu s dalšími dosud neanalyzovanými slovy v pořadí,
+            v jakém byla předána (až lazyBatchSize slov), aby byla slova ma předávána ve větších dávkách.
+            Slova, na která se nikdo nedotáže, tak nejsou analyzována vůbec.
+        :type lazy: bool
+        :param lazyBatchSize: Maximální počet slov v jedné dávce při lazy analýze.
+        :type lazyBatchSize: int
+        :param profile: Profil analýzy určující parametry ma a analyzovaná odvozená slova.
+        :type profile: MAProfile
+        :param shards: Počet procesů ma, mezi které jsou rozdělena slova jedné dávky. Procesy běží souběžně
+            a jejich výsledky jsou sloučeny do jedné databáze slov. Dávky menší než shards * MIN_SHARD_WORDS
+            slov jsou poslány jedinému procesu.
+        :type shards: int
+        :param maxBatchBytes: Maximální velikost vstupu ma (v bajtech) pro jednu dávku. Větší množství slov je
+            posláno po více dávkách. None -> neomezeně
+        :type maxBatchBytes: Optional[int]
         :raise MorphoAnalyzerException: Chyba analyzátoru.
         """
         self._hint = hint
         # vytvoříme novou prázdnou databázi slov
-        self._wordDatabase = {}
-
-        self._pathToMa = pathToMa
-
-        # získání informací o slovech
-        words = list(words)
-        self.__commWithMA(words)
-
-        # přidejme slova odvozená
-        derivated = set()
-        for w in self._wordDatabase.values():
-            for g in w.groups:
-                for d, _ in g.getDerivations():
-                    if d not in self._wordDatabase:
-                        derivated.add(d)
-        derivated = list(derivated)
-
-        self.__commWithMA(derivated)
-        words.extend(derivated)
+        self._wordDatabase = self.WordDatabase(compactDatabase, databaseDirectory)
+        # slova, která již byla předložena analyzátoru (i ta, která ma nezná)
+        self._sentWords = set()
 
         # Rozklad na třídy ekvivalence.
         # Ve formě dict.
         # Ekvivalence je typu: Bernstadt auf dem Eigen <->  Bernstadt a. d. Eigen
         # Tedy je ekvivalentní ke svým zkraceným formám.
         self._prepAbberEqClasses = {}
+        # všechny dosud viděné třídy (i jednoprvkové), používá se při postupné přípravě analýzy závislé na jménu
+        self._prepAbberEqClassesAll = {}
+
+        self._pathToMa = pathToMa
+        self._profile = profile
+        self._shards = shards
+        self._maxBatchBytes = maxBatchBytes
+        # počet slov, která byla kvůli chybějící odpovědi poslána ma znovu, a slov, u kterých se odpověď
+        # nepodařilo získat ani tak
+        self.retriedWords = 0
+        self.lostWords = 0
+        self._maProcesses = [MAProcess([pathToMa] + profile.maArgs, stallTimeout) for _ in range(shards)] \
+            if persistent else None
+        self._cache = cache if hint is None else None
+        self._cacheLang = cacheLang
+        self._cacheFingerprint = MACache.fingerprint(pathToMa, profile.maArgs) if self._cache is not None else None
+
+        self._lazy = lazy
+        self._lazyBatchSize = lazyBatchSize
+        # slova čekající na analýzu při lazy analýze (použito jako uspořádaná množina)
+        self._pendingWords = collections.OrderedDict()
+        # odvozená slova zařazená mezi čekající při lazy analýze
+        self._pendingDerivated = set()
+        # předložky, kterým již byla přidána analýza (viz _addPrepositions)
+        self._prepositionsAdded = set()
+
+        if self._lazy:
+            self._addPending(words)
+            # Předložkám, které čekají na analýzu, je analýza přidána až po ní, stejně jako bez lazy analýzy.
+            self._addPrepositions(w for w in self.PREPOSITIONS if w not in self._pendingWords)
+        else:
+            self._addWords(words)
+            self._addPrepositions(self.PREPOSITIONS)
+
+        self._wordDatabase.compact()
+
+    def _addPrepositions(self, words: Iterable[str]):
+        """
+        Přidá ke slovům (von, da, de...) analýzu, že se jedná o předložky za nimiž se slova ohýbají.
+        Každé předložce je analýza přidána pouze jednou.
+
+        :param words: Předložky z PREPOSITIONS.
+        :type words: Iterable[str]
+        """
+
+        for w in sorted(words):
+            if w in self._prepositionsAdded:
+                continue
+            self._prepositionsAdded.add(w)
+
+            g = self.MAWordGroup(w)
+            g.lemma = w
+
+            g.addTagRule(POS.PREPOSITION_M.lntrf)
+            g.addMorph(POS.PREPOSITION_M.lntrf, w)
+            try:
+                self._wordDatabase.mutable(w).addGroup(g)
+            except KeyError:
+                # slovo zatím není v databázi
+                self._wordDatabase[w] = self.MAWord()
+                self._wordDatabase[w].addGroup(g)
+
+    def _addPending(self, words: Iterable[str]):
+        """
+        Zařadí slova, která ještě nebyla předložena analyzátoru, mezi slova čekající na lazy analýzu.
+
+        :param words: Slova pro analýzu.
+        :type words: Iterable[str]
+        """
+
+        for w in words:
+            if w not in self._sentWords:
+                self._pendingWords[w] = None
+
+    def _ensureAnalyzed(self, word: str):
+        """
+        Pokud slovo čeká na lazy analýzu, tak provede analýzu dávky čekajících slov, ve které je i toto slovo.
+
+        :param word: Slovo, které má být analyzováno.
+        :type word: str
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        if word not in self._pendingWords:
+            return
+
+        del self._pendingWords[word]
+        batch = [word]
+        while len(self._pendingWords) > 0 and len(batch) < self._lazyBatchSize:
+            batch.append(self._pendingWords.popitem(last=False)[0])
+
+        self._analyzeBatch(batch)
+
+    def _analyzeBatch(self, words: List[str]):
+        """
+        Analyzuje dávku čekajících slov při lazy analýze.
+
+        :param words: Slova pro analýzu.
+        :type words: List[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        self._addWords(words)
+        self._addPrepositions(w for w in words if w in self.PREPOSITIONS)
+        self._wordDatabase.compact()
+
+    def analyzePending(self):
+        """
+        Analyzuje všechna slova čekající na lazy analýzu.
+        Používá se před rozdělením práce mezi více procesů, které by jinak komunikovaly se stejným procesem ma.
+
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        while len(self._pendingWords) > 0:
+            batch = []
+            while len(self._pendingWords) > 0 and len(batch) < self._lazyBatchSize:
+                batch.append(self._pendingWords.popitem(last=False)[0])
+            self._analyzeBatch(batch)
+
+    def addWords(self, words):
+        """
+        Rozšíří databázi o analýzu daných slov. Analyzátoru jsou předložena pouze slova, která mu ještě
+        předložena nebyla, takže lze databázi postupně rozšiřovat (např. při zpracování vstupu po dávkách).
+
+        :param words: Slova pro analýzu.
+        :type words: Iterable[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        if self._lazy:
+            self._addPending(words)
+            return
+
+        self._addWords(words)
+        self._wordDatabase.compact()
+
+    def _addWords(self, words):
+        """
+        Rozšíří databázi o analýzu daných slov (viz addWords), ale nepřevádí ji do kompaktní podoby.
+
+        :param words: Slova pro analýzu.
+        :type words: Iterable[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        # získání informací o slovech
+        words = [w for w in words if w not in self._sentWords]
+        self._sentWords.update(words)
+        if len(words) > 0:
+            self.__analyzeWords(words)
+
+        if self._profile.derivations:
+            # přidejme slova odvozená
+            derivated = set()
+            for w in words:
+                if w in self._pendingDerivated:
+                    # slovo samo bylo odvozeno, od odvozených slov další slova neodvozujeme
+                    continue
+                try:
+                    groups = self._wordDatabase[w].groups
+                except KeyError:
+                    # slovo ma nezná
+                    continue
+                for g in groups:
+                    for d, t in g.getDerivations():
+                        if d not in self._wordDatabase and d not in self._sentWords and \
+                                self._profile.allowsDerivation(t):
+                            derivated.add(d)
+            derivated = list(derivated)
+
+            if self._lazy:
+                # odvozená slova budou analyzována, až budou potřeba
+                # Slova, která již čekají na analýzu jako vstupní, mezi odvozená nezařazujeme, aby od nich byla
+                # také odvozována slova.
+                self._pendingDerivated.update(d for d in derivated if d not in self._pendingWords)
+                self._addPending(derivated)
+            else:
+                self._sentWords.update(derivated)
+                if len(derivated) > 0:
+                    self.__analyzeWords(derivated)
+                words.extend(derivated)
 
         for w in words:
             if len(w) >= 2 and w.isupper() or len(w) == 2 and w[-1] == ".":
@@ -1135,7 +2436,7 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                 g.addTagRule(POS.ABBREVIATION.lntrf)
                 g.addMorph(POS.ABBREVIATION.lntrf, w)
                 try:
-                    wordAnalyze = self._wordDatabase[w]
+                    wordAnalyze = self._wordDatabase.mutable(w)
                     if POS.ABBREVIATION not in wordAnalyze.getAllForCategory(MorphCategories.POS):
                         # Zatím není možnou zkratkou, tak přidáme.
                         wordAnalyze.addGroup(g)
@@ -1144,39 +2445,27 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                     self._wordDatabase[w] = self.MAWord()
                     self._wordDatabase[w].addGroup(g)
 
-        # přidáme ke slovům von, da a de
-        # analýzu, že se jedná o předložky za nimiž se slova ohýbají
-        for prep in ["dalla", "de", "der", "da", "del", "di", "dos", "el", "la", "le", "van", "von", "und", "ben",
-                     "bin", "y", "zu"]:
-            for w in [prep, prep.capitalize()]:  # generujeme variantu s velkým a malým písmenem na začátku
-                g = self.MAWordGroup(w)
-                g.lemma = w
-
-                g.addTagRule(POS.PREPOSITION_M.lntrf)
-                g.addMorph(POS.PREPOSITION_M.lntrf, w)
-                try:
-                    self._wordDatabase[w].addGroup(g)
-                except KeyError:
-                    # slovo zatím není v databázi
-                    self._wordDatabase[w] = self.MAWord()
-                    self._wordDatabase[w].addGroup(g)
+        words = set(words)
 
         # pro nás je a pouze spojka
-        try:
-            ma = self._wordDatabase["a"]
+        if "a" in words:
+            try:
+                ma = self._wordDatabase.mutable("a")
 
-            delGroups = [group for group in ma.groups if group.rules[0][MorphCategories.POS] != POS.CONJUNCTION]
+                delGroups = [group for group in ma.groups if group.rules[0][MorphCategories.POS] != POS.CONJUNCTION]
 
-            for g in delGroups:
-                ma.delGroup(g)
+                for g in delGroups:
+                    ma.delGroup(g)
 
-        except KeyError:
-            pass
+            except KeyError:
+                pass
 
         # vynecháváme, protože v našem případě nemůžou být písmena podstatným jménem
         for c in string.ascii_letters:
+            if c not in words:
+                continue
             try:
-                ma = self._wordDatabase[c]
+                ma = self._wordDatabase.mutable(c)
 
                 for group in ma.groups:
                     if Note.CHARACTER_AS_NOUN in group.rules[0][MorphCategories.NOTE]:
@@ -1185,64 +2474,331 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             except KeyError:
                 pass
 
+    def __analyzeWords(self, words):
+        """
+        Získá analýzu slov z cache a ta, která v ní nejsou, pošle ma.
+
+        :param words: Slova pro analýzu
+        :type words:List[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        if self._cache is not None:
+            cached = self._cache.get(self._cacheLang, self._cacheFingerprint, words)
+            for w, wordAnalyze in cached.items():
+                if wordAnalyze is None:
+                    # ma slovo nezná
+                    continue
+                try:
+                    for g in wordAnalyze.groups:
+                        self._wordDatabase.mutable(w).addGroup(g)
+                except KeyError:
+                    self._wordDatabase[w] = wordAnalyze
+
+            words = [w for w in words if w not in cached]
+
+        if len(words) > 0:
+            self.__commWithMA(words)
+
     def __commWithMA(self, words):
         """
         Pošle ma slova, která mají být analyzována.
+        Slova jsou posílána po dávkách omezených velikostí vstupu (viz maxBatchBytes). Slova, pro která se
+        nepodařilo získat odpověď, jsou poslána znovu, každé samostatně, a pokud ani tak odpověď nemají, jsou vynechána.
+        Jakmile ma skončí chybou na samostatně poslaném slově, tak jsou zbylá slova poslána znovu již jen jednou
+        společně, aby nebylo ma spouštěno pro každé z nich.
+
+        :param words: Slova pro analýzu
+        :type words:List[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru (např. ma nelze spustit, nebo neodpovídá). Také pokud ma
+            neodpoví na žádné slovo víceslovné dávky a skončí chybou i na samostatně poslaném slově z ní.
+        """
+
+        failed = []
+        # slova víceslovných dávek, ve kterých ma neodpovědělo na žádné slovo
+        wholeBatchFailed = set()
+        for batch in self.__batches(words):
+            batchFailed = self.__commBatchWithMA(batch)
+            if len(batch) > 1 and len(batchFailed) == len(batch):
+                wholeBatchFailed.update(batchFailed)
+            failed.extend(batchFailed)
+
+        if len(failed) == 0:
+            return
+
+        logging.info("\tPři komunikaci s ma nebyla získána odpověď pro " + str(len(failed)) + " slov. Posílám je "
+                     "znovu, každé samostatně.")
+        self.retriedWords += len(failed)
+
+        lost = []
+        for i, w in enumerate(failed):
+            try:
+                lost.extend(self.__commShardWithMA([w], 0))
+            except MorphoAnalyzerException:
+                if w in wholeBatchFailed:
+                    # Nejde o problém jednotlivých slov, ma nefunguje.
+                    raise
+                # ma skončilo chybou hned na tomto slově
+                lost.append(w)
+                if i + 1 < len(failed):
+                    # zbylá slova již nebudeme posílat samostatně
+                    lost.extend(self.__commBatchWithMA(failed[i + 1:]))
+                break
+
+        for w in lost:
+            # Není pravděpodobné, že by jedno slovo mělo příliš velký výstup, zřejmě se spíše jedná o nevhodné
+            # slovo pro ma. Jako je například slovo . (tečka).
+            logging.warning("\tPro slovo " + w + " se nepodařilo získat odpověď od ma. Slovo bude vynecháno.")
+        self.lostWords += len(lost)
+
+    def __batches(self, words):
+        """
+        Rozdělí slova na dávky, jejichž vstup pro ma nepřesáhne maxBatchBytes. Každá dávka obsahuje alespoň jedno
+        slovo.
+
+        :param words: Slova pro analýzu
+        :type words:List[str]
+        :return: Generátor dávek slov ve stejném pořadí.
+        :rtype: Generator[List[str], None, None]
+        """
+
+        if self._maxBatchBytes is None:
+            yield words
+            return
+
+        batch = []
+        batchBytes = 0
+        for w in words:
+            wBytes = len(w.encode()) + 1  # +1 za konec řádku
+            if len(batch) > 0 and batchBytes + wBytes > self._maxBatchBytes:
+                yield batch
+                batch = []
+                batchBytes = 0
+            batch.append(w)
+            batchBytes += wBytes
+
+        if len(batch) > 0:
+            yield batch
+
+    def __commBatchWithMA(self, words):
+        """
+        Pošle ma dávku slov. Velké dávky jsou rozděleny mezi více souběžně běžících procesů ma (viz shards).
+
+        :param words: Slova pro analýzu
+        :type words:List[str]
+        :return: Slova, pro která se nepodařilo získat odpověď.
+        :rtype: List[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        if self._shards > 1 and len(words) >= self._shards * self.MIN_SHARD_WORDS:
+            shardSize = math.ceil(len(words) / self._shards)
+            shards = [words[offset:offset + shardSize] for offset in range(0, len(words), shardSize)]
+
+            with self.SHARED_STATE_LOCK.released(), ThreadPoolExecutor(len(shards)) as executor:
+                return [w for failed in executor.map(self.__commShardWithMA, shards, range(len(shards)))
+                        for w in failed]
+
+        return self.__commShardWithMA(words, 0)
+
+    def __commShardWithMA(self, words, process):
+        """
+        Pošle slova jednomu procesu ma a jeho výstup průběžně zpracovává do databáze slov.
+        Každá odpověď je zpracována hned, jak je celá přečtena, takže v paměti je vždy jen jedna. Zámek sdíleného
+        stavu je držen pouze při jejím zpracování, může tedy běžet souběžně v několika vláknech.
+
+        :param words: Slova pro analýzu
+        :type words:List[str]
+        :param process: Index procesu ma, který má slova zpracovat.
+        :type process: int
+        :return: Slova, pro která se nepodařilo získat odpověď.
+        :rtype: List[str]
+        :raise MorphoAnalyzerException: Chyba analyzátoru.
+        """
+
+        failed = []
+        toCache = {}
+
+        with self.SHARED_STATE_LOCK.released():
+            for w, answer in self._frameMaOutput(words, self.__exchangeWithMA(words, process)):
+                if answer is None:
+                    failed.append(w)
+                    continue
+
+                with self.SHARED_STATE_LOCK:
+                    # počet skupin, které slovo mělo již před analýzou (např. předložky), do cache ukládáme pouze
+                    # ty z ma
+                    groupsBefore = len(self._wordDatabase[w].groups) \
+                        if self._cache is not None and w in self._wordDatabase else 0
+
+                    self._parseMaOutput(answer)
+
+                    if self._cache is not None:
+                        # máme odpověď, takže pokud slovo není v databázi, tak jej ma opravdu nezná
+                        toCache[w] = None
+                        if w in self._wordDatabase and len(self._wordDatabase[w].groups) > groupsBefore:
+                            toCache[w] = self.MAWord()
+                            for g in self._wordDatabase[w].groups[groupsBefore:]:
+                                toCache[w].addGroup(g)
+
+        if len(toCache) > 0:
+            with self.SHARED_STATE_LOCK:
+                self._cache.put(self._cacheLang, self._cacheFingerprint, toCache)
+
+        return failed
+
+    def __exchangeWithMA(self, words, process):
+        """
+        Předá slova ma a postupně vrací řádky jeho výstupu, jak jsou vypisovány. Slova jsou zapisována souběžně se
+        čtením výstupu, takže se komunikace nezastaví na plné rouře a výstup není nutné držet celý v paměti.
+        Nepracuje s databází slov.
 
         :param words: Slova pro analýzu
         :type words:List[str]
+        :param process: Index dlouhodobě běžícího procesu ma, který má slova zpracovat.
+        :type process: int
+        :return: Generátor řádků výstupu ma.
+        :rtype: Generator[str, None, None]
         :raise MorphoAnalyzerException: Chyba analyzátoru.
         """
 
-        p = Popen([self._pathToMa, "-F", "-m", "-n", "-D"], stdin=PIPE, stdout=PIPE, stderr=None)
+        if self._maProcesses is not None:
+            # Slova bez odpovědi při neúplné odpovědi (např. ma spadlo na některém ze slov) určí rámcování
+            # (viz _frameMaOutput).
+            yield from self._maProcesses[process].communicate(words)
+            return
 
-        output, _ = p.communicate(str.encode(("\n".join(words)) + "\n"))  # vrací stdout a stderr
+        p = Popen([self._pathToMa] + self._profile.maArgs, stdin=PIPE, stdout=PIPE, stderr=None)
+
+        def write():
+            try:
+                p.stdin.write(str.encode(("\n".join(words)) + "\n"))
+                p.stdin.close()
+            except OSError:
+                # ma skončilo, to se projeví při čtení
+                pass
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+
+        anyOutput = False
+        finished = False
+        try:
+            for line in io.TextIOWrapper(p.stdout, encoding="utf-8", errors="replace"):
+                anyOutput = True
+                yield line.rstrip("\n")
+            finished = True
+        finally:
+            if not finished and p.poll() is None:
+                # zbytek výstupu již nebude čten
+                p.kill()
+            p.wait()
+            writer.join()
 
         # zkontrolujeme návratový kód
-        if p.returncode != 0:
-            # selhání analyzátoru
+        if p.returncode != 0 and not anyOutput:
+            # selhání analyzátoru, nepodařilo se zpracovat ani jedno slovo
+            # Pokud ma skončilo až v průběhu, tak slova bez odpovědi určí rámcování (viz _frameMaOutput).
             raise MorphoAnalyzerException(ErrorMessenger.CODE_MA_FAILURE)
 
-        retWords = self._parseMaOutput(output.decode())
+    @staticmethod
+    def _splitMaAnswers(lines: Iterable[str]) -> Generator[List[str], None, None]:
+        """
+        Rozdělí výstup ma na odpovědi jednotlivých slov. Odpověď začíná promptem ma> na začátku řádku.
 
-        if retWords != len(words):
+        :param lines: Řádky výstupu ma.
+        :type lines: Iterable[str]
+        :return: Generátor řádků jednotlivých odpovědí.
+        :rtype: Generator[List[str], None, None]
+        """
 
-            # nemáme všechna slova
-            # zřejmě byl pro komunikaci výstup příliš velký pokusíme se poslat méně slov
-            if len(words) == 1:
-                # Níž nelze. Vynecháme toto slovo. Není pravděpodobné, že by jedno slovo mělo tak příliš velký výstup
-                # zřejmě se spíše jedná o nevhodné slovo pro ma. Jako je například slovo . (tečka).
-                return
+        answer = None
+        for line in lines:
+            if line.startswith(MAProcess.PROMPT):
+                if answer is not None:
+                    yield answer
+                answer = [line]
+            elif answer is not None:
+                answer.append(line)
+
+        if answer is not None:
+            yield answer
+
+    @classmethod
+    def _frameMaOutput(cls, words: List[str], lines: Iterable[str]) \
+            -> Generator[Tuple[str, Optional[List[str]]], None, None]:
+        """
+        Přiřadí odpovědi z výstupu ma předloženým slovům.
+
+        Odpovědi (viz _splitMaAnswers) jsou přiřazovány slovům postupně v pořadí, v jakém byla předložena. Pokud
+        odpověď patří (dle <s>) až některému z dalších slov, tak slova před ním odpověď nemají (ma je vynechalo).
+        Odpověď pro slovo, které nebylo předloženo, je přeskočena. Slova za poslední odpovědí také nemají odpověď
+        (např. ma skončilo).
+
+        :param words: Slova, která byla předložena ma.
+        :type words: List[str]
+        :param lines: Řádky výstupu ma.
+        :type lines: Iterable[str]
+        :return: Generátor dvojic (slovo, řádky jeho odpovědi) v pořadí slov. Pro slovo bez odpovědi jsou řádky None.
+        :rtype: Generator[Tuple[str, Optional[List[str]]], None, None]
+        """
 
-            origCnt = len(words)
-            words = words[retWords:]  # zbavíme se již zpracovaných
+        positions = {w: i for i, w in enumerate(words)}
+
+        i = 0
+        for answer in cls._splitMaAnswers(lines):
+            if i >= len(words):
+                # Zbytek výstupu přečteme, aby ma mohlo dokončit odpověď.
+                continue
+
+            # slovo, kterému odpověď patří, pokud jej lze určit
+            answerWord = None
+            for line in answer:
+                parts = line.split()
+                if len(parts) > 1 and parts[0][-3:] == "<s>":
+                    answerWord = parts[1]
+                    break
+
+            if answerWord is not None and answerWord != words[i]:
+                if positions.get(answerWord, -1) <= i:
+                    # odpověď nepatří žádnému z dalších slov (např. rámcovací řetězec MAProcess)
+                    continue
+                # ma vynechalo slova
+                for w in words[i:positions[answerWord]]:
+                    yield w, None
+                i = positions[answerWord]
 
-            partSize = math.ceil(len(words) / 2)
-            logging.info("\tPři komunikaci s ma došlo ke ztrátě slov (odesláno: " + str(origCnt) + ", přijato: " + str(
-                retWords) + "). Pokusím se o komunikaci znovu s menším počtem slov: " +
-                         str(origCnt) + " -> " + str(partSize) + ".")
-            for offset in range(0, len(words), partSize):
-                self.__commWithMA(words[offset:offset + partSize])
+            yield words[i], answer
+            i += 1
 
-    def _parseMaOutput(self, output):
+        for w in words[i:]:
+            yield w, None
+
+    def close(self):
+        """
+        Ukončí běžící procesy ma (pokud ma běží jako dlouhodobý proces).
+        Databáze slov zůstává zachována a případné další slova spustí ma znovu.
+        """
+
+        if self._maProcesses is not None:
+            for process in self._maProcesses:
+                process.close()
+
+    def _parseMaOutput(self, lines: Iterable[str]):
         """
         Provede analýzu výstupu z ma a uloží získané informace do databáze.
+        Řádky jsou zpracovávány postupně, takže mohou být čteny přímo z výstupu ma.
 
-        :param output: Výstup z analyzátoru.
-        :type output: str
-        :return: Počet získaných slov. (i nezpracovaných ma>--not found)
-        :rtype: int
+        :param lines: Řádky výstupu z analyzátoru.
+        :type lines: Iterable[str]
         :raise MorphoAnalyzerException: Pokud se nepodaří analyzovat vstup.
         """
 
         actWordGroup = None  # obsahuje data k aktuálně parsované skupině
-        cntUnWords = 0
-        wordsInDBAtStart = len(self._wordDatabase)
-        for lineNumber, line in enumerate(output.splitlines()):
+        for lineNumber, line in enumerate(lines):
             try:
                 if line == "ma>--not found":
                     # máme další slovo, ale nezpracované
-                    cntUnWords += 1
                     continue
 
                 # rozdělení řádku
@@ -1251,17 +2807,19 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                     # začínáme číst novou skupinu slova
                     # <s> vstupní slovo (vzor 1)
 
-                    # byla předešlá skupina k něčemu dobrá?
-                    if actWordGroup is not None and len(actWordGroup.rules) == 0:
-                        # ne nebyla, tak ji odstraníme
-                        self._wordDatabase[actWordGroup.word].delGroup(actWordGroup)
+                    if actWordGroup is not None:
+                        actWordGroup.releaseMorphsIndex()
+                        # byla předešlá skupina k něčemu dobrá?
+                        if len(actWordGroup.rules) == 0:
+                            # ne nebyla, tak ji odstraníme
+                            self._wordDatabase.mutable(actWordGroup.word).delGroup(actWordGroup)
 
                     # vytvoříme skupinu
                     actWordGroup = self.MAWordGroup(parts[1])
 
                     try:
                         # vložíme skupinu do analýzy slova
-                        self._wordDatabase[parts[1]].addGroup(actWordGroup)
+                        self._wordDatabase.mutable(parts[1]).addGroup(actWordGroup)
                     except KeyError:
                         # nové slovo
                         # vytvoříme objekt pro uložení morfologické analýzy slova
@@ -1317,12 +2875,12 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                                               ErrorMessenger.getMessage(ErrorMessenger.CODE_MA_CAN_NOT_READ_OUTPUT)
                                               .format(lineNumber) + "\n\t" + line)
 
-        # byla předešlá skupina k něčemu dobrá?
-        if actWordGroup is not None and len(actWordGroup.rules) == 0:
-            # nebyla
-            self._wordDatabase[actWordGroup.word].delGroup(actWordGroup)
-
-        return cntUnWords + len(self._wordDatabase) - wordsInDBAtStart
+        if actWordGroup is not None:
+            actWordGroup.releaseMorphsIndex()
+            # byla předešlá skupina k něčemu dobrá?
+            if len(actWordGroup.rules) == 0:
+                # nebyla
+                self._wordDatabase.mutable(actWordGroup.word).delGroup(actWordGroup)
 
     def isNameDependant(self, word: str, name) -> bool:
         """
@@ -1337,8 +2895,39 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
         :rtype: bool
         """
 
-        return EQRelationForPrepAndItsAbbre(name) in self._prepAbberEqClasses and \
-            POS.ABBREVIATION in self._wordDatabase[word].getAllForCategory(MorphCategories.POS)
+        if EQRelationForPrepAndItsAbbre(name) not in self._prepAbberEqClasses:
+            return False
+
+        self._ensureAnalyzed(word)
+        return POS.ABBREVIATION in self._wordDatabase[word].getAllForCategory(MorphCategories.POS)
+
+    def hasNameDependantAnalysis(self, name) -> bool:
+        """
+        Zjistí zdali může mít některé slovo daného jména na jméně závislou analýzu. Ta je závislá i na ostatních
+        zpracovávaných jménech.
+
+        :param name: Jméno pro kontrolu.
+        :type name: Name
+        :return: True -> jméno může mít slova s na jméně závislou analýzou.
+                False -> nemá
+        :rtype: bool
+        """
+
+        return len(name) > 2 and EQRelationForPrepAndItsAbbre(name) in self._prepAbberEqClasses
+
+    def _isPreposition(self, word: str) -> bool:
+        """
+        Zjistí zdali může být dané slovo předložkou.
+
+        :param word: Slovo pro kontrolu.
+        :type word: str
+        :return: True -> slovo může být předložkou.
+        :rtype: bool
+        """
+
+        self._ensureAnalyzed(word)
+        return word in self._wordDatabase and \
+            POS.PREPOSITION in self._wordDatabase[word].getAllForCategory(MorphCategories.POS)
 
     def analyze(self, word, name=None, wordPos: Optional[int] = None):
         """
@@ -1357,6 +2946,7 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
             vůbec poskytnuto.
         """
 
+        self._ensureAnalyzed(word)
         try:
             wordAnalyze = self._wordDatabase[word]
         except KeyError:
@@ -1373,14 +2963,13 @@ class MorphoAnalyzerLibma(MorphoAnalyzer):
                 # který má slovo na stejné pozici a je předložkou.
 
                 if wordPos is not None and \
-                        any((POS.PREPOSITION in self._wordDatabase[str(n[wordPos])].getAllForCategory(MorphCategories.POS))
-                            for n in self._prepAbberEqClasses[eqR]):
+                        any(self._isPreposition(str(n[wordPos])) for n in self._prepAbberEqClasses[eqR]):
                     # Vytvoříme se prázdnou novou analýzu slova, protože jsme si na základě získaného kontextu
                     # jistější o tom, že je to zkratka předložky a jiné možnosti tedy zamítneme.
                     wordAnalyze = self.MAWord()
                 else:
                     # zkopírujeme co o slovu již víme
-                    wordAnalyze = copy(wordAnalyze)
+                    wordAnalyze = copy(self._wordDatabase.mutable(word))
 
                 # Přidáme možnost ke zkratkám, že se může jednat o zkratku předložky.
                 g = self.MAWordGroup(word)